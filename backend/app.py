@@ -2,24 +2,64 @@ from __future__ import annotations
 
 import logging
 import os
+import time
 from pathlib import Path
+from typing import Optional
 
-from flask import Flask, jsonify
-from flask import send_from_directory
+from flask import Flask, Response, jsonify, request
+from flask import send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from werkzeug.exceptions import HTTPException
+from werkzeug.security import safe_join
 
 from config import Config
+from database import EngineOptions, create_db_engine
+from migrations import upgrade_schema
 from models import Base
 from routes.test_images import test_images_bp
 from routes.test_videos import test_videos_bp
 from routes.truth_image import truth_image_bp
+from services.admission import ADMISSION_GATES, face_admission, rescore_admission, upload_admission
+from services.embedding_cache import embedding_cache
+from services.face_index import face_index
+from services.face_service import DetectionProfile, configure_detection_profile, face_models, prewarm
+from services.job_service import VideoJobRunner, job_settings_from_config, job_status_counts
+from services.metrics import (
+    CONTENT_TYPE,
+    format_memory,
+    install_stage_metrics,
+    process_memory,
+    render_metrics,
+    request_timer,
+)
+from services.thumbnails import THUMBNAIL_SUFFIXES, file_etag, is_immutable_upload, thumbnail_cache
+from services.timing import STAGE_SERIALIZE, stage
+from services.truth_service import truth_gallery_cache
 
 
-def create_app() -> Flask:
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() with the JSON encoding counted as the "serialize" stage."""
+
+    def response(self, *args, **kwargs):
+        with stage(STAGE_SERIALIZE):
+            return super().response(*args, **kwargs)
+
+
+def create_app(start_job_runner: bool = True, config: Optional[dict] = None) -> Flask:
+    """
+    Build the app. `start_job_runner=False` leaves the background threads (video job
+    dispatcher, face index builder) stopped, for a gunicorn master that forks workers
+    afterwards (threads do not survive a fork; see wsgi.py).
+    `config` overrides Config values (tests: a temporary database and upload folder).
+    """
+    started = time.perf_counter()
     app = Flask(__name__)
+    app.json = TimedJSONProvider(app)
     app.config.from_object(Config)
+    if config:
+        app.config.update(config)
 
     # Basic, helpful logging.
     logging.basicConfig(
@@ -38,18 +78,67 @@ def create_app() -> Flask:
     (uploads_dir / "frames").mkdir(parents=True, exist_ok=True)
 
     # SQLAlchemy (plain, no Flask-SQLAlchemy to keep it simple).
-    db_url = app.config["DATABASE_URL"]
-    connect_args = {}
-    # Improve SQLite dev experience: allow reuse across threads and increase lock timeout.
-    if str(db_url).startswith("sqlite"):
-        connect_args = {"check_same_thread": False, "timeout": 30}
-
-    engine = create_engine(db_url, echo=False, connect_args=connect_args)
+    engine = create_db_engine(app.config["DATABASE_URL"], EngineOptions.from_config(app.config))
     Base.metadata.create_all(engine)
+    upgrade_schema(engine)
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
     # Put on app for easy access in routes.
     app.session_local = SessionLocal  # type: ignore[attr-defined]
+    app.db_engine = engine  # type: ignore[attr-defined]
+
+    truth_gallery_cache.configure(app.config["TRUTH_CACHE_CHECK_INTERVAL"])
+    thumbnail_cache.configure(
+        Path(app.config["THUMBNAIL_CACHE_FOLDER"]),
+        app.config["THUMBNAIL_CACHE_MAX_MB"] * 1024 * 1024,
+        app.config["THUMBNAIL_WIDTHS"],
+        app.config["THUMBNAIL_JPEG_QUALITY"],
+    )
+    detection_profile = DetectionProfile.from_config(app.config)
+    configure_detection_profile(detection_profile)
+    embedding_cache.configure(
+        app.config["EMBEDDING_CACHE_ENABLED"],
+        app.config["EMBEDDING_CACHE_MAX_ENTRIES"],
+        variant=detection_profile.cache_variant,
+        evict_interval=app.config["EMBEDDING_CACHE_EVICT_INTERVAL"],
+    )
+    face_index.configure(
+        app.config["FACE_INDEX_EXACT_MAX"],
+        app.config["FACE_INDEX_NPROBE"],
+        app.config["FACE_INDEX_REBUILD_RATIO"],
+        app.config["FACE_INDEX_REFRESH_OVERLAP_SECONDS"],
+    )
+    face_admission.configure(
+        app.config["ADMISSION_FACE_MAX_ACTIVE"],
+        app.config["ADMISSION_FACE_MAX_QUEUED"],
+        app.config["ADMISSION_QUEUE_TIMEOUT_SECONDS"],
+    )
+    upload_admission.configure(
+        app.config["ADMISSION_UPLOAD_MAX_ACTIVE"],
+        app.config["ADMISSION_UPLOAD_MAX_QUEUED"],
+        app.config["ADMISSION_QUEUE_TIMEOUT_SECONDS"],
+    )
+    rescore_admission.configure(
+        app.config["ADMISSION_RESCORE_MAX_ACTIVE"],
+        app.config["ADMISSION_RESCORE_MAX_QUEUED"],
+        app.config["ADMISSION_QUEUE_TIMEOUT_SECONDS"],
+    )
+    if app.config["FACE_MODELS_PREWARM"]:
+        prewarm()
+
+    # Background video processing (uploads only queue jobs).
+    runner = VideoJobRunner(
+        SessionLocal,
+        job_settings_from_config(app.config),
+        workers=app.config["VIDEO_JOB_WORKERS"],
+        poll_interval=app.config["VIDEO_JOB_POLL_INTERVAL"],
+        stale_after_seconds=app.config["VIDEO_JOB_STALE_SECONDS"],
+    )
+    if app.config["VIDEO_JOBS_ENABLED"] and start_job_runner:
+        runner.start()
+    app.video_job_runner = runner  # type: ignore[attr-defined]
+    if app.config["FACE_INDEX_REFRESH_INTERVAL"] > 0 and start_job_runner:
+        face_index.start(SessionLocal, app.config["FACE_INDEX_REFRESH_INTERVAL"])
 
     # Register routes.
     app.register_blueprint(truth_image_bp, url_prefix="/api")
@@ -60,24 +149,111 @@ def create_app() -> Flask:
     def health():
         return jsonify({"status": "ok"})
 
+    @app.get("/api/cache-stats")
+    def cache_stats():
+        """Hit/miss counters of the in-process caches (per worker process) + embedding cache size."""
+        with app.session_local() as db:  # type: ignore[attr-defined]
+            embeddings = embedding_cache.stats(db)
+        return jsonify(
+            {
+                "truth_gallery": truth_gallery_cache.stats(),
+                "embedding_cache": embeddings,
+                "thumbnails": thumbnail_cache.stats(),
+                "face_index": face_index.stats(),
+            }
+        )
+
+    if app.config["METRICS_ENABLED"]:
+        install_stage_metrics()
+        request_timer.init_app(app)
+
+        @app.get("/api/metrics")
+        def metrics():
+            """
+            Prometheus scrape endpoint. Histograms are per app process (video job and face
+            pool workers report back to the process that started them); job counts come from the DB.
+            """
+            with app.session_local() as db:  # type: ignore[attr-defined]
+                counts = job_status_counts(db)
+            memory = process_memory()
+            admission = {gate.name: gate.stats() for gate in ADMISSION_GATES}
+            gauges = [
+                ("facematch_process_memory_bytes", "Memory of this process (rss, pss, uss).", [({"kind": k}, v) for k, v in memory.items()]),
+                ("facematch_app_startup_seconds", "Time create_app() took (in the gunicorn master when preloaded).", [({}, app.startup_seconds)]),
+                ("facematch_face_models_loaded", "1 once face_recognition/dlib models are loaded in this process.", [({}, int(face_models.loaded))]),
+                ("facematch_video_jobs", "Video jobs by status.", [({"status": s}, n) for s, n in counts.items()]),
+                ("facematch_video_jobs_in_flight", "Video jobs running on this process's workers.", [({}, runner.in_flight())]),
+                ("facematch_video_job_workers", "Video job worker processes of this process.", [({}, runner.workers)]),
+                ("facematch_http_requests_in_flight", "Requests being handled by this process.", [({}, request_timer.in_flight)]),
+                ("facematch_admission_active", "Admitted requests running, per admission gate.", [({"gate": g}, a["active"]) for g, a in admission.items()]),
+                ("facematch_admission_queued", "Requests waiting for a slot, per admission gate.", [({"gate": g}, a["queued"]) for g, a in admission.items()]),
+                ("facematch_admission_rejected", "Requests refused since start (429 queue_full, 503 queue_timeout).", [({"gate": g, "reason": r}, n) for g, a in admission.items() for r, n in a["rejected"].items()]),
+            ]
+            return Response(render_metrics(gauges), mimetype=None, content_type=CONTENT_TYPE)
+
     @app.get("/uploads/<path:filename>")
     def serve_upload(filename: str):
         """
         Serve uploaded files for previews (dev-friendly).
         Frontend can request: http://localhost:5000/uploads/<subpath>
+        - ?w=<px> on an image: a cached JPEG thumbnail at most that wide (snapped up to THUMBNAIL_WIDTHS)
+        - strong ETag; names carrying a content hash/uuid are cached by browsers as immutable,
+          other files (video frames) are revalidated (cheap 304s)
+        - Range requests (206) so video players can seek without downloading the whole file
         """
-        return send_from_directory(app.config["UPLOAD_FOLDER"], filename, as_attachment=False)
+        path = safe_join(app.config["UPLOAD_FOLDER"], filename)
+        if path is None or not os.path.isfile(path):
+            return jsonify({"error": "Not found"}), 404
+        path = Path(path)
+        source_etag = etag = file_etag(path, path.stat())
+
+        width = request.args.get("w", type=int)
+        if width is not None:
+            if width <= 0 or path.suffix.lower() not in THUMBNAIL_SUFFIXES:
+                return jsonify({"error": "w must be a positive width, for images only"}), 400
+            width = thumbnail_cache.snap_width(width)
+        if width is not None:
+            etag = f"{etag}-w{width}"
+
+        immutable = is_immutable_upload(path)
+        if request.if_none_match.contains(etag):
+            # The browser has it: skip the thumbnail lookup and the file entirely.
+            response = Response(status=304)
+            response.set_etag(etag)
+        else:
+            if width is not None:
+                path = thumbnail_cache.get(path, source_etag, width)
+            response = send_file(path, etag=etag, conditional=True, max_age=None)
+
+        if immutable:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config["UPLOAD_CACHE_MAX_AGE"]
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
 
     @app.errorhandler(Exception)
     def handle_exception(e: Exception):
-        # Keep errors JSON for frontend.
+        # Keep errors JSON for frontend; HTTP errors (404, 413 past MAX_CONTENT_LENGTH, ...) keep their status.
+        if isinstance(e, HTTPException):
+            return jsonify({"error": e.description}), e.code
         logging.exception("Unhandled error: %s", e)
         return jsonify({"error": "Server error", "detail": str(e)}), 500
 
+    app.startup_seconds = time.perf_counter() - started  # type: ignore[attr-defined]
+    logging.info(
+        "App ready in %.2fs (face models %s), %s",
+        app.startup_seconds,  # type: ignore[attr-defined]
+        "loaded" if face_models.loaded else "lazy",
+        format_memory(process_memory()),
+    )
     return app
 
 
 if __name__ == "__main__":
+    # Dev server. Production: gunicorn -c gunicorn.conf.py wsgi:app (see wsgi.py).
     app = create_app()
     port = int(os.getenv("PORT", "5000"))
     # IMPORTANT (Windows/dev): uploads create new files in backend/uploads/.
@@ -0,0 +1,147 @@
+"""
+Latency / accuracy trade-off of the face detection profiles on a local set of photos.
+
+Every image is encoded with the "accurate" profile (the baseline) and with "fast" at each
+--max-sides value. For each profile the report gives:
+- latency per image (mean / p50 / p95, single process)
+- faces found, and how often fast and accurate disagree on whether there is a face
+- embedding distance to the accurate embedding of the same image (mean / max), and the share
+  of images where that drift is below --agree-distance (the match decision cannot flip)
+- if the images are grouped in one sub-folder per person: leave-one-out nearest-neighbour
+  identity accuracy within the profile
+
+Usage (from backend/):
+    python -m benchmarks.bench_detection_profiles --images ~/photos/faces
+    python -m benchmarks.bench_detection_profiles --images ./testset --max-sides 640 1280 --output profiles.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from services.face_service import DETECT_ACCURATE, DETECT_FAST, DetectionProfile, extract_face_embedding
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def _find_images(root: Path) -> list[Path]:
+    return sorted(p for p in root.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def _run_profile(images: list[Path], profile: DetectionProfile) -> tuple[list[Optional[np.ndarray]], list[float]]:
+    embeddings, latencies = [], []
+    for path in images:
+        start = time.perf_counter()
+        embedding = extract_face_embedding(str(path), profile)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        embeddings.append(np.asarray(embedding, dtype=np.float32) if embedding is not None else None)
+    return embeddings, latencies
+
+
+def _identity_accuracy(embeddings: list[Optional[np.ndarray]], labels: list[str]) -> Optional[float]:
+    """Leave-one-out 1-NN accuracy over images with a face; None without per-person folders."""
+    rows = [(e, l) for e, l in zip(embeddings, labels) if e is not None]
+    if len({l for _, l in rows}) < 2:
+        return None
+    matrix = np.stack([e for e, _ in rows])
+    dist = np.linalg.norm(matrix[:, None, :] - matrix[None, :, :], axis=2)
+    np.fill_diagonal(dist, np.inf)
+    nearest = np.argmin(dist, axis=1)
+    correct = sum(rows[i][1] == rows[j][1] for i, j in enumerate(nearest))
+    return round(correct / len(rows), 4)
+
+
+def _summarize(
+    name: str,
+    profile: DetectionProfile,
+    embeddings: list[Optional[np.ndarray]],
+    latencies: list[float],
+    baseline: list[Optional[np.ndarray]],
+    labels: list[str],
+    agree_distance: float,
+) -> dict:
+    lat = np.asarray(latencies)
+    drift = [
+        float(np.linalg.norm(e - b)) for e, b in zip(embeddings, baseline) if e is not None and b is not None
+    ]
+    return {
+        "profile": name,
+        "settings": profile.cache_variant,
+        "latency_ms": {
+            "mean": round(float(lat.mean()), 1),
+            "p50": round(float(np.percentile(lat, 50)), 1),
+            "p95": round(float(np.percentile(lat, 95)), 1),
+        },
+        "faces_found": sum(e is not None for e in embeddings),
+        "detection_disagreements": sum((e is None) != (b is None) for e, b in zip(embeddings, baseline)),
+        "drift_vs_accurate": {
+            "mean": round(float(np.mean(drift)), 4) if drift else None,
+            "max": round(float(np.max(drift)), 4) if drift else None,
+            "share_below_agree_distance": round(sum(d <= agree_distance for d in drift) / len(drift), 4)
+            if drift
+            else None,
+        },
+        "identity_accuracy": _identity_accuracy(embeddings, labels),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="folder of photos (optionally one sub-folder per person)")
+    parser.add_argument("--max-sides", type=int, nargs="+", default=[640, 960, 1280, 1600])
+    parser.add_argument("--encode-face-side", type=int, default=150)
+    parser.add_argument("--upsample", type=int, default=1)
+    parser.add_argument("--detector", default="hog")
+    parser.add_argument("--jitters", type=int, default=1)
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--agree-distance", type=float, default=0.05)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    root = Path(args.images).expanduser()
+    images = _find_images(root)
+    if not images:
+        raise SystemExit(f"No images found under {root}")
+    labels = [p.parent.name if p.parent != root else "" for p in images]
+
+    base = DetectionProfile(
+        mode=DETECT_ACCURATE,
+        encode_face_side=args.encode_face_side,
+        upsample=args.upsample,
+        detector=args.detector,
+        num_jitters=args.jitters,
+        model=args.model,
+    )
+    profiles = [("accurate", base)] + [
+        (f"fast@{side}", replace(base, mode=DETECT_FAST, detect_max_side=side)) for side in args.max_sides
+    ]
+
+    print(f"{len(images)} images under {root}")
+    results = []
+    baseline: list[Optional[np.ndarray]] = []
+    for name, profile in profiles:
+        embeddings, latencies = _run_profile(images, profile)
+        if not baseline:
+            baseline = embeddings
+        row = _summarize(name, profile, embeddings, latencies, baseline, labels, args.agree_distance)
+        results.append(row)
+        print(
+            f"{name:>12}: {row['latency_ms']['mean']:>8.1f} ms/img  faces {row['faces_found']:>4}  "
+            f"disagree {row['detection_disagreements']:>3}  drift {row['drift_vs_accurate']['mean']}  "
+            f"id-acc {row['identity_accuracy']}"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+End-to-end throughput benchmark: synthetic images and videos go through the real routes
+(create_app() + Flask test client) and the video job code, with per-stage timing.
+
+Scenarios, run in order on a fresh database and uploads folder:
+- truth: enroll the face used in the test media (POST /api/truth-image)
+- images@<W>x<H>: POST --images test images at each --resolutions size (every image has
+  unique bytes, so the embedding cache never hits)
+- video@<S>s: POST one video per --video-seconds value and run its job inline
+  (--video-fps, --video-size, --codec; the face is visible during the middle third)
+- results: GET /api/results for video matches, JSON page + NDJSON stream
+
+Per scenario the report gives wall time, items/s and, per stage (upload_save, decode, detect,
+encode, compare, db_write, serialize; see services/timing.py), count / total ms / mean ms.
+Everything runs in this process (FACE_WORKERS=1, jobs inline), so every stage is recorded.
+
+The face is a drawn one unless --face-image is given. HOG rarely finds a drawn face, so
+without a real portrait enrollment fails and detection measures the no-face path.
+
+Regression check: with --compare baseline.json the run exits with code 1 if any scenario's
+items/s dropped by more than --fail-threshold (0.2 = 20%) against the baseline report.
+
+Usage (from backend/):
+    python -m benchmarks.bench_e2e --output baseline.json
+    python -m benchmarks.bench_e2e --face-image ~/portrait.jpg --compare baseline.json --fail-threshold 0.15
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_frame_sampler import make_synthetic_video
+from services.timing import StageRecorder
+
+
+def _parse_size(value: str) -> tuple[int, int]:
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+def _drawn_face(side: int) -> np.ndarray:
+    """A cartoon face (BGR), side x side."""
+    face = np.full((side, side, 3), 235, dtype=np.uint8)
+    c = side // 2
+    cv2.ellipse(face, (c, c), (int(side * 0.36), int(side * 0.46)), 0, 0, 360, (140, 170, 220), -1)
+    for dx in (-1, 1):
+        cv2.circle(face, (c + dx * side // 7, int(side * 0.42)), max(2, side // 20), (40, 30, 30), -1)
+    cv2.ellipse(face, (c, int(side * 0.68)), (side // 8, side // 20), 0, 0, 180, (60, 60, 150), max(1, side // 60))
+    return face
+
+
+def _paste_face(canvas: np.ndarray, face: np.ndarray, scale: float = 0.45) -> None:
+    """Resize `face` to `scale` of the canvas height and paste it centred (in place, BGR)."""
+    height, width = canvas.shape[:2]
+    side = max(16, int(min(height, width) * scale))
+    fh, fw = face.shape[:2]
+    resized = cv2.resize(face, (max(1, fw * side // fh), side), interpolation=cv2.INTER_AREA)
+    rh, rw = resized.shape[:2]
+    rw = min(rw, width)
+    top, left = (height - rh) // 2, (width - rw) // 2
+    canvas[top : top + rh, left : left + rw] = resized[:, :rw]
+
+
+def _synthetic_image(size: tuple[int, int], face: np.ndarray, seed: int) -> bytes:
+    """JPEG bytes: tinted gradient with light noise (unique per seed) and the face in the middle."""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(60, 200, width, dtype=np.float32)[None, :, None]
+    tint = rng.uniform(0.7, 1.1, size=3).astype(np.float32)
+    canvas = np.broadcast_to(gradient * tint, (height, width, 3)).copy()
+    canvas += rng.normal(0, 6, size=canvas.shape).astype(np.float32)
+    canvas = np.clip(canvas, 0, 255).astype(np.uint8)
+    _paste_face(canvas, face)
+    ok, buf = cv2.imencode(".jpg", canvas, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+def _run_scenario(name: str, fn: Callable[[], tuple[int, dict]]) -> dict:
+    """Run `fn` (returns items processed + extra fields) while recording stage timings."""
+    with StageRecorder() as recorder:
+        start = time.perf_counter()
+        items, extra = fn()
+        wall = time.perf_counter() - start
+    return {
+        "scenario": name,
+        "items": items,
+        "wall_seconds": round(wall, 4),
+        "items_per_second": round(items / wall, 3) if wall > 0 else None,
+        **extra,
+        "stages": recorder.snapshot(),
+    }
+
+
+def _compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Annotate scenarios with their change vs the baseline; return the regressions."""
+    previous = {row["scenario"]: row for row in baseline.get("scenarios", [])}
+    regressions = []
+    for row in report["scenarios"]:
+        old = previous.get(row["scenario"])
+        if not old or not old.get("items_per_second") or row.get("items_per_second") is None:
+            continue
+        change = row["items_per_second"] / old["items_per_second"] - 1.0
+        row["change_vs_baseline"] = round(change, 4)
+        if change < -threshold:
+            regressions.append(
+                f"{row['scenario']}: {row['items_per_second']} items/s vs {old['items_per_second']} "
+                f"({change * 100:+.1f}%)"
+            )
+    return regressions
+
+
+def run_benchmark(args, workdir: Path) -> dict:
+    # Config reads the environment when it is first imported, so set it up before create_app.
+    os.environ.update(
+        {
+            "DATABASE_URL": f"sqlite:///{workdir / 'bench.db'}",
+            "UPLOAD_FOLDER": str(workdir / "uploads"),
+            "VIDEO_JOBS_ENABLED": "false",
+            "FACE_WORKERS": "1",
+            "VIDEO_FACE_WORKERS": "1",
+            "FACE_DETECTION_PROFILE": args.profile,
+        }
+    )
+    from app import create_app
+    from services.job_service import run_video_job
+
+    app = create_app()
+    client = app.test_client()
+
+    if args.face_image:
+        face = cv2.imread(str(Path(args.face_image).expanduser()))
+        if face is None:
+            raise SystemExit(f"Could not read {args.face_image}")
+    else:
+        face = _drawn_face(400)
+
+    scenarios = []
+
+    def truth() -> tuple[int, dict]:
+        data = {"file": (io.BytesIO(_synthetic_image((800, 800), face, seed=0)), "truth.jpg"), "label": "bench"}
+        resp = client.post("/api/truth-image", data=data, content_type="multipart/form-data")
+        return 1, {"enrolled": resp.status_code == 200}
+
+    scenarios.append(_run_scenario("truth", truth))
+
+    seed = 1
+    for size in args.resolutions:
+        payload = []
+        for i in range(args.images):
+            payload.append((io.BytesIO(_synthetic_image(size, face, seed)), f"img_{seed}.jpg"))
+            seed += 1
+
+        def images(payload=payload) -> tuple[int, dict]:
+            resp = client.post("/api/test-images", data={"files": payload}, content_type="multipart/form-data")
+            if resp.status_code != 200:
+                raise RuntimeError(f"/api/test-images returned {resp.status_code}: {resp.get_data(as_text=True)}")
+            statuses: dict[str, int] = {}
+            for row in resp.get_json()["results"]:
+                statuses[row["match_status"]] = statuses.get(row["match_status"], 0) + 1
+            return len(payload), {"match_status": statuses}
+
+        scenarios.append(_run_scenario(f"images@{size[0]}x{size[1]}", images))
+
+    for seconds in args.video_seconds:
+        video_path = str(workdir / f"synthetic_{seconds}s.mp4")
+        frames_total = seconds * args.video_fps
+        face_from, face_until = frames_total // 3, 2 * frames_total // 3
+
+        def overlay(i: int, frame: np.ndarray) -> None:
+            if face_from <= i < face_until:
+                _paste_face(frame, face, scale=0.5)
+
+        make_synthetic_video(video_path, seconds, args.video_fps, args.video_size, args.codec, args.video_fps * 2, overlay)
+        video_bytes = Path(video_path).read_bytes()
+
+        def video(video_bytes=video_bytes, seconds=seconds) -> tuple[int, dict]:
+            data = {"files": [(io.BytesIO(video_bytes), f"video_{seconds}s.mp4")], "mode": args.video_mode}
+            resp = client.post("/api/test-videos", data=data, content_type="multipart/form-data")
+            if resp.status_code != 202:
+                raise RuntimeError(f"/api/test-videos returned {resp.status_code}: {resp.get_data(as_text=True)}")
+            job_id = resp.get_json()["results"][0]["job"]["id"]
+            run_video_job(job_id, app.video_job_runner.settings)  # type: ignore[attr-defined]
+            job = client.get(f"/api/video-jobs/{job_id}").get_json()["job"]
+            frames = job.get("frames_done") or 0
+            return max(frames, 1), {"job_status": job.get("status"), "frames_sampled": frames, "video_seconds": seconds}
+
+        scenarios.append(_run_scenario(f"video@{seconds}s", video))
+
+    def results() -> tuple[int, dict]:
+        page = client.get("/api/results?collection=video_matches&limit=1000").get_json()
+        stream = client.get("/api/results?collection=video_matches&format=ndjson").get_data(as_text=True)
+        rows = len(page.get("video_matches", [])) + sum(1 for line in stream.splitlines() if line.strip())
+        return max(rows, 1), {"rows": rows}
+
+    scenarios.append(_run_scenario("results", results))
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "face_image": bool(args.face_image),
+            "profile": args.profile,
+            "images_per_resolution": args.images,
+            "video_fps": args.video_fps,
+            "video_size": list(args.video_size),
+            "codec": args.codec,
+            "video_mode": args.video_mode,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--face-image", help="real portrait pasted into the test media (default: drawn face)")
+    parser.add_argument("--images", type=int, default=8, help="test images per resolution")
+    parser.add_argument("--resolutions", type=_parse_size, nargs="+", default=[(640, 480), (1280, 720), (1920, 1080)])
+    parser.add_argument("--video-seconds", type=int, nargs="+", default=[10, 30])
+    parser.add_argument("--video-fps", type=int, default=25)
+    parser.add_argument("--video-size", type=_parse_size, default=(640, 360))
+    parser.add_argument("--codec", default="mp4v", help="fourcc, e.g. mp4v, avc1")
+    parser.add_argument("--video-mode", default="full", choices=["full", "search"])
+    parser.add_argument("--profile", default="accurate", choices=["fast", "accurate"], help="FACE_DETECTION_PROFILE")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="baseline JSON report from an earlier run")
+    parser.add_argument("--fail-threshold", type=float, default=0.2, help="allowed items/s drop vs baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_e2e_") as tmp:
+        report = run_benchmark(args, Path(tmp))
+
+    regressions: list[str] = []
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = _compare(report, baseline, args.fail_threshold)
+        report["regressions"] = regressions
+
+    for row in report["scenarios"]:
+        stages = "  ".join(f"{name} {s['total_ms']:.0f}ms" for name, s in row["stages"].items())
+        change = f"  ({row['change_vs_baseline'] * 100:+.1f}%)" if "change_vs_baseline" in row else ""
+        print(f"{row['scenario']:>18}: {row['items_per_second']:>9} items/s{change}  |  {stages}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+    if regressions:
+        print("Throughput regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
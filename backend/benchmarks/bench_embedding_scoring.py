@@ -0,0 +1,100 @@
+"""
+POST /api/embeddings/score: scoring precomputed face encodings, JSON vs binary float32 bodies.
+
+Builds the app on a temporary SQLite database with --identities enrolled people
+(synthetic embeddings), then for each --batch size posts that many encodings as a JSON
+list and as a raw float32 body, with and without persist, and reports request time,
+embeddings/s and the body size (median over --repeat requests).
+
+Usage (from backend/):
+    python -m benchmarks.bench_embedding_scoring --batch 1000 10000 50000 --identities 1000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def _request(batch: np.ndarray, body: str, persist: bool) -> dict:
+    # Built before timing: the client's own serialization is not part of the server's cost.
+    if body == "json":
+        return {
+            "path": "/api/embeddings/score",
+            "data": json.dumps({"embeddings": batch.tolist(), "persist": persist}),
+            "content_type": "application/json",
+        }
+    return {
+        "path": f"/api/embeddings/score?persist={str(persist).lower()}",
+        "data": batch.astype("<f4").tobytes(),
+        "content_type": "application/octet-stream",
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--identities", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_embedding_scoring_") as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        os.environ["FACE_MODELS_PREWARM"] = "false"
+        os.environ["MAX_EMBEDDINGS_PER_REQUEST"] = str(max(args.batch))
+        os.environ["MAX_UPLOAD_MB"] = "1024"
+        from app import create_app
+        from embedding_codec import EMBEDDING_DIM
+        from models import TruthImage
+
+        app = create_app(start_job_runner=False)
+        rng = np.random.default_rng(0)
+        centers = rng.normal(0.0, 0.1, size=(args.identities, EMBEDDING_DIM)).astype(np.float32)
+        with app.session_local() as db:  # type: ignore[attr-defined]
+            db.add_all(
+                TruthImage(image_path="bench.jpg", label=f"p{i}", embedding=c.tobytes()) for i, c in enumerate(centers)
+            )
+            db.commit()
+
+        client = app.test_client()
+        for n in args.batch:
+            batch = centers[rng.integers(0, args.identities, size=n)] + rng.normal(
+                0.0, 0.04, size=(n, EMBEDDING_DIM)
+            ).astype(np.float32)
+            for body in ("json", "binary"):
+                for persist in (False, True):
+                    request = _request(batch, body, persist)
+                    times = []
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        response = client.post(**request)
+                        times.append(time.perf_counter() - start)
+                        if response.status_code != 200:
+                            raise RuntimeError(f"{response.status_code}: {response.get_data(as_text=True)[:200]}")
+                    seconds = statistics.median(times)
+                    row = {
+                        "batch": n,
+                        "body": body,
+                        "persist": persist,
+                        "body_mb": round(len(request["data"]) / 1024 / 1024, 2),
+                        "request_ms": round(seconds * 1000, 1),
+                        "embeddings_per_second": round(n / seconds),
+                    }
+                    results.append(row)
+                    print(json.dumps(row))
+        app.db_engine.dispose()  # type: ignore[attr-defined]
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
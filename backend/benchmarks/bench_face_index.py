@@ -0,0 +1,117 @@
+"""
+Face search index: exact brute force vs the IVF index (services/face_index.py).
+
+Fills a temporary SQLite database with synthetic embeddings (clustered like faces of
+--identities people: same-person distances around 0.45, different people above 1.0),
+then for each --faces size and mode reports load + build time, index memory, query
+latency (p50/p95 over --queries searches, including the exact re-rank of IVF candidates)
+and recall@k against exact search.
+
+Usage (from backend/):
+    python -m benchmarks.bench_face_index --faces 100000 1000000 --nprobe 8 32 64
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from database import create_db_engine
+from embedding_codec import EMBEDDING_DIM
+from models import Base, TestImage
+from services.face_index import FaceIndex, face_index, search_faces
+
+
+def _synthetic_faces(n: int, identities: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0.0, 0.1, size=(identities, EMBEDDING_DIM)).astype(np.float32)
+    noise = rng.normal(0.0, 0.028, size=(n, EMBEDDING_DIM)).astype(np.float32)
+    return centers[rng.integers(0, identities, size=n)] + noise
+
+
+def _fill(session_factory, vectors: np.ndarray, chunk: int = 20_000) -> None:
+    with session_factory() as db:
+        for start in range(0, len(vectors), chunk):
+            rows = [
+                {"image_path": "bench.jpg", "match_status": "NO_MATCH", "embedding": v.tobytes()}
+                for v in vectors[start : start + chunk]
+            ]
+            db.execute(insert(TestImage), rows)
+        db.commit()
+
+
+def _run(session_factory, index: FaceIndex, queries: np.ndarray, truth: list[set[int]], k: int) -> dict:
+    with session_factory() as db:
+        start = time.perf_counter()
+        index.refresh(db)
+        build = time.perf_counter() - start
+
+        latencies, recall = [], 0.0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            hits = search_faces(db, query, k)
+            latencies.append(time.perf_counter() - start)
+            recall += len({h.row_id for h in hits} & expected) / k
+    stats = index.stats()
+    return {
+        "mode": stats["mode"],
+        "nprobe": stats["nprobe"] if stats["mode"] == "ivf" else None,
+        "partitions": stats["partitions"],
+        "load_build_seconds": round(build, 3),
+        "index_mb": round(stats["bytes"] / 1024 / 1024, 1),
+        "query_ms_p50": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "query_ms_p95": round(float(np.percentile(latencies, 95)) * 1000, 3),
+        f"recall_at_{k}": round(recall / len(queries), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, nargs="+", default=[50_000, 300_000])
+    parser.add_argument("--identities", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.faces:
+        with tempfile.TemporaryDirectory(prefix="bench_face_index_") as tmp:
+            engine = create_db_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+            Base.metadata.create_all(engine)
+            session_factory = sessionmaker(bind=engine)
+            vectors = _synthetic_faces(n, args.identities, seed=n)
+            _fill(session_factory, vectors)
+
+            # Queries: new photos of stored people; ground truth from an exact scan (ids start at 1).
+            rng = np.random.default_rng(0)
+            queries = vectors[rng.integers(0, n, size=args.queries)] + rng.normal(
+                0.0, 0.028, size=(args.queries, EMBEDDING_DIM)
+            ).astype(np.float32)
+            sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+            truth = []
+            for q in queries:
+                d = sq_norms - 2.0 * (vectors @ q)
+                truth.append({int(i) + 1 for i in np.argpartition(d, args.k)[: args.k]})
+
+            configs = [("exact", n, args.nprobe[0])] + [("ivf", 0, nprobe) for nprobe in args.nprobe]
+            for _name, exact_max, nprobe in configs:
+                face_index.configure(exact_max=exact_max, nprobe=nprobe, rebuild_ratio=0.2)
+                row = {"faces": n, **_run(session_factory, face_index, queries, truth, args.k)}
+                results.append(row)
+                print(json.dumps(row))
+            engine.dispose()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Compare the old seek-per-second frame extraction with the sequential-decode sampler.
+
+Generates synthetic videos locally (no fixtures needed) and times both implementations.
+
+Usage (from backend/):
+    python -m benchmarks.bench_frame_sampler --minutes 2 5 --fps 30 --gop 250
+    python -m benchmarks.bench_frame_sampler --video /path/to/camera_clip.mp4
+
+The gap grows with the keyframe interval. OpenCV's bundled mp4v writer ignores --gop on
+most builds (keyframe every ~12 frames), so pass real H.264/HEVC clips with --video to
+see the effect of long GOPs.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+import cv2
+import numpy as np
+
+from services.video_service import ExtractedFrame, SamplingPolicy, sample_frames
+
+
+def seek_per_second_sampler(video_path: str, output_dir: str, max_seconds: Optional[int] = None) -> Iterator[ExtractedFrame]:
+    """
+    The previous implementation of extract_frames_one_per_second (kept here as the baseline):
+    one CAP_PROP_POS_FRAMES seek per sampled second.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError("Could not open video")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    fps = float(fps) if fps > 0 else 25.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    seconds_to_process = int(total_frames / fps) if total_frames > 0 else 0
+    if max_seconds is not None:
+        seconds_to_process = min(seconds_to_process, int(max_seconds))
+
+    for sec in range(seconds_to_process):
+        frame_idx = int(sec * fps)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        ok, frame = cap.read()
+        if not ok:
+            break
+        out_path = os.path.join(output_dir, f"frame_{sec:06d}.jpg")
+        cv2.imwrite(out_path, frame)
+        yield ExtractedFrame(frame_path=out_path, frame_index=frame_idx, timestamp_sec=sec)
+    cap.release()
+
+
+def make_synthetic_video(
+    path: str,
+    seconds: int,
+    fps: int,
+    size: tuple[int, int],
+    fourcc: str,
+    gop: int,
+    overlay: Optional[Callable[[int, np.ndarray], None]] = None,
+) -> str:
+    """
+    Moving gradient + frame counter, so the codec cannot collapse frames to nothing.
+    `gop` is honoured by backends that support VIDEOWRITER_PROP_KEYFRAME_SPACING (best effort).
+    `overlay(frame_index, bgr_frame)` may draw into each frame before it is written.
+    """
+    width, height = size
+    params = []
+    keyframe_prop = getattr(cv2, "VIDEOWRITER_PROP_KEYFRAME_SPACING", None)
+    if keyframe_prop is not None:
+        params = [keyframe_prop, gop]
+    writer = cv2.VideoWriter(path, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height), params)
+    if not writer.isOpened():
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open a video writer for codec {fourcc}")
+
+    xs = np.linspace(0, 255, width, dtype=np.float32)
+    for i in range(seconds * fps):
+        shift = (i * 4) % width
+        row = np.roll(xs, shift).astype(np.uint8)
+        frame = np.repeat(np.repeat(row[None, :, None], height, axis=0), 3, axis=2)
+        cv2.putText(frame, f"{i}", (20, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        if overlay is not None:
+            overlay(i, frame)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def _time_sampler(fn, video_path: str, out_dir: str) -> dict:
+    start = time.perf_counter()
+    count = sum(1 for _ in fn(video_path, out_dir))
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 3), "frames": count, "ms_per_frame": round(elapsed * 1000 / max(count, 1), 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1.0, 3.0])
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--gop", type=int, default=250, help="keyframe interval requested from the encoder")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--codec", default="mp4v", help="fourcc, e.g. mp4v, avc1, hev1")
+    parser.add_argument("--video", nargs="*", default=[], help="benchmark existing video files instead")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        videos = list(args.video)
+        if not videos:
+            for minutes in args.minutes:
+                seconds = int(minutes * 60)
+                videos.append(
+                    make_synthetic_video(
+                        str(Path(tmp) / f"synthetic_{seconds}s.mp4"),
+                        seconds,
+                        args.fps,
+                        (args.width, args.height),
+                        args.codec,
+                        args.gop,
+                    )
+                )
+
+        for video in videos:
+            seek = _time_sampler(seek_per_second_sampler, video, str(Path(tmp) / "seek"))
+            sequential = _time_sampler(
+                lambda v, o: sample_frames(v, o, SamplingPolicy()),
+                video,
+                str(Path(tmp) / "sequential"),
+            )
+            row = {
+                "video": Path(video).name,
+                "seek_per_second": seek,
+                "sequential_decode": sequential,
+                "speedup": round(seek["seconds"] / max(sequential["seconds"], 1e-9), 2),
+            }
+            if not args.video:
+                row.update({"fps": args.fps, "gop": args.gop, "codec": args.codec})
+            results.append(row)
+            print(
+                f"{row['video']:>24}: seek {seek['seconds']:>8.2f}s  "
+                f"sequential {sequential['seconds']:>8.2f}s  speedup x{row['speedup']}"
+            )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
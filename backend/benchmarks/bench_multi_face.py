@@ -0,0 +1,147 @@
+"""
+Multi-face matching on crowded frames: per-frame cost and whether the enrolled person is found.
+
+Builds synthetic crowd frames (--width x --height) by pasting faces cut from a local set of
+photos: each frame holds --faces-per-frame faces of different people at random sizes and
+places, one of them the enrolled "target" person. Photos of the same person (closer than
+--threshold to an earlier photo) are dropped, so no two faces in a crowd match each other.
+Each frame is detected + encoded as a video job does (`extract_faces_from_array`) and
+matched with `match_faces`, once with max_faces=1 (the single-face path) and once per
+--max-faces value. The report gives per frame: latency (mean / p95), time in detection and
+encoding, faces encoded, and the share of frames where the target was found (MATCH with a
+box on the target's face).
+
+Usage (from backend/):
+    python -m benchmarks.bench_multi_face --images ./uploads/truth --faces-per-frame 4 8 16 --max-faces 4 16
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from services.face_service import (
+    DETECT_ACCURATE,
+    DETECT_FAST,
+    DetectionProfile,
+    TruthGallery,
+    extract_faces,
+    extract_faces_from_array,
+    match_faces,
+)
+from services.timing import STAGE_DETECT, STAGE_ENCODE, StageRecorder
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+_MAX_SOURCE_FACES = 64
+
+
+def _people(root: Path, profile: DetectionProfile, threshold: float) -> list[tuple[np.ndarray, np.ndarray]]:
+    """(face crop with margin, embedding) of one face per distinct person, group photos included."""
+    people: list[tuple[np.ndarray, np.ndarray]] = []
+    for path in sorted(p for p in root.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES):
+        faces = extract_faces(str(path), replace(profile, max_faces=_MAX_SOURCE_FACES))
+        if faces is None:
+            continue
+        image = cv2.cvtColor(cv2.imread(str(path)), cv2.COLOR_BGR2RGB)
+        for i in range(len(faces)):
+            if any(np.linalg.norm(e - faces.embeddings[i]) < threshold for _, e in people):
+                continue
+            top, right, bottom, left = faces.box(i)
+            margin = int((bottom - top) * 0.6)
+            crop = image[max(0, top - margin) : bottom + margin, max(0, left - margin) : right + margin]
+            people.append((crop, faces.embeddings[i]))
+    return people
+
+
+def _crowd(people, n: int, width: int, height: int, rng: np.random.Generator) -> tuple[np.ndarray, tuple]:
+    """A frame with n different people (person 0 among them); returns it and the target's slot."""
+    frame = rng.integers(60, 120, size=(height, width, 3), dtype=np.uint8)
+    cols = math.ceil(math.sqrt(n * width / height))
+    rows = math.ceil(n / cols)
+    slot_w, slot_h = width // cols, height // rows
+    chosen = [0] + list(rng.choice(np.arange(1, len(people)), size=n - 1, replace=len(people) - 1 < n - 1))
+    slots = rng.permutation(rows * cols)[:n]
+    target = None
+    for person, slot in zip(chosen, slots):
+        crop = people[person][0]
+        scale = min(slot_w, slot_h) * rng.uniform(0.6, 0.95) / max(crop.shape[:2])
+        face = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        y = (slot // cols) * slot_h + int(rng.integers(0, slot_h - face.shape[0] + 1))
+        x = (slot % cols) * slot_w + int(rng.integers(0, slot_w - face.shape[1] + 1))
+        frame[y : y + face.shape[0], x : x + face.shape[1]] = face
+        if person == 0:
+            target = (y, x + face.shape[1], y + face.shape[0], x)
+    return frame, target
+
+
+def _inside(box, area) -> bool:
+    top, right, bottom, left = box
+    cy, cx = (top + bottom) / 2, (left + right) / 2
+    return area[0] <= cy <= area[2] and area[3] <= cx <= area[1]
+
+
+def _run(frames, targets, gallery, profile: DetectionProfile, threshold: float) -> dict:
+    latencies, encoded, found = [], 0, 0
+    with StageRecorder() as recorder:
+        for frame, target in zip(frames, targets):
+            start = time.perf_counter()
+            faces = extract_faces_from_array(frame, profile)
+            (match,), _ = match_faces(gallery, [faces], threshold)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            encoded += len(faces) if faces is not None else 0
+            found += match.match_status == "MATCH" and match.face_box is not None and _inside(match.face_box, target)
+    stages = recorder.snapshot()
+    lat = np.asarray(latencies)
+    return {
+        "max_faces": profile.max_faces,
+        "ms_per_frame": round(float(lat.mean()), 1),
+        "ms_p95": round(float(np.percentile(lat, 95)), 1),
+        "detect_ms": round(stages.get(STAGE_DETECT, {}).get("total_ms", 0.0) / len(frames), 1),
+        "encode_ms": round(stages.get(STAGE_ENCODE, {}).get("total_ms", 0.0) / len(frames), 1),
+        "faces_encoded": round(encoded / len(frames), 1),
+        "target_found": round(found / len(frames), 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="folder of face photos (portraits or group photos)")
+    parser.add_argument("--faces-per-frame", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--max-faces", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--frames", type=int, default=10, help="frames per crowd size")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--profile", choices=[DETECT_ACCURATE, DETECT_FAST], default=DETECT_ACCURATE)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    profile = DetectionProfile(mode=args.profile)
+    people = _people(Path(args.images).expanduser(), profile, args.threshold)
+    if len(people) < 2:
+        raise SystemExit("Need photos of at least two different people")
+    print(f"{len(people)} different people")
+    gallery = TruthGallery.build([1], ["target"], people[0][1][None, :])
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in args.faces_per_frame:
+        crowd = [_crowd(people, n, args.width, args.height, rng) for _ in range(args.frames)]
+        frames, targets = [f for f, _ in crowd], [t for _, t in crowd]
+        for max_faces in [1] + args.max_faces:
+            row = {"faces_per_frame": n, **_run(frames, targets, gallery, replace(profile, max_faces=max_faces), args.threshold)}
+            results.append(row)
+            print(json.dumps(row))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
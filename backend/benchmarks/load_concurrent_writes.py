@@ -0,0 +1,187 @@
+"""
+Load test for the frame-result write path: several video jobs write results at once
+while a reader polls the newest results, the way the Results page does.
+
+Two write patterns are compared, each on a fresh SQLite file:
+- legacy: rollback journal, synchronous=FULL, `db.add()` + `db.flush()` per frame inside one
+  transaction that stays open for the whole video (the write lock is held from the first
+  flush to the final commit, so concurrent jobs queue behind each other)
+- batched: WAL, synchronous=NORMAL, results buffered and bulk-inserted every --flush-rows
+  frames in a short transaction (what video jobs do now)
+
+Writers run in separate processes like the job workers; --frame-ms simulates the face
+encoding time per frame. Reported: wall time, rows/s, "database is locked" errors and
+reader latency.
+
+Usage (from backend/):
+    python -m benchmarks.load_concurrent_writes --writers 4 --frames 300 --frame-ms 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import EngineOptions, bulk_insert, create_db_engine
+from models import Base, TestVideo, VideoMatch
+
+PATTERNS = {
+    "legacy": EngineOptions(sqlite_journal_mode="delete", sqlite_synchronous="full"),
+    "batched": EngineOptions(sqlite_journal_mode="wal", sqlite_synchronous="normal"),
+}
+
+
+def _row(video_id: int, i: int) -> dict:
+    return {
+        "video_id": video_id,
+        "frame_path": "",
+        "timestamp_sec": float(i),
+        "match_status": "NO_MATCH",
+        "confidence_score": 0.0,
+    }
+
+
+def _writer(db_url: str, pattern: str, busy_timeout: float, video_id: int, frames: int, frame_ms: float, flush_rows: int) -> dict:
+    options = PATTERNS[pattern]
+    options = EngineOptions(options.sqlite_journal_mode, options.sqlite_synchronous, busy_timeout)
+    Session = sessionmaker(bind=create_db_engine(db_url, options), autoflush=False)
+    errors = 0
+    written = 0
+    started_at = time.time()
+    start = time.perf_counter()
+    with Session() as db:
+        if pattern == "legacy":
+            try:
+                for i in range(frames):
+                    time.sleep(frame_ms / 1000.0)
+                    db.add(VideoMatch(**_row(video_id, i)))
+                    db.flush()
+                db.commit()
+                written = frames
+            except OperationalError:
+                errors += 1
+                db.rollback()
+        else:
+            pending: list[dict] = []
+            for i in range(frames):
+                time.sleep(frame_ms / 1000.0)
+                pending.append(_row(video_id, i))
+                if len(pending) >= flush_rows or i == frames - 1:
+                    try:
+                        bulk_insert(db, VideoMatch, pending)
+                        db.commit()
+                        written += len(pending)
+                    except OperationalError:
+                        errors += 1
+                        db.rollback()
+                    pending = []
+    return {
+        "seconds": time.perf_counter() - start,
+        "errors": errors,
+        "rows": written,
+        "started_at": started_at,
+        "finished_at": time.time(),
+    }
+
+
+def _reader(db_url: str, pattern: str, stop: threading.Event, latencies: list[float], errors: list[int]) -> None:
+    Session = sessionmaker(bind=create_db_engine(db_url, PATTERNS[pattern]))
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with Session() as db:
+                db.execute(select(VideoMatch).order_by(VideoMatch.id.desc()).limit(100)).scalars().all()
+            latencies.append((time.perf_counter() - start) * 1000.0)
+        except OperationalError:
+            errors.append(1)
+        time.sleep(0.01)
+
+
+def run_pattern(pattern: str, args, tmp: str) -> dict:
+    db_url = f"sqlite:///{Path(tmp) / f'{pattern}.db'}"
+    engine = create_db_engine(db_url, PATTERNS[pattern])
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        videos = bulk_insert(db, TestVideo, [{"video_path": f"v{i}.mp4"} for i in range(args.writers)], returning=True)
+        video_ids = [v.id for v in videos]
+        db.commit()
+    engine.dispose()
+
+    stop = threading.Event()
+    latencies: list[float] = []
+    read_errors: list[int] = []
+    reader = threading.Thread(target=_reader, args=(db_url, pattern, stop, latencies, read_errors), daemon=True)
+    reader.start()
+
+    with ProcessPoolExecutor(args.writers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(_writer, db_url, pattern, args.busy_timeout, vid, args.frames, args.frame_ms, args.flush_rows)
+            for vid in video_ids
+        ]
+        writers = [f.result() for f in futures]
+    # From the first writer starting to the last one finishing (process start-up excluded).
+    wall = max(w["finished_at"] for w in writers) - min(w["started_at"] for w in writers)
+    stop.set()
+    reader.join()
+
+    rows = sum(w["rows"] for w in writers)
+    lat = np.asarray(latencies) if latencies else np.zeros(1)
+    return {
+        "pattern": pattern,
+        "writers": args.writers,
+        "frames_per_writer": args.frames,
+        "wall_seconds": round(wall, 3),
+        "rows_written": rows,
+        "rows_per_second": round(rows / wall, 1),
+        "writer_seconds_max": round(max(w["seconds"] for w in writers), 3),
+        "write_lock_errors": sum(w["errors"] for w in writers),
+        "reader_queries": len(latencies),
+        "reader_errors": len(read_errors),
+        "reader_ms_p50": round(float(np.percentile(lat, 50)), 2),
+        "reader_ms_p95": round(float(np.percentile(lat, 95)), 2),
+        # With no contention every writer needs about frames * frame_ms.
+        "ideal_seconds": round(args.frames * args.frame_ms / 1000.0, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--frame-ms", type=float, default=5.0, help="simulated encoding time per frame")
+    parser.add_argument("--flush-rows", type=int, default=100)
+    parser.add_argument("--busy-timeout", type=float, default=5.0, help="SQLite lock wait (seconds)")
+    parser.add_argument("--patterns", nargs="+", default=list(PATTERNS), choices=list(PATTERNS))
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for pattern in args.patterns:
+            row = run_pattern(pattern, args, tmp)
+            results.append(row)
+            print(
+                f"{pattern:>8}: wall {row['wall_seconds']:>7.2f}s (ideal {row['ideal_seconds']}s)  "
+                f"{row['rows_per_second']:>9.1f} rows/s  lock errors {row['write_lock_errors']}  "
+                f"reader p95 {row['reader_ms_p95']} ms"
+            )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,12 +13,181 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///face_matching.db")
 
+    # SQLite: WAL lets result reads run while jobs write; "normal" sync is durable with WAL.
+    DB_SQLITE_JOURNAL_MODE = os.getenv("DB_SQLITE_JOURNAL_MODE", "wal")
+    DB_SQLITE_SYNCHRONOUS = os.getenv("DB_SQLITE_SYNCHRONOUS", "normal")
+    DB_SQLITE_BUSY_TIMEOUT = float(os.getenv("DB_SQLITE_BUSY_TIMEOUT", "30"))
+    # Connection pool for server databases (PostgreSQL/MySQL URLs); ignored for SQLite.
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
     # Uploads live inside backend/uploads/
     UPLOAD_FOLDER_NAME = os.getenv("UPLOAD_FOLDER", "uploads")
     UPLOAD_FOLDER = str(BASE_DIR / UPLOAD_FOLDER_NAME)
 
+    # /uploads/<image>?w=<px> thumbnails: widths snap up to one of THUMBNAIL_WIDTHS, rendered
+    # copies live in THUMBNAIL_CACHE_FOLDER (least recently served evicted past the size cap).
+    THUMBNAIL_CACHE_FOLDER = str(BASE_DIR / os.getenv("THUMBNAIL_CACHE_FOLDER", "thumbnail_cache"))
+    THUMBNAIL_CACHE_MAX_MB = int(os.getenv("THUMBNAIL_CACHE_MAX_MB", "512"))
+    THUMBNAIL_WIDTHS = tuple(int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "64,128,256,512,1024").split(","))
+    THUMBNAIL_JPEG_QUALITY = int(os.getenv("THUMBNAIL_JPEG_QUALITY", "80"))
+    # Cache-Control max-age for uploads whose names carry a content hash/uuid (never rewritten).
+    UPLOAD_CACHE_MAX_AGE = int(os.getenv("UPLOAD_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+
+    # Request limits: body size (larger uploads get 413 before anything is read) and files
+    # per multi-file upload (checked before any file is stored).
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_UPLOAD_MB", "2048")) * 1024 * 1024
+    MAX_IMAGES_PER_REQUEST = int(os.getenv("MAX_IMAGES_PER_REQUEST", "200"))
+    MAX_VIDEOS_PER_REQUEST = int(os.getenv("MAX_VIDEOS_PER_REQUEST", "10"))
+    # POST /api/embeddings/score: precomputed 128-d encodings per request (512 bytes each as float32).
+    MAX_EMBEDDINGS_PER_REQUEST = int(os.getenv("MAX_EMBEDDINGS_PER_REQUEST", "50000"))
+
+    # Admission control, per app process: at most ADMISSION_FACE_MAX_ACTIVE requests run the
+    # face pipeline (image and truth uploads, archives, face search) at once and ADMISSION_FACE_MAX_QUEUED
+    # more wait, up to ADMISSION_QUEUE_TIMEOUT_SECONDS; past that 429 / 503 with Retry-After.
+    # Video uploads and /results/rescore (single slot, no queue) have their own gates. 0 = no limit. Keep GUNICORN_THREADS above
+    # active + queued of both gates, so excess requests reach a gate and are refused right away.
+    ADMISSION_FACE_MAX_ACTIVE = int(os.getenv("ADMISSION_FACE_MAX_ACTIVE", "2"))
+    ADMISSION_FACE_MAX_QUEUED = int(os.getenv("ADMISSION_FACE_MAX_QUEUED", "2"))
+    ADMISSION_UPLOAD_MAX_ACTIVE = int(os.getenv("ADMISSION_UPLOAD_MAX_ACTIVE", "2"))
+    ADMISSION_UPLOAD_MAX_QUEUED = int(os.getenv("ADMISSION_UPLOAD_MAX_QUEUED", "1"))
+    ADMISSION_RESCORE_MAX_ACTIVE = int(os.getenv("ADMISSION_RESCORE_MAX_ACTIVE", "1"))
+    ADMISSION_RESCORE_MAX_QUEUED = int(os.getenv("ADMISSION_RESCORE_MAX_QUEUED", "0"))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "30"))
+
     FACE_DISTANCE_THRESHOLD = float(os.getenv("FACE_DISTANCE_THRESHOLD", "0.6"))
 
+    # Face detection profile: "accurate" (full-resolution decode + detection) or, opt-in,
+    # "fast" (JPEG draft decode, detection on a copy no larger than FACE_DETECT_MAX_SIDE,
+    # encoding on a crop where the face is about FACE_ENCODE_FACE_SIDE px; small faces can be
+    # missed). Compare on your own photos with `python -m benchmarks.bench_detection_profiles`
+    # before switching.
+    FACE_DETECTION_PROFILE = os.getenv("FACE_DETECTION_PROFILE", "accurate")
+    FACE_DETECT_MAX_SIDE = int(os.getenv("FACE_DETECT_MAX_SIDE", "1280"))
+    FACE_ENCODE_FACE_SIDE = int(os.getenv("FACE_ENCODE_FACE_SIDE", "150"))
+    FACE_DETECT_UPSAMPLE = int(os.getenv("FACE_DETECT_UPSAMPLE", "1"))  # number_of_times_to_upsample
+    FACE_DETECT_MODEL = os.getenv("FACE_DETECT_MODEL", "hog")  # "hog" or "cnn" (GPU)
+    FACE_ENCODING_JITTERS = int(os.getenv("FACE_ENCODING_JITTERS", "1"))  # num_jitters
+    FACE_ENCODING_MODEL = os.getenv("FACE_ENCODING_MODEL", "small")  # "small" (5 landmarks) or "large" (68)
+    # Every face of an image / frame is detected; the FACE_MAX_FACES largest are encoded and
+    # the one closest to an enrolled identity is the result. 1 (default) = only the first
+    # face dlib reports. Raising it finds enrolled people in group photos and crowds, but
+    # each extra face costs one more descriptor pass per image or frame, and embeddings are
+    # cached under a separate variant (re-uploads encode again). Measure with
+    # `python -m benchmarks.bench_multi_face` first.
+    FACE_MAX_FACES = int(os.getenv("FACE_MAX_FACES", "1"))
+
+    # Load face_recognition/dlib models while the app starts (in the gunicorn master before
+    # fork when preloaded) instead of on the first request that needs them.
+    FACE_MODELS_PREWARM = os.getenv("FACE_MODELS_PREWARM", "true").lower() in ("1", "true", "yes")
+
+    # The truth gallery is cached per process; other processes' enrollments are picked up
+    # within this many seconds (0 = check the DB version counter on every request).
+    TRUTH_CACHE_CHECK_INTERVAL = float(os.getenv("TRUTH_CACHE_CHECK_INTERVAL", "1.0"))
+
+    # Content-addressed embedding cache (keyed by upload sha256 + frame timestamp).
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+    # Each process counts the cache table for eviction at most this often (seconds), or
+    # sooner once its own stores could have pushed it past EMBEDDING_CACHE_MAX_ENTRIES.
+    EMBEDDING_CACHE_EVICT_INTERVAL = float(os.getenv("EMBEDDING_CACHE_EVICT_INTERVAL", "60"))
+
+    # Face search (POST /api/faces/search) over the embeddings of every test image and frame:
+    # exact brute force up to FACE_INDEX_EXACT_MAX faces, above that an approximate IVF index
+    # (int8 vectors in k-means partitions, FACE_INDEX_NPROBE partitions scanned per query),
+    # retrained once FACE_INDEX_REBUILD_RATIO more faces were added since it was built.
+    # A background thread per process builds and retrains it, and every
+    # FACE_INDEX_REFRESH_INTERVAL seconds picks up rows committed out of id order: those
+    # created up to FACE_INDEX_REFRESH_OVERLAP_SECONDS before the newest row it has (keep it
+    # above the longest insert transaction). Searches get 503 until the first build is done.
+    # FACE_INDEX_REFRESH_INTERVAL=0: no thread, the first search builds the index.
+    FACE_INDEX_EXACT_MAX = int(os.getenv("FACE_INDEX_EXACT_MAX", "200000"))
+    FACE_INDEX_NPROBE = int(os.getenv("FACE_INDEX_NPROBE", "32"))
+    FACE_INDEX_REBUILD_RATIO = float(os.getenv("FACE_INDEX_REBUILD_RATIO", "0.2"))
+    FACE_INDEX_REFRESH_INTERVAL = float(os.getenv("FACE_INDEX_REFRESH_INTERVAL", "10"))
+    FACE_INDEX_REFRESH_OVERLAP_SECONDS = float(os.getenv("FACE_INDEX_REFRESH_OVERLAP_SECONDS", "60"))
+    FACE_SEARCH_MAX_K = int(os.getenv("FACE_SEARCH_MAX_K", "100"))
+
+    # CPU cores one app process may keep busy with face work (0 = the cores split between the
+    # WEB_CONCURRENCY gunicorn workers). Upload encoding (FACE_WORKERS) and video shards
+    # (VIDEO_SHARD_WORKERS per job) default to halves of it, so both running at once do not
+    # oversubscribe the machine. On a web-only instance (VIDEO_JOBS_ENABLED=false) set
+    # FACE_WORKERS to the whole budget.
+    CPU_BUDGET = int(os.getenv("CPU_BUDGET", "0")) or max(
+        1, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    )
+
+    # Processes used to encode faces of a multi-image upload (0 = half the CPU_BUDGET).
+    # Video jobs already run in their own processes; they encode frames with VIDEO_FACE_WORKERS each.
+    FACE_WORKERS = int(os.getenv("FACE_WORKERS", "0")) or max(1, CPU_BUDGET // 2)
+    VIDEO_FACE_WORKERS = int(os.getenv("VIDEO_FACE_WORKERS", "1"))
+    VIDEO_FRAME_BATCH_SIZE = int(os.getenv("VIDEO_FRAME_BATCH_SIZE", "8"))
+    # Video jobs buffer frame results and bulk-insert them in one short transaction once
+    # this many rows are pending or this many seconds passed (progress updates with them).
+    VIDEO_RESULT_FLUSH_ROWS = int(os.getenv("VIDEO_RESULT_FLUSH_ROWS", "200"))
+    VIDEO_RESULT_FLUSH_SECONDS = float(os.getenv("VIDEO_RESULT_FLUSH_SECONDS", "2.0"))
+
+    # POST /api/test-images/archive: images per embed/match/commit batch (one progress line
+    # each), and limits on what an archive may contain (larger members are skipped unread).
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "32"))
+    ARCHIVE_MAX_ENTRIES = int(os.getenv("ARCHIVE_MAX_ENTRIES", "50000"))
+    ARCHIVE_MAX_ENTRY_MB = int(os.getenv("ARCHIVE_MAX_ENTRY_MB", "50"))
+
+    # Video frame sampling: "fps" (VIDEO_SAMPLE_FPS frames per second), "every_n"
+    # (every VIDEO_SAMPLE_EVERY_N-th decoded frame), "keyframes" (needs FFmpeg backend) or "adaptive".
+    VIDEO_SAMPLING_MODE = os.getenv("VIDEO_SAMPLING_MODE", "fps")
+    VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "1.0"))
+    VIDEO_SAMPLE_EVERY_N = int(os.getenv("VIDEO_SAMPLE_EVERY_N", "25"))
+
+    # "adaptive" sampling: VIDEO_SAMPLE_FPS grid, but a face is only re-encoded on a scene
+    # change, when its track is lost, or every VIDEO_ADAPTIVE_KEYFRAME_SECONDS; in between
+    # the last result is reused. Within VIDEO_CANDIDATE_WINDOW_SECONDS of a face closer than
+    # FACE_DISTANCE_THRESHOLD + VIDEO_CANDIDATE_MARGIN, frames are sampled at VIDEO_ADAPTIVE_DENSE_FPS.
+    VIDEO_ADAPTIVE_DENSE_FPS = float(os.getenv("VIDEO_ADAPTIVE_DENSE_FPS", "4.0"))
+    VIDEO_ADAPTIVE_KEYFRAME_SECONDS = float(os.getenv("VIDEO_ADAPTIVE_KEYFRAME_SECONDS", "10.0"))
+    VIDEO_SCENE_CHANGE_THRESHOLD = float(os.getenv("VIDEO_SCENE_CHANGE_THRESHOLD", "0.35"))
+    VIDEO_STATIC_THRESHOLD = float(os.getenv("VIDEO_STATIC_THRESHOLD", "0.06"))
+    VIDEO_TRACK_MIN_SCORE = float(os.getenv("VIDEO_TRACK_MIN_SCORE", "0.6"))
+    VIDEO_CANDIDATE_WINDOW_SECONDS = float(os.getenv("VIDEO_CANDIDATE_WINDOW_SECONDS", "2.0"))
+    VIDEO_CANDIDATE_MARGIN = float(os.getenv("VIDEO_CANDIDATE_MARGIN", "0.1"))
+
+    # Search jobs (upload with mode=search): look every VIDEO_SEARCH_COARSE_SECONDS first,
+    # refine hits to VIDEO_SEARCH_FINE_SECONDS, stop after VIDEO_SEARCH_MAX_MATCHES
+    # appearances (0 = all; the upload can override it with max_matches).
+    VIDEO_SEARCH_COARSE_SECONDS = float(os.getenv("VIDEO_SEARCH_COARSE_SECONDS", "10.0"))
+    VIDEO_SEARCH_FINE_SECONDS = float(os.getenv("VIDEO_SEARCH_FINE_SECONDS", "1.0"))
+    VIDEO_SEARCH_MAX_MATCHES = int(os.getenv("VIDEO_SEARCH_MAX_MATCHES", "1"))
+
+    # Which sampled video frames are written under uploads/frames/:
+    # "matches" (full frame for MATCH only), "thumbnails" (small JPEG for all), "all", "none".
+    FRAME_PERSIST_POLICY = os.getenv("FRAME_PERSIST_POLICY", "matches")
+    FRAME_THUMBNAIL_MAX_SIDE = int(os.getenv("FRAME_THUMBNAIL_MAX_SIDE", "320"))
+
+    # Background video jobs: number of worker processes, dispatcher poll interval (sec),
+    # and after how long a RUNNING job without progress is considered dead and re-queued.
+    VIDEO_JOBS_ENABLED = os.getenv("VIDEO_JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+    VIDEO_JOB_WORKERS = int(os.getenv("VIDEO_JOB_WORKERS", "2"))
+    VIDEO_JOB_POLL_INTERVAL = float(os.getenv("VIDEO_JOB_POLL_INTERVAL", "2.0"))
+    VIDEO_JOB_STALE_SECONDS = int(os.getenv("VIDEO_JOB_STALE_SECONDS", "600"))
+    # Video uploads are refused (503) while this many jobs are already waiting (0 = no limit).
+    VIDEO_JOB_MAX_QUEUED = int(os.getenv("VIDEO_JOB_MAX_QUEUED", "200"))
+
+    # Full runs ("fps" / "every_n" sampling) over a video longer than two
+    # VIDEO_SHARD_MIN_SECONDS ranges are split by time: VIDEO_SHARD_WORKERS processes per job
+    # each decode + encode one range (at most VIDEO_SHARD_MAX_SECONDS long, stored as it
+    # completes). 0 = share what FACE_WORKERS leaves of CPU_BUDGET between the VIDEO_JOB_WORKERS
+    # jobs; 1 = no splitting.
+    VIDEO_SHARD_WORKERS = int(os.getenv("VIDEO_SHARD_WORKERS", "0")) or max(
+        1, (CPU_BUDGET - FACE_WORKERS) // max(1, VIDEO_JOB_WORKERS)
+    )
+    VIDEO_SHARD_MIN_SECONDS = float(os.getenv("VIDEO_SHARD_MIN_SECONDS", "60"))
+    VIDEO_SHARD_MAX_SECONDS = float(os.getenv("VIDEO_SHARD_MAX_SECONDS", "300"))
+
+    # Prometheus-format /api/metrics: per-stage and per-route latency histograms, job gauges.
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
     FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:3000")
 
 
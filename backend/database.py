@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+SQLITE_JOURNAL_MODES = ("delete", "truncate", "persist", "memory", "wal", "off")
+SQLITE_SYNCHRONOUS_LEVELS = ("off", "normal", "full", "extra")
+
+# Rows per INSERT statement for bulk writes: bounded statement size and memory.
+INSERT_CHUNK_SIZE = 500
+
+
+@dataclass
+class EngineOptions:
+    """
+    Engine tuning. SQLite settings apply to file databases, pool settings to the others
+    (SQLite uses SQLAlchemy's default per-thread pool).
+    """
+
+    sqlite_journal_mode: str = "wal"  # readers never block the writer, and vice versa
+    sqlite_synchronous: str = "normal"  # safe with WAL: no fsync per commit, only at checkpoints
+    sqlite_busy_timeout: float = 30.0  # seconds to wait for the write lock
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+
+    @classmethod
+    def from_config(cls, config) -> "EngineOptions":
+        options = cls(
+            sqlite_journal_mode=str(config["DB_SQLITE_JOURNAL_MODE"]).lower(),
+            sqlite_synchronous=str(config["DB_SQLITE_SYNCHRONOUS"]).lower(),
+            sqlite_busy_timeout=float(config["DB_SQLITE_BUSY_TIMEOUT"]),
+            pool_size=int(config["DB_POOL_SIZE"]),
+            max_overflow=int(config["DB_MAX_OVERFLOW"]),
+            pool_recycle=int(config["DB_POOL_RECYCLE"]),
+            pool_pre_ping=bool(config["DB_POOL_PRE_PING"]),
+        )
+        if options.sqlite_journal_mode not in SQLITE_JOURNAL_MODES:
+            raise ValueError(f"Unknown SQLite journal mode: {options.sqlite_journal_mode}")
+        if options.sqlite_synchronous not in SQLITE_SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown SQLite synchronous level: {options.sqlite_synchronous}")
+        return options
+
+
+def create_db_engine(db_url: str, options: EngineOptions | None = None) -> Engine:
+    """
+    Build the SQLAlchemy engine used by the app and by background worker processes.
+    """
+    options = options or EngineOptions()
+
+    if not str(db_url).startswith("sqlite"):
+        return create_engine(
+            db_url,
+            echo=False,
+            pool_size=options.pool_size,
+            max_overflow=options.max_overflow,
+            pool_recycle=options.pool_recycle,
+            pool_pre_ping=options.pool_pre_ping,
+        )
+
+    # Improve SQLite dev experience: allow reuse across threads and wait for the write lock.
+    engine = create_engine(
+        db_url,
+        echo=False,
+        connect_args={"check_same_thread": False, "timeout": options.sqlite_busy_timeout},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={options.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={options.sqlite_synchronous}")
+        cursor.close()
+
+    return engine
+
+
+def bulk_insert(db: Session, model: type, rows: list[dict[str, Any]], returning: bool = False) -> list:
+    """
+    Insert many rows with a few multi-row INSERT statements (INSERT_CHUNK_SIZE rows each)
+    instead of one round-trip per ORM object. Column defaults apply to keys left out;
+    a None value is inserted as NULL (so rows mixing None and values stay one batch).
+    With `returning`, the inserted ORM objects are returned in input order.
+    The caller owns the transaction (commit right after, to keep it short).
+    """
+    inserted: list = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start : start + INSERT_CHUNK_SIZE]
+        if returning:
+            stmt = insert(model).returning(model, sort_by_parameter_order=True)
+            inserted.extend(db.scalars(stmt.execution_options(render_nulls=True), chunk).all())
+        else:
+            db.execute(insert(model).execution_options(render_nulls=True), chunk)
+    return inserted
+
+
+def insert_ignoring_duplicates(db: Session, model: type, rows: list[dict[str, Any]], index_elements: list[str]) -> None:
+    """
+    Multi-row INSERT that skips rows whose `index_elements` (a unique constraint) already
+    exist, in the database itself: no read-then-insert window in which another process
+    can store the same key and make the whole batch fail on the constraint.
+    SQLite and PostgreSQL use ON CONFLICT DO NOTHING, MySQL/MariaDB INSERT IGNORE.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        dialect_insert = None
+    if dialect_insert is not None:
+        stmt = dialect_insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    elif dialect in ("mysql", "mariadb"):
+        stmt = insert(model).prefix_with("IGNORE")
+    else:
+        raise NotImplementedError(f"No conflict-ignoring INSERT for the {dialect} dialect")
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.execute(stmt.execution_options(render_nulls=True), rows[start : start + INSERT_CHUNK_SIZE])
+
+
+def bulk_insert_ids(db: Session, model: type, rows: list[dict[str, Any]]) -> list[int]:
+    """
+    Like bulk_insert(returning=True), but only the new primary keys come back (in input
+    order), without building an ORM object per row: for batches of many thousand rows.
+    """
+    table = model.__table__
+    stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True).execution_options(render_nulls=True)
+    ids: list[int] = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        ids.extend(db.scalars(stmt, rows[start : start + INSERT_CHUNK_SIZE]).all())
+    return ids
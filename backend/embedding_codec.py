@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import json
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+EMBEDDING_DIM = 128
+EMBEDDING_DTYPE = np.dtype("<f4")  # little-endian float32: 512 bytes per face
+EMBEDDING_BYTES = EMBEDDING_DIM * EMBEDDING_DTYPE.itemsize
+
+EmbeddingLike = Union[np.ndarray, Sequence[float]]
+
+
+def encode_embedding(embedding: EmbeddingLike) -> bytes:
+    arr = np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+    if arr.shape != (EMBEDDING_DIM,):
+        raise ValueError(f"Expected a {EMBEDDING_DIM}-d embedding, got shape {arr.shape}")
+    return arr.tobytes()
+
+
+def decode_embedding(value: Union[bytes, bytearray, memoryview, str]) -> np.ndarray:
+    """
+    Blob -> read-only float32 view over the bytes (no copy).
+    Legacy rows that still hold a JSON list are decoded too.
+    """
+    if isinstance(value, str):
+        return np.asarray(json.loads(value), dtype=EMBEDDING_DTYPE)
+    if len(value) != EMBEDDING_BYTES:
+        raise ValueError(f"Embedding blob must be {EMBEDDING_BYTES} bytes, got {len(value)}")
+    return np.frombuffer(value, dtype=EMBEDDING_DTYPE)
+
+
+def decode_embeddings(values: Iterable[bytes]) -> np.ndarray:
+    """
+    Many blobs -> one (N x 128) float32 matrix with a single copy (join + frombuffer).
+    """
+    joined = b"".join(values)
+    if len(joined) % EMBEDDING_BYTES:
+        raise ValueError("Embedding blobs must all be 512 bytes")
+    return np.frombuffer(joined, dtype=EMBEDDING_DTYPE).reshape(-1, EMBEDDING_DIM)
+
+
+class EmbeddingBlob(TypeDecorator):
+    """
+    Column type for face embeddings: stored as a fixed-width float32 blob,
+    loaded as a numpy array. Use it for every model that stores embeddings.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[EmbeddingLike], dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        return encode_embedding(value)
+
+    def process_result_value(self, value: Optional[bytes], dialect) -> Optional[np.ndarray]:
+        if value is None:
+            return None
+        return decode_embedding(value)
@@ -0,0 +1,69 @@
+"""
+gunicorn settings for `gunicorn -c gunicorn.conf.py wsgi:app` (see wsgi.py).
+Every value can be overridden with the usual GUNICORN_* / WEB_CONCURRENCY env vars below.
+"""
+import gc
+import logging
+import os
+import time
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# config.py splits the CPU cores between the workers (CPU_BUDGET); the app is loaded after this file.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# Threads per worker: uploads spend most of their time in I/O and in the face pool. More
+# threads than the admission gates admit + queue (config.py), so the excess is refused fast.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Multi-image uploads are encoded inside the request.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+# Build the app (and load the face models) once in the master; workers inherit it on fork.
+preload_app = True
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def when_ready(server):
+    from services.metrics import format_memory, process_memory
+
+    # Everything allocated so far (app, models) is moved out of the GC's reach, so collections
+    # in the workers do not write to those pages and break copy-on-write sharing.
+    gc.freeze()
+    logger.info("Master ready, %s", format_memory(process_memory()))
+
+
+def pre_fork(server, worker):
+    worker.fork_started = time.perf_counter()
+
+
+def post_fork(server, worker):
+    from services.face_index import face_index
+    from wsgi import app
+
+    # Connections opened by the master (schema upgrade) must not be shared with the children.
+    app.db_engine.dispose(close=False)
+    if app.config["VIDEO_JOBS_ENABLED"]:
+        app.video_job_runner.start()
+    if app.config["FACE_INDEX_REFRESH_INTERVAL"] > 0:
+        face_index.start(app.session_local, app.config["FACE_INDEX_REFRESH_INTERVAL"])
+
+
+def post_worker_init(worker):
+    from services.face_service import face_models
+    from services.metrics import format_memory, process_memory
+
+    logger.info(
+        "Worker %s ready %.3fs after fork (face models %s), %s",
+        worker.pid,
+        time.perf_counter() - worker.fork_started,
+        "shared" if face_models.loaded else "lazy",
+        format_memory(process_memory()),
+    )
+
+
+def worker_exit(server, worker):
+    from services.face_index import face_index
+    from wsgi import app
+
+    app.video_job_runner.shutdown()
+    face_index.shutdown()
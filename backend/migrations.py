@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+
+from sqlalchemy import LargeBinary, insert, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from embedding_codec import encode_embedding
+from models import Base, VideoSegment
+from services.segments import build_segments
+
+logger = logging.getLogger(__name__)
+
+_LEGACY_FRAME_RE = re.compile(r"frame_(\d+)\.jpg$")
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl_type: str) -> bool:
+    """Returns True if the column was added (i.e. this DB predates it)."""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column in existing:
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    logger.info("Added column %s.%s", table, column)
+    return True
+
+
+def _convert_json_embeddings(conn: Connection, table: str, column: str = "embedding") -> None:
+    """
+    Rewrite legacy JSON-text embeddings as float32 blobs.
+    SQLite keeps BLOB values in a column declared TEXT, so they are rewritten in place.
+    Other databases cannot store bytes in a text column: the column is replaced by a
+    binary one (`_swap_to_blob_column`).
+    """
+    if conn.dialect.name != "sqlite":
+        types = {c["name"]: c["type"] for c in inspect(conn).get_columns(table)}
+        if column in types and types[column].python_type is bytes:
+            return
+        _swap_to_blob_column(conn, table, column, existing=set(types))
+        return
+
+    query = text(f"SELECT id, {column} FROM {table} WHERE typeof({column}) = 'text'")
+    converted = 0
+    for row_id, value in conn.execute(query).all():
+        if not isinstance(value, str):
+            continue
+        conn.execute(
+            text(f"UPDATE {table} SET {column} = :blob WHERE id = :id"),
+            {"blob": encode_embedding(json.loads(value)), "id": row_id},
+        )
+        converted += 1
+    if converted:
+        logger.info("Converted %s JSON embedding(s) in %s to float32 blobs", converted, table)
+
+
+def _swap_to_blob_column(conn: Connection, table: str, column: str, existing: set[str]) -> None:
+    """
+    Replace a text column of JSON embeddings by a binary one: add `<column>_blob`, fill it,
+    drop the old column and rename the new one. Each step checks what is already done, so a
+    run interrupted between steps (MySQL commits every ALTER) finishes on the next start.
+    """
+    staging = f"{column}_blob"
+    blob = LargeBinary().compile(dialect=conn.dialect)
+    if column in existing:
+        _add_column(conn, table, staging, blob)
+        rows = conn.execute(text(f"SELECT id, {column} FROM {table}")).all()
+        if rows:
+            conn.execute(
+                text(f"UPDATE {table} SET {staging} = :blob WHERE id = :id"),
+                [{"blob": encode_embedding(json.loads(value)), "id": row_id} for row_id, value in rows],
+            )
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        logger.info("Converted %s JSON embedding(s) in %s to float32 blobs", len(rows), table)
+    conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {staging} TO {column}"))
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+    elif conn.dialect.name in ("mysql", "mariadb"):
+        conn.execute(text(f"ALTER TABLE {table} MODIFY {column} {blob} NOT NULL"))
+    logger.info("Column %s.%s is now %s", table, column, blob)
+
+
+def _create_missing_indexes(conn: Connection) -> None:
+    """Indexes declared on the models but absent from an older database."""
+    for table in Base.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspect(conn).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                logger.info("Created index %s", index.name)
+
+
+def _backfill_video_segments(conn: Connection) -> None:
+    """
+    Timeline segments for videos processed before segments existed (built from their frame
+    rows). Videos with a queued/running job are left to the job; search jobs are skipped
+    (their sparse frames do not form a timeline).
+    """
+    video_ids = conn.execute(
+        text(
+            "SELECT v.id FROM test_videos v "
+            "WHERE NOT EXISTS (SELECT 1 FROM video_segments s WHERE s.video_id = v.id) "
+            "AND EXISTS (SELECT 1 FROM video_matches m WHERE m.video_id = v.id) "
+            "AND NOT EXISTS (SELECT 1 FROM video_jobs j WHERE j.video_id = v.id "
+            "AND (j.status IN ('QUEUED', 'RUNNING') OR j.mode = 'search'))"
+        )
+    ).scalars().all()
+    for video_id in video_ids:
+        rows = conn.execute(
+            text(
+                "SELECT timestamp_sec, frame_path, match_status, confidence_score, truth_image_id "
+                "FROM video_matches WHERE video_id = :video_id ORDER BY id"
+            ),
+            {"video_id": video_id},
+        ).all()
+        frames = []
+        for ts, frame_path, match_status, confidence, truth_image_id in rows:
+            if ts is None:
+                # Rows from before timestamp_sec: one frame per second, named frame_<sec>.jpg.
+                m = _LEGACY_FRAME_RE.search(frame_path or "")
+                if m is None:
+                    continue
+                ts = float(m.group(1))
+            frames.append((ts, match_status, confidence or 0.0, truth_image_id))
+        frames.sort(key=lambda f: f[0])
+        segments = build_segments(frames)
+        if segments:
+            conn.execute(insert(VideoSegment.__table__), [s.to_row(video_id) for s in segments])
+    if video_ids:
+        logger.info("Built timeline segments for %s existing video(s)", len(video_ids))
+
+
+def _backfill_face_embeddings(conn: Connection) -> None:
+    """
+    Fill the new embedding columns of existing results from the embedding cache (keyed by
+    content hash, and frame timestamp for videos), so the face search index covers earlier
+    uploads without reprocessing them. Results whose entry was evicted stay NULL.
+    """
+    images = conn.execute(
+        text(
+            "UPDATE test_images SET embedding = (SELECT e.embedding FROM embedding_cache e "
+            "WHERE e.content_hash = test_images.content_hash AND e.frame_ms = -1 "
+            "ORDER BY e.last_used_at DESC LIMIT 1) "
+            "WHERE embedding IS NULL AND content_hash IS NOT NULL"
+        )
+    )
+    frames = conn.execute(
+        text(
+            "UPDATE video_matches SET embedding = (SELECT e.embedding FROM embedding_cache e "
+            "JOIN test_videos v ON v.content_hash = e.content_hash "
+            "WHERE v.id = video_matches.video_id "
+            "AND e.frame_ms = CAST(ROUND(video_matches.timestamp_sec * 1000) AS INTEGER) "
+            "ORDER BY e.last_used_at DESC LIMIT 1) "
+            "WHERE embedding IS NULL AND timestamp_sec IS NOT NULL"
+        )
+    )
+    logger.info("Looked up cached embeddings for %s test image(s) and %s frame(s)", images.rowcount, frames.rowcount)
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """
+    Small, idempotent, additive migrations for databases created by older versions.
+    `Base.metadata.create_all` only creates missing tables, never missing columns.
+    """
+    with engine.begin() as conn:
+        _add_column(conn, "video_matches", "timestamp_sec", "FLOAT")
+        _convert_json_embeddings(conn, "truth_images")
+
+        _add_column(conn, "truth_images", "label", "VARCHAR")
+        if _add_column(conn, "truth_images", "active", "BOOLEAN NOT NULL DEFAULT 1"):
+            # Before the gallery, each upload replaced the previous truth image:
+            # keep that meaning for existing rows by enrolling only the latest one.
+            conn.execute(text("UPDATE truth_images SET active = 0 WHERE id < (SELECT MAX(id) FROM truth_images)"))
+        _add_column(conn, "test_images", "truth_image_id", "INTEGER")
+        _add_column(conn, "video_matches", "truth_image_id", "INTEGER")
+        _add_column(conn, "test_images", "content_hash", "VARCHAR(64)")
+        _add_column(conn, "test_videos", "content_hash", "VARCHAR(64)")
+        if _add_column(conn, "video_matches", "created_at", "DATETIME"):
+            # Existing frame results get their video's upload time.
+            conn.execute(
+                text(
+                    "UPDATE video_matches SET created_at = "
+                    "(SELECT created_at FROM test_videos WHERE test_videos.id = video_matches.video_id)"
+                )
+            )
+        _add_column(conn, "video_jobs", "mode", "VARCHAR NOT NULL DEFAULT 'full'")
+        _add_column(conn, "video_jobs", "max_matches", "INTEGER")
+        _add_column(conn, "video_jobs", "ranges", "TEXT")
+        blob = LargeBinary().compile(dialect=conn.dialect)
+        added_image_embeddings = _add_column(conn, "test_images", "embedding", blob)
+        if _add_column(conn, "video_matches", "embedding", blob) or added_image_embeddings:
+            _backfill_face_embeddings(conn)
+        _add_column(conn, "embedding_cache", "face_boxes", blob)
+        _add_column(conn, "test_images", "face_box", "VARCHAR")
+        _add_column(conn, "video_matches", "face_box", "VARCHAR")
+        for table in ("test_images", "video_matches"):
+            _add_column(conn, table, "faces", blob)
+            _add_column(conn, table, "face_boxes", blob)
+
+        _create_missing_indexes(conn)
+        _backfill_video_segments(conn)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-import json
 from datetime import datetime
 
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, String, Text
+import numpy as np
+from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, String, Text, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
+from embedding_codec import EmbeddingBlob
+
 
 class Base(DeclarativeBase):
     pass
@@ -16,11 +18,54 @@ class TruthImage(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     image_path: Mapped[str] = mapped_column(String, nullable=False)
-    embedding: Mapped[str] = mapped_column(Text, nullable=False)  # JSON list[float]
+    label: Mapped[str | None] = mapped_column(String, nullable=True)  # identity name shown in results
+    active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)  # part of the gallery
+    embedding: Mapped[np.ndarray] = mapped_column(EmbeddingBlob, nullable=False)  # float32[128] blob
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    def embedding_as_array(self) -> np.ndarray:
+        return self.embedding
+
     def embedding_as_list(self) -> list[float]:
-        return json.loads(self.embedding)
+        return self.embedding.tolist()
+
+
+class CacheVersion(Base):
+    """
+    Monotonic version counters for process-local caches (bumped on writes, checked on reads),
+    so every worker process notices when e.g. the truth gallery changed.
+    """
+
+    __tablename__ = "cache_versions"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class EmbeddingCacheEntry(Base):
+    """
+    Content-addressed embedding cache: (file sha256, frame timestamp, detection variant)
+    -> the encoded faces, so re-uploaded media skips detection and encoding.
+    frame_ms is -1 for still images. embedding holds the K encoded faces back to back
+    (K x 128 float32, largest face first) and is NULL when no face was found; face_boxes
+    holds their boxes (K x 4 int32), NULL in entries stored before boxes were kept.
+    """
+
+    __tablename__ = "embedding_cache"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "frame_ms", "variant", name="uq_embedding_cache_key"),
+        Index("ix_embedding_cache_last_used_at", "last_used_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    frame_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=-1)
+    variant: Mapped[str] = mapped_column(String, nullable=False, default="default")
+    embedding: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    face_boxes: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
 class TestImage(Base):
@@ -28,9 +73,21 @@ class TestImage(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     image_path: Mapped[str] = mapped_column(String, nullable=False)
-    match_status: Mapped[str] = mapped_column(String, nullable=False)  # MATCH / NO_MATCH / NO_FACE / NO_TRUTH
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    match_status: Mapped[str] = mapped_column(String, nullable=False, index=True)  # MATCH / NO_MATCH / NO_FACE / NO_TRUTH
     confidence_score: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    truth_image_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("truth_images.id"), nullable=True)
+    # Embedding of the face the result is about (NULL: no face), kept for the face search
+    # index. Deferred: only the index loads it, result listings never do.
+    embedding: Mapped[np.ndarray | None] = mapped_column(EmbeddingBlob, nullable=True, deferred=True)
+    # Box of the face the result is about, JSON [top, right, bottom, left] in image pixels.
+    face_box: Mapped[str | None] = mapped_column(String, nullable=True)
+    # Every encoded face when there were several (FACE_MAX_FACES > 1): K x 128 float32 and
+    # their K x 4 int32 boxes, largest first; NULL with one face. Rescoring and face search
+    # look at all of them, not only the one kept in `embedding`.
+    faces: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True, deferred=True)
+    face_boxes: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True, deferred=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
 
 class TestVideo(Base):
@@ -38,24 +95,75 @@ class TestVideo(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     video_path: Mapped[str] = mapped_column(String, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
     matches: Mapped[list["VideoMatch"]] = relationship(
         back_populates="video",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        # Loaded on access only: a video can have many thousands of frame rows.
+        lazy="select",
     )
 
 
+class VideoJob(Base):
+    __tablename__ = "video_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    video_id: Mapped[int] = mapped_column(Integer, ForeignKey("test_videos.id"), nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False, default="QUEUED", index=True)  # QUEUED / RUNNING / DONE / FAILED / CANCELLED
+    mode: Mapped[str] = mapped_column(String, nullable=False, default="full")  # full / search
+    max_matches: Mapped[int | None] = mapped_column(Integer, nullable=True)  # search: stop after N appearances
+    ranges: Mapped[str | None] = mapped_column(Text, nullable=True)  # search: located time ranges (JSON list)
+    frames_done: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    frames_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    video: Mapped["TestVideo"] = relationship()
+
+
 class VideoMatch(Base):
     __tablename__ = "video_matches"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    video_id: Mapped[int] = mapped_column(Integer, ForeignKey("test_videos.id"), nullable=False)
-    frame_path: Mapped[str] = mapped_column(String, nullable=False)
-    match_status: Mapped[str] = mapped_column(String, nullable=False)  # MATCH / NO_MATCH / NO_FACE / NO_TRUTH
+    video_id: Mapped[int] = mapped_column(Integer, ForeignKey("test_videos.id"), nullable=False, index=True)
+    frame_path: Mapped[str] = mapped_column(String, nullable=False)  # "" when the frame was not persisted
+    timestamp_sec: Mapped[float | None] = mapped_column(Float, nullable=True)
+    match_status: Mapped[str] = mapped_column(String, nullable=False, index=True)  # MATCH / NO_MATCH / NO_FACE / NO_TRUTH
     confidence_score: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    truth_image_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("truth_images.id"), nullable=True)
+    # Embedding of the frame's kept face (NULL: no face, or a result reused from an earlier frame).
+    embedding: Mapped[np.ndarray | None] = mapped_column(EmbeddingBlob, nullable=True, deferred=True)
+    face_box: Mapped[str | None] = mapped_column(String, nullable=True)  # JSON [top, right, bottom, left]
+    # Every encoded face of the frame when there were several (as in TestImage).
+    faces: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True, deferred=True)
+    face_boxes: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True, deferred=True)
+    created_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, nullable=True, index=True)
 
     video: Mapped["TestVideo"] = relationship(back_populates="matches")
 
 
+class VideoSegment(Base):
+    """
+    Consecutive sampled frames of a video with the same outcome (and, for MATCH, the same
+    identity), collapsed into one row. Built while a job runs, so "when was the person on
+    screen" is answered from a few segments instead of every frame row.
+    """
+
+    __tablename__ = "video_segments"
+    __table_args__ = (Index("ix_video_segments_video_start", "video_id", "start_sec"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    video_id: Mapped[int] = mapped_column(Integer, ForeignKey("test_videos.id"), nullable=False)
+    match_status: Mapped[str] = mapped_column(String, nullable=False)  # MATCH / NO_MATCH / NO_FACE / NO_TRUTH
+    truth_image_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("truth_images.id"), nullable=True)
+    start_sec: Mapped[float] = mapped_column(Float, nullable=False)  # first frame of the segment
+    end_sec: Mapped[float] = mapped_column(Float, nullable=False)  # last frame of the segment
+    frame_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    max_confidence: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+    mean_confidence: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
@@ -1,27 +1,56 @@
 from __future__ import annotations
 
+import json
 import logging
-import os
-import uuid
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
-from flask import Blueprint, current_app, jsonify, request
+import numpy as np
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from sqlalchemy import select
 
-from models import TestImage, TruthImage
-from services.face_service import compare_embeddings, extract_face_embedding
+from database import bulk_insert, bulk_insert_ids
+from embedding_codec import EMBEDDING_DIM, EMBEDDING_DTYPE
+from models import TestImage, TestVideo, VideoMatch
+from services.admission import (
+    admission_controlled,
+    busy_response,
+    face_admission,
+    rejection_response,
+    rescore_admission,
+)
+from services.archive_ingest import ArchiveError, ArchiveIngestSettings, ingest_archive, open_archive
+from services.embedding_cache import embeddings_for_uploads, faces_for_uploads
+from services.face_index import (
+    SOURCE_TEST_IMAGE,
+    SOURCE_VIDEO_FRAME,
+    FaceIndexNotReady,
+    face_index,
+    search_faces,
+)
+from services.face_service import match_faces, score_embedding_matrix, stored_faces
+from services.rescoring import RESCORE_COLLECTIONS, rescore_results
+from services.storage import save_upload
+from services.timing import STAGE_DB_WRITE, stage
+from services.truth_service import get_truth_gallery
 
 logger = logging.getLogger(__name__)
 
 test_images_bp = Blueprint("test_images", __name__)
 
-def _to_public_url(image_path: str) -> str:
+def _to_public_url(image_path: str) -> str | None:
     """
     DB might contain either:
     - relative path like "images/foo.jpg"
     - absolute path like "D:\\...\\uploads\\images\\foo.jpg"
     We normalize to /uploads/<relative>.
+    Video frames that were not persisted have an empty path -> None.
     """
+    if not image_path:
+        return None
     norm = image_path.replace("\\", "/")
     if "/uploads/" in norm:
         rel = norm.split("/uploads/", 1)[1]
@@ -30,124 +59,533 @@ def _to_public_url(image_path: str) -> str:
     return f"/uploads/{norm.lstrip('/')}"
 
 
-def _get_latest_truth_embedding(db) -> list[float] | None:
-    truth = db.execute(select(TruthImage).order_by(TruthImage.id.desc())).scalars().first()
-    if not truth:
-        return None
-    return truth.embedding_as_list()
+# Width of the thumbnails linked from results (the grid never needs the full image).
+RESULT_THUMBNAIL_WIDTH = 256
+
+
+def _to_thumbnail_url(image_path: str) -> str | None:
+    url = _to_public_url(image_path)
+    return f"{url}?w={RESULT_THUMBNAIL_WIDTH}" if url else None
 
 
 @test_images_bp.post("/test-images")
+@admission_controlled(face_admission)
 def upload_test_images():
     """
     Upload multiple test images:
-    - saves each image
-    - extracts face embedding
-    - compares with latest truth image embedding
-    - stores match_status + confidence_score
+    - saves each image content-addressed (identical bytes share one file)
+    - reuses cached faces for known content, detects + encodes the rest in parallel
+      (every face of a group photo, up to FACE_MAX_FACES)
+    - compares all faces with every enrolled truth identity (one vectorized distance matrix)
+    - stores, for the face closest to an identity, match_status + confidence_score +
+      closest identity + face box
     """
     files = request.files.getlist("files")
     if not files:
         return jsonify({"error": "No files provided"}), 400
-
-    uploads_dir = Path(current_app.config["UPLOAD_FOLDER"]) / "images"
-    uploads_dir.mkdir(parents=True, exist_ok=True)
+    max_files = current_app.config["MAX_IMAGES_PER_REQUEST"]
+    if len(files) > max_files:
+        return jsonify({"error": f"At most {max_files} images per request"}), 413
 
     SessionLocal = current_app.session_local  # type: ignore[attr-defined]
     threshold = float(current_app.config["FACE_DISTANCE_THRESHOLD"])
 
-    results = []
+    uploads_root = Path(current_app.config["UPLOAD_FOLDER"])
+    stored = [
+        save_upload(file, uploads_root, "images", "img", ".jpg")
+        for file in files
+        if file and file.filename != ""
+    ]
+
+    # Cached faces for already-seen content; the rest are encoded in parallel
+    # before touching the DB for writes (keeps the transaction short).
+    faces = faces_for_uploads(SessionLocal, stored, workers=current_app.config["FACE_WORKERS"])
+
     with SessionLocal() as db:
-        truth_embedding = _get_latest_truth_embedding(db)
+        gallery = get_truth_gallery(db)
+        matches, embeddings = match_faces(gallery, faces, threshold=threshold)
 
-        for file in files:
-            if not file or file.filename == "":
-                continue
+        # One multi-row INSERT (with RETURNING for the ids) instead of a flush per image.
+        with stage(STAGE_DB_WRITE):
+            rows = bulk_insert(
+                db,
+                TestImage,
+                [
+                    {
+                        "image_path": upload.rel_path,
+                        "content_hash": upload.content_hash,
+                        "match_status": match.match_status,
+                        "confidence_score": float(match.confidence_score),
+                        "truth_image_id": match.truth_image_id,
+                        "embedding": embedding,
+                        "face_box": json.dumps(match.face_box) if match.face_box else None,
+                        **stored_faces(f),
+                    }
+                    for upload, match, embedding, f in zip(stored, matches, embeddings, faces)
+                ],
+                returning=True,
+            )
+            db.commit()
 
-            ext = os.path.splitext(file.filename)[1].lower() or ".jpg"
-            filename = f"img_{uuid.uuid4().hex}{ext}"
-            abs_path = uploads_dir / filename
-            file.save(str(abs_path))
-            rel_path = str(Path("images") / filename)
+        results = [
+            {
+                "id": row.id,
+                "image_path": row.image_path,
+                "public_url": _to_public_url(row.image_path),
+                "thumbnail_url": _to_thumbnail_url(row.image_path),
+                "match_status": row.match_status,
+                "confidence_score": row.confidence_score,
+                "truth_image_id": match.truth_image_id,
+                "identity": match.identity,
+                "face_box": match.face_box,
+                "faces_compared": len(f) if f is not None else 0,
+            }
+            for row, match, f in zip(rows, matches, faces)
+        ]
 
-            test_embedding = extract_face_embedding(str(abs_path))
-            match = compare_embeddings(truth_embedding, test_embedding, threshold=threshold)
+    return jsonify({"message": "Test images processed", "results": results})
 
-            row = TestImage(
-                image_path=rel_path,
-                match_status=match.match_status,
-                confidence_score=float(match.confidence_score),
-            )
-            db.add(row)
-            db.flush()
 
-            results.append(
-                {
-                    "id": row.id,
-                    "image_path": row.image_path,
-                    "public_url": _to_public_url(row.image_path),
-                    "match_status": row.match_status,
-                    "confidence_score": row.confidence_score,
-                }
-            )
+@test_images_bp.post("/test-images/archive")
+@admission_controlled(face_admission)
+def upload_test_image_archive():
+    """
+    Ingest a ZIP or TAR (.tar, .tar.gz, .tar.bz2, .tar.xz) of test images without unpacking it:
+    - the archive is the multipart field `file`, or the raw request body (a TAR body is
+      then read as it arrives)
+    - image entries go through the same steps as /test-images (content-addressed save,
+      cached/parallel embedding, gallery match), ARCHIVE_BATCH_SIZE images at a time
+    - the response is NDJSON: one "progress" line per committed batch (totals so far plus
+      that batch's results), then a "done" line with the totals and the error, if any,
+      that stopped the run early
+    The request holds its face admission slot until the last line is sent.
+    """
+    if request.mimetype == "multipart/form-data":
+        file = request.files.get("file")
+        if not file or file.filename == "":
+            return jsonify({"error": "No archive provided"}), 400
+        source = file.stream
+    else:
+        source = request.stream
 
-        db.commit()
+    try:
+        entries = open_archive(source)
+    except ArchiveError as e:
+        return jsonify({"error": str(e)}), 400
+
+    events = ingest_archive(
+        current_app.session_local,  # type: ignore[attr-defined]
+        entries,
+        Path(current_app.config["UPLOAD_FOLDER"]),
+        ArchiveIngestSettings.from_config(current_app.config),
+    )
+    return Response(stream_with_context(_archive_event_lines(events)), mimetype="application/x-ndjson")
+
+
+def _archive_event_lines(events):
+    try:
+        for event in events:
+            for row in event.get("results", ()):
+                row["public_url"] = _to_public_url(row["image_path"])
+                row["thumbnail_url"] = _to_thumbnail_url(row["image_path"])
+            yield json.dumps(event) + "\n"
+    except Exception as e:  # noqa: BLE001 - the status line is already sent; report it in the body
+        logger.exception("Archive ingestion failed")
+        yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+
+RESULT_COLLECTIONS = ("test_images", "test_videos", "video_matches")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-    return jsonify({"message": "Test images processed", "results": results})
+
+@dataclass
+class ResultFilters:
+    match_statuses: list[str] = field(default_factory=list)
+    video_id: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    min_confidence: Optional[float] = None
+
+    @classmethod
+    def from_args(cls, args) -> "ResultFilters":
+        """Raises ValueError on malformed query parameters."""
+        statuses = [s.strip().upper() for s in args.get("match_status", "").split(",") if s.strip()]
+        return cls(
+            match_statuses=statuses,
+            video_id=int(args["video_id"]) if args.get("video_id") else None,
+            since=datetime.fromisoformat(args["since"]) if args.get("since") else None,
+            until=datetime.fromisoformat(args["until"]) if args.get("until") else None,
+            min_confidence=float(args["min_confidence"]) if args.get("min_confidence") else None,
+        )
+
+
+def _image_to_dict(i: TestImage) -> dict:
+    return {
+        "id": i.id,
+        "image_path": i.image_path,
+        "public_url": _to_public_url(i.image_path),
+        "thumbnail_url": _to_thumbnail_url(i.image_path),
+        "match_status": i.match_status,
+        "confidence_score": i.confidence_score,
+        "truth_image_id": i.truth_image_id,
+        "face_box": json.loads(i.face_box) if i.face_box else None,
+        "created_at": i.created_at.isoformat(),
+    }
+
+
+def _video_to_dict(v: TestVideo) -> dict:
+    return {
+        "id": v.id,
+        "video_path": v.video_path,
+        "public_url": _to_public_url(v.video_path),
+        "created_at": v.created_at.isoformat(),
+    }
+
+
+def _match_to_dict(m: VideoMatch) -> dict:
+    return {
+        "id": m.id,
+        "video_id": m.video_id,
+        "frame_path": m.frame_path,
+        "public_url": _to_public_url(m.frame_path),
+        "thumbnail_url": _to_thumbnail_url(m.frame_path),
+        "timestamp_sec": m.timestamp_sec,
+        "match_status": m.match_status,
+        "confidence_score": m.confidence_score,
+        "truth_image_id": m.truth_image_id,
+        "face_box": json.loads(m.face_box) if m.face_box else None,
+        "created_at": m.created_at.isoformat() if m.created_at else None,
+    }
+
+
+def _collection_query(name: str, filters: ResultFilters):
+    """
+    (model, filtered SELECT, serializer) for one collection.
+    Filters that do not apply to a collection are ignored (e.g. match_status for videos).
+    """
+    if name == "test_images":
+        model, serialize = TestImage, _image_to_dict
+    elif name == "test_videos":
+        model, serialize = TestVideo, _video_to_dict
+    else:
+        model, serialize = VideoMatch, _match_to_dict
+
+    query = select(model)
+    if filters.since is not None:
+        query = query.where(model.created_at >= filters.since)
+    if filters.until is not None:
+        query = query.where(model.created_at < filters.until)
+    if model is TestVideo:
+        if filters.video_id is not None:
+            query = query.where(TestVideo.id == filters.video_id)
+        return model, query, serialize
+
+    if filters.match_statuses:
+        query = query.where(model.match_status.in_(filters.match_statuses))
+    if filters.min_confidence is not None:
+        query = query.where(model.confidence_score >= filters.min_confidence)
+    if model is VideoMatch and filters.video_id is not None:
+        query = query.where(VideoMatch.video_id == filters.video_id)
+    return model, query, serialize
+
+
+def _keyset(query, model, cursor: Optional[int]):
+    # Newest first; the cursor is the last id of the previous page.
+    if cursor is not None:
+        query = query.where(model.id < cursor)
+    return query.order_by(model.id.desc())
 
 
 @test_images_bp.get("/results")
 def get_results():
     """
-    Get Results API:
-    - returns all test image results and all video frame results
-    This endpoint is shared by frontend `Results` component.
+    Get Results API (shared by frontend `Results` component), newest first.
+    Query parameters:
+    - collection: test_images | test_videos | video_matches (default: all three)
+    - limit: page size per collection (default 100, max 1000)
+    - cursor: `next_cursor` of the previous page (needs `collection`)
+    - match_status (comma-separated), video_id, since / until (ISO dates), min_confidence
+    - format=ndjson: stream every matching row as one JSON object per line (no paging)
     """
+    try:
+        filters = ResultFilters.from_args(request.args)
+        limit = min(int(request.args.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        cursor = int(request.args["cursor"]) if request.args.get("cursor") else None
+    except (ValueError, KeyError) as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+    if limit <= 0:
+        return jsonify({"error": "limit must be positive"}), 400
+
+    collection = request.args.get("collection")
+    if collection and collection not in RESULT_COLLECTIONS:
+        return jsonify({"error": f"collection must be one of {', '.join(RESULT_COLLECTIONS)}"}), 400
+    if cursor is not None and not collection:
+        return jsonify({"error": "cursor requires collection"}), 400
+    collections = [collection] if collection else list(RESULT_COLLECTIONS)
+
     SessionLocal = current_app.session_local  # type: ignore[attr-defined]
 
+    if request.args.get("format") == "ndjson":
+        return Response(
+            stream_with_context(_stream_results(SessionLocal, collections, filters, cursor)),
+            mimetype="application/x-ndjson",
+        )
+
+    payload: dict = {"next_cursor": {}}
     with SessionLocal() as db:
-        images = db.execute(select(TestImage).order_by(TestImage.id.desc())).scalars().all()
+        for name in collections:
+            model, query, serialize = _collection_query(name, filters)
+            rows = db.execute(_keyset(query, model, cursor).limit(limit + 1)).scalars().all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            payload[name] = [serialize(r) for r in rows]
+            payload["next_cursor"][name] = rows[-1].id if has_more else None
 
-        # Import here to avoid circular imports.
-        from models import TestVideo, VideoMatch  # noqa: WPS433
+    return jsonify(payload)
 
-        videos = db.execute(select(TestVideo).order_by(TestVideo.id.desc())).scalars().all()
-        video_matches = db.execute(select(VideoMatch).order_by(VideoMatch.id.desc())).scalars().all()
 
-    return jsonify(
-        {
-            "test_images": [
-                {
-                    "id": i.id,
-                    "image_path": i.image_path,
-                    "public_url": _to_public_url(i.image_path),
-                    "match_status": i.match_status,
-                    "confidence_score": i.confidence_score,
-                    "created_at": i.created_at.isoformat(),
-                }
-                for i in images
-            ],
-            "test_videos": [
-                {
-                    "id": v.id,
-                    "video_path": v.video_path,
-                    "public_url": _to_public_url(v.video_path),
-                    "created_at": v.created_at.isoformat(),
-                }
-                for v in videos
-            ],
-            "video_matches": [
+def _stream_results(SessionLocal, collections: list[str], filters: ResultFilters, cursor: Optional[int]):
+    # Rows are fetched in chunks and serialized one by one: memory stays flat.
+    with SessionLocal() as db:
+        for name in collections:
+            model, query, serialize = _collection_query(name, filters)
+            result = db.execute(_keyset(query, model, cursor).execution_options(yield_per=1000)).scalars()
+            for row in result:
+                yield json.dumps({"collection": name, **serialize(row)}) + "\n"
+
+
+FACE_INDEX_RETRY_AFTER_SECONDS = 5
+
+
+def _index_loading():
+    return busy_response("Face search index is loading, retry later", 503, FACE_INDEX_RETRY_AFTER_SECONDS)
+
+
+@test_images_bp.post("/faces/search")
+@admission_controlled(face_admission)
+def search_faces_by_image():
+    """
+    "Where else has this person appeared?": the stored faces (every test image and every
+    encoded video frame) closest to the face in the uploaded image, nearest first.
+    Form fields:
+    - file: the query image (its largest face is used)
+    - k: number of results (default 10, max FACE_SEARCH_MAX_K)
+    - max_distance: leave out faces farther than this (FACE_DISTANCE_THRESHOLD keeps
+      only faces that would count as a MATCH)
+    Each result is the stored row (as in /results) plus `source`, `distance` and
+    `same_person`; frames also link their video (frames that were not persisted have no image).
+    In a group photo or crowded frame, `face_box` is the face that is closest to the query.
+    503 with Retry-After while this process is still building its search index.
+    """
+    if not face_index.ready:
+        return _index_loading()
+    file = request.files.get("file")
+    if not file or file.filename == "":
+        return jsonify({"error": "Missing file field"}), 400
+    try:
+        k = int(request.form.get("k", 10))
+        max_distance = float(request.form["max_distance"]) if request.form.get("max_distance") else None
+    except ValueError as e:
+        return jsonify({"error": f"Invalid form field: {e}"}), 400
+    if not 0 < k <= current_app.config["FACE_SEARCH_MAX_K"]:
+        return jsonify({"error": f"k must be between 1 and {current_app.config['FACE_SEARCH_MAX_K']}"}), 400
+
+    SessionLocal = current_app.session_local  # type: ignore[attr-defined]
+    threshold = float(current_app.config["FACE_DISTANCE_THRESHOLD"])
+    upload = save_upload(file, Path(current_app.config["UPLOAD_FOLDER"]), "queries", "query", ".jpg")
+    embedding = embeddings_for_uploads(SessionLocal, [upload], workers=1)[0]
+    if embedding is None:
+        return jsonify({"error": "No face found in query image"}), 400
+
+    with SessionLocal() as db:
+        try:
+            hits = search_faces(db, embedding, k)
+        except FaceIndexNotReady:
+            return _index_loading()
+        if max_distance is not None:
+            hits = [h for h in hits if h.distance <= max_distance]
+
+        images = {
+            i.id: i
+            for i in db.execute(
+                select(TestImage).where(TestImage.id.in_([h.row_id for h in hits if h.source == SOURCE_TEST_IMAGE]))
+            ).scalars()
+        }
+        frames = {
+            m.id: (m, video_path)
+            for m, video_path in db.execute(
+                select(VideoMatch, TestVideo.video_path)
+                .join(TestVideo, TestVideo.id == VideoMatch.video_id)
+                .where(VideoMatch.id.in_([h.row_id for h in hits if h.source == SOURCE_VIDEO_FRAME]))
+            )
+        }
+
+        results = []
+        for hit in hits:
+            if hit.source == SOURCE_TEST_IMAGE:
+                if hit.row_id not in images:
+                    continue
+                row = _image_to_dict(images[hit.row_id])
+            else:
+                if hit.row_id not in frames:
+                    continue
+                match, video_path = frames[hit.row_id]
+                row = {**_match_to_dict(match), "video_public_url": _to_public_url(video_path)}
+            results.append(
                 {
-                    "id": m.id,
-                    "video_id": m.video_id,
-                    "frame_path": m.frame_path,
-                    "public_url": _to_public_url(m.frame_path),
-                    "match_status": m.match_status,
-                    "confidence_score": m.confidence_score,
+                    "source": hit.source,
+                    "distance": round(hit.distance, 4),
+                    "same_person": hit.distance <= threshold,
+                    **row,
+                    **({"face_box": list(hit.face_box)} if hit.face_box else {}),
                 }
-                for m in video_matches
-            ],
-        }
-    )
+            )
 
+    return jsonify({"results": results})
 
+
+def _embedding_matrix(payload) -> np.ndarray:
+    """Request embeddings -> (N x 128) float32 matrix; ValueError with a client message."""
+    if isinstance(payload, (bytes, bytearray)):
+        if not payload or len(payload) % (EMBEDDING_DIM * EMBEDDING_DTYPE.itemsize):
+            raise ValueError(f"Body must be N x {EMBEDDING_DIM} little-endian float32 values")
+        matrix = np.frombuffer(payload, dtype=EMBEDDING_DTYPE).reshape(-1, EMBEDDING_DIM)
+    else:
+        try:
+            matrix = np.asarray(payload, dtype=EMBEDDING_DTYPE)
+        except (TypeError, ValueError):
+            raise ValueError("embeddings must be a list of number lists") from None
+        if matrix.ndim != 2 or matrix.shape[0] == 0 or matrix.shape[1] != EMBEDDING_DIM:
+            raise ValueError(f"embeddings must be a non-empty list of {EMBEDDING_DIM}-number lists")
+    if not np.isfinite(matrix).all():
+        raise ValueError("embeddings must not contain NaN or infinite values")
+    return matrix
+
+
+def _persist_flag(value) -> bool:
+    """
+    `persist` as sent: a JSON boolean in a JSON body (a string such as "false" is refused,
+    not taken as truthy), or 1/true/yes, 0/false/no in the query string. ValueError otherwise.
+    """
+    if isinstance(value, bool):
+        return value
+    if request.mimetype != "application/json" and isinstance(value, str):
+        flag = value.lower()
+        if flag in ("1", "true", "yes", "0", "false", "no"):
+            return flag in ("1", "true", "yes")
+    raise ValueError("persist must be true or false")
+
+
+@test_images_bp.post("/embeddings/score")
+def score_precomputed_embeddings():
+    """
+    Score face encodings computed elsewhere (e.g. on a camera gateway) against every
+    enrolled identity: no image upload, decode or face detection.
+    Body, either:
+    - JSON {"embeddings": [[128 numbers], ...], "persist": false}
+    - application/octet-stream: N x 128 little-endian float32 values back to back
+      (512 bytes per face), with ?persist=true in the query string
+    At most MAX_EMBEDDINGS_PER_REQUEST faces per request. With persist, each face is stored
+    as a test image row without an image (embedding kept, so face search finds it) and
+    the new ids are returned; those requests take a face admission slot (they write to the
+    database), read-only scoring does not.
+    The response is column-wise, one list per field in input order: match_status,
+    confidence_score, face_distance, truth_image_id, identity (+ ids when persisted).
+    """
+    try:
+        if request.mimetype == "application/json":
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict) or "embeddings" not in body:
+                return jsonify({"error": "JSON body must contain embeddings"}), 400
+            payload, persist = body["embeddings"], _persist_flag(body.get("persist", False))
+        else:
+            persist = _persist_flag(request.args.get("persist", "false"))
+            payload = request.get_data(cache=False)
+        matrix = _embedding_matrix(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    max_faces = current_app.config["MAX_EMBEDDINGS_PER_REQUEST"]
+    if matrix.shape[0] > max_faces:
+        return jsonify({"error": f"At most {max_faces} embeddings per request"}), 413
+
+    if not persist:
+        return _score_embeddings(matrix, persist=False)
+    rejection = face_admission.acquire()
+    if rejection is not None:
+        return rejection_response(rejection)
+    started = time.perf_counter()
+    try:
+        return _score_embeddings(matrix, persist=True)
+    finally:
+        face_admission.release(time.perf_counter() - started)
+
+
+def _score_embeddings(matrix: np.ndarray, persist: bool):
+    SessionLocal = current_app.session_local  # type: ignore[attr-defined]
+    threshold = float(current_app.config["FACE_DISTANCE_THRESHOLD"])
+    with SessionLocal() as db:
+        gallery = get_truth_gallery(db)
+        scores = score_embedding_matrix(gallery, matrix, threshold)
+        truth_ids = [t if t >= 0 else None for t in scores.truth_image_id.tolist()]
+
+        ids = None
+        if persist:
+            with stage(STAGE_DB_WRITE):
+                ids = bulk_insert_ids(
+                    db,
+                    TestImage,
+                    [
+                        {
+                            "image_path": "",
+                            "match_status": status,
+                            "confidence_score": confidence,
+                            "truth_image_id": truth_id,
+                            "embedding": vector.tobytes(),
+                        }
+                        for status, confidence, truth_id, vector in zip(
+                            scores.match_status.tolist(), scores.confidence_score.tolist(), truth_ids, matrix
+                        )
+                    ],
+                )
+                db.commit()
+
+    identities = gallery.identities if gallery is not None else []
+    result = {
+        "count": len(scores),
+        "match_status": scores.match_status.tolist(),
+        "confidence_score": scores.confidence_score.tolist(),
+        "face_distance": [None if np.isnan(d) else round(d, 4) for d in scores.face_distance.tolist()],
+        "truth_image_id": truth_ids,
+        "identity": [identities[g] if g >= 0 else None for g in scores.gallery_row.tolist()],
+    }
+    if ids is not None:
+        result["ids"] = ids
+    return jsonify(result)
+
+
+@test_images_bp.post("/results/rescore")
+@admission_controlled(rescore_admission)
+def rescore_stored_results():
+    """
+    Re-score stored test images and video frames against the current truth gallery and
+    FACE_DISTANCE_THRESHOLD, from the embeddings saved with each row (no image decoding).
+    Run it after changing the threshold or the truth images.
+    Optional JSON/form field:
+    - collection: test_images | video_matches (default: both)
+    Returns per collection the rows looked at, rows updated and rows that could not be
+    re-scored (stored before embeddings were kept), plus the timelines rebuilt.
+    One re-score runs at a time; a request while one is running gets 429.
+    """
+    payload = request.get_json(silent=True) or request.form
+    collection = payload.get("collection")
+    if collection and collection not in RESCORE_COLLECTIONS:
+        return jsonify({"error": f"collection must be one of {', '.join(RESCORE_COLLECTIONS)}"}), 400
+    collections = (collection,) if collection else RESCORE_COLLECTIONS
+
+    report = rescore_results(
+        current_app.session_local,  # type: ignore[attr-defined]
+        float(current_app.config["FACE_DISTANCE_THRESHOLD"]),
+        collections,
+    )
+    return jsonify(report.to_dict())
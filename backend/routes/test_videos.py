@@ -1,22 +1,31 @@
 from __future__ import annotations
 
+import json
 import logging
-import os
-import uuid
+from datetime import datetime
 from pathlib import Path
 
 from flask import Blueprint, current_app, jsonify, request
-from sqlalchemy import select
+from sqlalchemy import func, select
 
-from models import TestVideo, TruthImage, VideoMatch
-from services.face_service import compare_embeddings, extract_face_embedding
-from services.video_service import extract_frames_one_per_second
+from database import bulk_insert
+from models import TestVideo, TruthImage, VideoJob, VideoSegment
+from services.admission import admission_controlled, busy_response, upload_admission
+from services.job_service import FINISHED_STATUSES, JOB_CANCELLED, JOB_MODE_FULL, JOB_MODES, JOB_QUEUED
+from services.storage import save_upload
+from services.timing import STAGE_DB_WRITE, stage
+from services.truth_service import identity_name
 
 logger = logging.getLogger(__name__)
 
 test_videos_bp = Blueprint("test_videos", __name__)
 
-def _to_public_url(path_value: str) -> str:
+# Retry-After of uploads refused because of the job backlog: jobs take minutes, not seconds.
+_BACKLOG_RETRY_AFTER_SECONDS = 60
+
+def _to_public_url(path_value: str) -> str | None:
+    if not path_value:
+        return None
     norm = path_value.replace("\\", "/")
     if "/uploads/" in norm:
         rel = norm.split("/uploads/", 1)[1]
@@ -24,93 +33,219 @@ def _to_public_url(path_value: str) -> str:
     return f"/uploads/{norm.lstrip('/')}"
 
 
-def _get_latest_truth_embedding(db) -> list[float] | None:
-    truth = db.execute(select(TruthImage).order_by(TruthImage.id.desc())).scalars().first()
-    if not truth:
-        return None
-    return truth.embedding_as_list()
-
-
 @test_videos_bp.post("/test-videos")
+@admission_controlled(upload_admission)
 def upload_test_videos():
     """
     Upload multiple test videos:
-    - save each video to uploads/videos/
-    - extract frames (1 frame/sec) into uploads/frames/<video_id>/
-    - match each frame vs truth image
-    - store per-frame results in video_matches
+    - save each video to uploads/videos/ (content-addressed; re-uploads reuse cached frame embeddings)
+    - queue one background job per video and return right away (202)
+    Frame extraction (1 frame/sec) and matching run in the job workers;
+    poll GET /api/video-jobs/<job_id> for progress.
+    Optional form fields:
+    - mode=search: only find whether/when enrolled people appear (coarse-to-fine, early exit);
+      the job then reports the located time `ranges`
+    - max_matches: search stops after this many appearances (default VIDEO_SEARCH_MAX_MATCHES, 0 = all)
+    While VIDEO_JOB_MAX_QUEUED jobs are waiting, uploads are refused (503) before the body is read.
     """
+    SessionLocal = current_app.session_local  # type: ignore[attr-defined]
+    max_queued = current_app.config["VIDEO_JOB_MAX_QUEUED"]
+    if max_queued > 0:
+        with SessionLocal() as db:
+            queued_jobs = db.scalar(select(func.count()).select_from(VideoJob).where(VideoJob.status == JOB_QUEUED))
+        if queued_jobs >= max_queued:
+            return busy_response(
+                f"{queued_jobs} video jobs are already queued, retry later", 503, _BACKLOG_RETRY_AFTER_SECONDS
+            )
+
     files = request.files.getlist("files")
     if not files:
         return jsonify({"error": "No files provided"}), 400
+    max_files = current_app.config["MAX_VIDEOS_PER_REQUEST"]
+    if len(files) > max_files:
+        return jsonify({"error": f"At most {max_files} videos per request"}), 413
+
+    mode = request.form.get("mode", JOB_MODE_FULL).lower()
+    if mode not in JOB_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(JOB_MODES)}"}), 400
+    max_matches = None
+    if request.form.get("max_matches"):
+        try:
+            max_matches = int(request.form["max_matches"])
+        except ValueError:
+            return jsonify({"error": "max_matches must be an integer"}), 400
+        if max_matches < 0:
+            return jsonify({"error": "max_matches must be >= 0"}), 400
+
+    uploads_root = Path(current_app.config["UPLOAD_FOLDER"])
+
+    # Store every file first: streaming large videos to disk must not happen while a
+    # transaction (and on SQLite, the write lock) is open.
+    stored = [
+        save_upload(file, uploads_root, "videos", "vid", ".mp4")
+        for file in files
+        if file and file.filename != ""
+    ]
+
+    with SessionLocal() as db:
+        with stage(STAGE_DB_WRITE):
+            videos = bulk_insert(
+                db,
+                TestVideo,
+                [{"video_path": u.rel_path, "content_hash": u.content_hash} for u in stored],
+                returning=True,
+            )
+            jobs = bulk_insert(
+                db,
+                VideoJob,
+                [
+                    {"video_id": v.id, "status": JOB_QUEUED, "mode": mode, "max_matches": max_matches}
+                    for v in videos
+                ],
+                returning=True,
+            )
+            db.commit()
+
+        queued = [
+            {
+                "video": {
+                    "id": video_row.id,
+                    "video_path": video_row.video_path,
+                    "public_url": _to_public_url(video_row.video_path),
+                },
+                "job": _job_to_dict(job),
+            }
+            for video_row, job in zip(videos, jobs)
+        ]
+
+    current_app.video_job_runner.notify()  # type: ignore[attr-defined]
+
+    return jsonify({"message": "Test videos queued", "results": queued}), 202
+
+
+def _job_to_dict(job: VideoJob) -> dict:
+    progress = None
+    if job.frames_total:
+        progress = round(min(1.0, job.frames_done / job.frames_total) * 100.0, 1)
+    return {
+        "id": job.id,
+        "video_id": job.video_id,
+        "status": job.status,
+        "mode": job.mode,
+        "max_matches": job.max_matches,
+        "ranges": json.loads(job.ranges) if job.ranges else None,
+        "frames_done": job.frames_done or 0,
+        "frames_total": job.frames_total or 0,
+        "progress": progress,
+        "cancel_requested": bool(job.cancel_requested),
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@test_videos_bp.get("/videos/<int:video_id>/segments")
+def get_video_segments(video_id: int):
+    """
+    Match timeline of one video: consecutive sampled frames with the same outcome collapsed
+    into segments (start/end = first/last frame, in seconds), in time order.
+    - ?match_status=MATCH (comma-separated) keeps only those segments
+    - `complete` is false while the video's latest job still runs (the last segment grows)
+    - search jobs only produce MATCH segments (the located ranges)
+    """
+    SessionLocal = current_app.session_local  # type: ignore[attr-defined]
+    statuses = [s.strip().upper() for s in request.args.get("match_status", "").split(",") if s.strip()]
 
-    videos_dir = Path(current_app.config["UPLOAD_FOLDER"]) / "videos"
-    frames_dir = Path(current_app.config["UPLOAD_FOLDER"]) / "frames"
-    videos_dir.mkdir(parents=True, exist_ok=True)
-    frames_dir.mkdir(parents=True, exist_ok=True)
+    query = (
+        select(VideoSegment, TruthImage.label)
+        .outerjoin(TruthImage, TruthImage.id == VideoSegment.truth_image_id)
+        .where(VideoSegment.video_id == video_id)
+        .order_by(VideoSegment.start_sec, VideoSegment.id)
+    )
+    if statuses:
+        query = query.where(VideoSegment.match_status.in_(statuses))
 
+    with SessionLocal() as db:
+        if db.get(TestVideo, video_id) is None:
+            return jsonify({"error": "Video not found"}), 404
+        job = db.execute(
+            select(VideoJob).where(VideoJob.video_id == video_id).order_by(VideoJob.id.desc()).limit(1)
+        ).scalar_one_or_none()
+        segments = [
+            {
+                "id": seg.id,
+                "match_status": seg.match_status,
+                "start_sec": seg.start_sec,
+                "end_sec": seg.end_sec,
+                "frame_count": seg.frame_count,
+                "max_confidence": seg.max_confidence,
+                "mean_confidence": seg.mean_confidence,
+                "truth_image_id": seg.truth_image_id,
+                "identity": identity_name(seg.truth_image_id, label) if seg.truth_image_id else None,
+            }
+            for seg, label in db.execute(query).all()
+        ]
+        return jsonify(
+            {
+                "video_id": video_id,
+                "complete": job is None or job.status in FINISHED_STATUSES,
+                "job": _job_to_dict(job) if job else None,
+                "segments": segments,
+            }
+        )
+
+
+@test_videos_bp.get("/video-jobs")
+def list_video_jobs():
+    """
+    List recent video jobs (newest first). Optional ?status=QUEUED|RUNNING|DONE|FAILED|CANCELLED
+    """
     SessionLocal = current_app.session_local  # type: ignore[attr-defined]
-    threshold = float(current_app.config["FACE_DISTANCE_THRESHOLD"])
+    status = request.args.get("status")
+
+    query = select(VideoJob).order_by(VideoJob.id.desc()).limit(100)
+    if status:
+        query = query.where(VideoJob.status == status.upper())
 
-    processed = []
     with SessionLocal() as db:
-        truth_embedding = _get_latest_truth_embedding(db)
-
-        for file in files:
-            if not file or file.filename == "":
-                continue
-
-            ext = os.path.splitext(file.filename)[1].lower() or ".mp4"
-            filename = f"vid_{uuid.uuid4().hex}{ext}"
-            abs_video_path = videos_dir / filename
-            file.save(str(abs_video_path))
-            rel_video_path = str(Path("videos") / filename)
-
-            video_row = TestVideo(video_path=rel_video_path)
-            db.add(video_row)
-            db.flush()  # get id
-
-            out_frames_dir = frames_dir / f"video_{video_row.id}"
-            out_frames_dir.mkdir(parents=True, exist_ok=True)
-
-            frame_results = []
-            for fr in extract_frames_one_per_second(str(abs_video_path), str(out_frames_dir)):
-                # Store frame paths relative to uploads/ for easy serving
-                rel_frame_path = str(Path("frames") / f"video_{video_row.id}" / Path(fr.frame_path).name)
-                test_embedding = extract_face_embedding(fr.frame_path)
-                match = compare_embeddings(truth_embedding, test_embedding, threshold=threshold)
-
-                m = VideoMatch(
-                    video_id=video_row.id,
-                    frame_path=rel_frame_path,
-                    match_status=match.match_status,
-                    confidence_score=float(match.confidence_score),
-                )
-                db.add(m)
-                db.flush()
-                frame_results.append(
-                    {
-                        "id": m.id,
-                        "frame_path": m.frame_path,
-                        "public_url": _to_public_url(m.frame_path),
-                        "match_status": m.match_status,
-                        "confidence_score": m.confidence_score,
-                    }
-                )
-
-            processed.append(
-                {
-                    "video": {
-                        "id": video_row.id,
-                        "video_path": video_row.video_path,
-                        "public_url": _to_public_url(video_row.video_path),
-                    },
-                    "frames": frame_results,
-                }
-            )
+        jobs = db.execute(query).scalars().all()
+        return jsonify({"jobs": [_job_to_dict(j) for j in jobs]})
 
-        db.commit()
 
-    return jsonify({"message": "Test videos processed", "results": processed})
+@test_videos_bp.get("/video-jobs/<int:job_id>")
+def get_video_job(job_id: int):
+    """
+    Job status + progress (frames done/total).
+    """
+    SessionLocal = current_app.session_local  # type: ignore[attr-defined]
+    with SessionLocal() as db:
+        job = db.get(VideoJob, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify({"job": _job_to_dict(job)})
 
 
+@test_videos_bp.post("/video-jobs/<int:job_id>/cancel")
+def cancel_video_job(job_id: int):
+    """
+    Cancel a job:
+    - QUEUED jobs are cancelled immediately
+    - RUNNING jobs stop after the current frame (frames already stored are kept)
+    """
+    SessionLocal = current_app.session_local  # type: ignore[attr-defined]
+    with SessionLocal() as db:
+        job = db.get(VideoJob, job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        if job.status in FINISHED_STATUSES:
+            return jsonify({"error": f"Job already {job.status}", "job": _job_to_dict(job)}), 409
+
+        job.cancel_requested = True
+        job.updated_at = datetime.utcnow()
+        if job.status == JOB_QUEUED:
+            job.status = JOB_CANCELLED
+            job.finished_at = job.updated_at
+        db.commit()
+        db.refresh(job)
+        return jsonify({"message": "Cancellation requested", "job": _job_to_dict(job)})
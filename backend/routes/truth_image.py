@@ -1,14 +1,17 @@
 from __future__ import annotations
 
 import logging
-import os
-import uuid
 from pathlib import Path
 
 from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import select, update
 
 from models import TruthImage
-from services.face_service import embedding_to_json, extract_face_embedding
+from services.admission import admission_controlled, face_admission
+from services.embedding_cache import embeddings_for_uploads
+from services.storage import save_upload
+from services.timing import STAGE_DB_WRITE, stage
+from services.truth_service import identity_name, mark_truth_gallery_changed, truth_gallery_cache
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +19,18 @@ truth_image_bp = Blueprint("truth_image", __name__)
 
 
 @truth_image_bp.post("/truth-image")
+@admission_controlled(face_admission)
 def upload_truth_image():
     """
-    Upload Truth Image:
-    - saves image to uploads/truth/
-    - extracts embedding
-    - stores embedding in DB (overwrites by inserting new row; latest row is used)
+    Upload Truth Image (enroll an identity in the truth gallery):
+    - saves image to uploads/truth/ (content-addressed)
+    - extracts embedding (or reuses the cached one for identical bytes)
+    - stores embedding in DB; every active row is matched against
+    Optional form fields:
+    - label: identity name reported in results (default "truth_<id>")
+    - replace=true: deactivate all other identities (single-person mode). Defaults to true
+      without a label, as before the gallery (a plain upload replaces the truth image), and
+      to false with one (adds an identity to the gallery)
     """
     if "file" not in request.files:
         return jsonify({"error": "Missing file field"}), 400
@@ -30,36 +39,75 @@ def upload_truth_image():
     if not file or file.filename == "":
         return jsonify({"error": "No file selected"}), 400
 
-    uploads_dir = Path(current_app.config["UPLOAD_FOLDER"]) / "truth"
-    uploads_dir.mkdir(parents=True, exist_ok=True)
-
-    ext = os.path.splitext(file.filename)[1].lower() or ".jpg"
-    filename = f"truth_{uuid.uuid4().hex}{ext}"
-    abs_path = uploads_dir / filename
-    file.save(str(abs_path))
-    rel_path = str(Path("truth") / filename)
+    SessionLocal = current_app.session_local  # type: ignore[attr-defined]
+    upload = save_upload(file, Path(current_app.config["UPLOAD_FOLDER"]), "truth", "truth", ".jpg")
+    rel_path = upload.rel_path
 
-    embedding = extract_face_embedding(str(abs_path))
+    embedding = embeddings_for_uploads(SessionLocal, [upload], workers=1)[0]
     if embedding is None:
         # Keep file saved for visibility/debugging.
         return jsonify({"error": "No face found in truth image"}), 400
 
+    label = (request.form.get("label") or "").strip() or None
+    replace = request.form.get("replace", "false" if label else "true").lower() in ("1", "true", "yes")
+    with SessionLocal() as db:
+        with stage(STAGE_DB_WRITE):
+            if replace:
+                db.execute(update(TruthImage).where(TruthImage.active.is_(True)).values(active=False))
+            truth = TruthImage(image_path=rel_path, label=label, active=True, embedding=embedding)
+            db.add(truth)
+            mark_truth_gallery_changed(db)
+            db.commit()
+        truth_gallery_cache.invalidate()
+        db.refresh(truth)
+
+    return jsonify({"message": "Truth image uploaded", "truth_image": _truth_to_dict(truth)})
+
+
+def _truth_to_dict(truth: TruthImage) -> dict:
+    return {
+        "id": truth.id,
+        "image_path": truth.image_path,
+        "public_url": f"/uploads/{truth.image_path}",
+        "identity": identity_name(truth.id, truth.label),
+        "label": truth.label,
+        "active": bool(truth.active),
+        "created_at": truth.created_at.isoformat() if truth.created_at else None,
+    }
+
+
+@truth_image_bp.get("/truth-images")
+def list_truth_images():
+    """
+    List enrolled identities. ?all=true also returns deactivated ones.
+    """
+    include_inactive = request.args.get("all", "").lower() in ("1", "true", "yes")
+    query = select(TruthImage).order_by(TruthImage.id.desc())
+    if not include_inactive:
+        query = query.where(TruthImage.active.is_(True))
+
     SessionLocal = current_app.session_local  # type: ignore[attr-defined]
     with SessionLocal() as db:
-        truth = TruthImage(image_path=rel_path, embedding=embedding_to_json(embedding))
-        db.add(truth)
+        rows = db.execute(query).scalars().all()
+        return jsonify({"truth_images": [_truth_to_dict(t) for t in rows]})
+
+
+@truth_image_bp.delete("/truth-images/<int:truth_id>")
+def deactivate_truth_image(truth_id: int):
+    """
+    Remove an identity from the gallery. The row is kept (deactivated) because
+    existing results reference it.
+    """
+    SessionLocal = current_app.session_local  # type: ignore[attr-defined]
+    with SessionLocal() as db:
+        truth = db.get(TruthImage, truth_id)
+        if truth is None:
+            return jsonify({"error": "Truth image not found"}), 404
+        truth.active = False
+        mark_truth_gallery_changed(db)
         db.commit()
+        truth_gallery_cache.invalidate()
         db.refresh(truth)
-
-    return jsonify(
-        {
-            "message": "Truth image uploaded",
-            "truth_image": {
-                "id": truth.id,
-                "image_path": truth.image_path,
-                "public_url": f"/uploads/{truth.image_path}",
-            },
-        }
-    )
+        return jsonify({"message": "Truth image deactivated", "truth_image": _truth_to_dict(truth)})
 
 
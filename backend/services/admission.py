@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import functools
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from flask import jsonify, make_response
+
+REJECT_QUEUE_FULL = "queue_full"  # 429: more requests waiting than the queue holds
+REJECT_QUEUE_TIMEOUT = "queue_timeout"  # 503: waited ADMISSION_QUEUE_TIMEOUT_SECONDS without a slot
+
+_MAX_RETRY_AFTER_SECONDS = 300
+
+
+@dataclass
+class Rejection:
+    status: int
+    reason: str
+    retry_after: int  # seconds
+
+
+class AdmissionGate:
+    """
+    Bounded concurrency with a bounded first-come-first-served wait queue, for one kind of
+    expensive request (per app process):
+    - up to `max_active` requests run at once; up to `max_queued` more wait for a slot, at
+      most `queue_timeout` seconds each
+    - a request beyond that is refused right away (429), one that waited too long gets 503;
+      both with a Retry-After estimated from recent request durations
+    So under a burst the admitted requests keep their normal latency instead of every
+    request slowing down until they all time out. max_active <= 0 admits everything.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.max_active = 0
+        self.max_queued = 0
+        self.queue_timeout = 30.0
+        self.active = 0
+        self.admitted = 0
+        self.rejected = {REJECT_QUEUE_FULL: 0, REJECT_QUEUE_TIMEOUT: 0}
+        self._avg_seconds = 1.0  # moving average of admitted request durations
+        self._waiters: deque[threading.Event] = deque()
+        self._lock = threading.Lock()
+
+    def configure(self, max_active: int, max_queued: int, queue_timeout: float) -> None:
+        with self._lock:
+            self.max_active = int(max_active)
+            self.max_queued = max(0, int(max_queued))
+            self.queue_timeout = float(queue_timeout)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self) -> Optional[Rejection]:
+        """None once the caller holds a slot (it must call `release`), else why it was refused."""
+        with self._lock:
+            if self.max_active <= 0 or (self.active < self.max_active and not self._waiters):
+                self.active += 1
+                self.admitted += 1
+                return None
+            if len(self._waiters) >= self.max_queued:
+                return self._reject(429, REJECT_QUEUE_FULL)
+            turn = threading.Event()
+            self._waiters.append(turn)
+
+        if turn.wait(self.queue_timeout):
+            with self._lock:
+                self.admitted += 1
+            return None
+        with self._lock:
+            if turn.is_set():  # handed a slot just as the wait timed out
+                self.admitted += 1
+                return None
+            self._waiters.remove(turn)
+            return self._reject(503, REJECT_QUEUE_TIMEOUT)
+
+    def release(self, seconds: float) -> None:
+        with self._lock:
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * seconds
+            if self._waiters:
+                self._waiters.popleft().set()  # the slot passes straight to the oldest waiter
+            else:
+                self.active -= 1
+
+    def _reject(self, status: int, reason: str) -> Rejection:
+        # Caller holds the lock. Time until a new request would get a slot, roughly.
+        self.rejected[reason] += 1
+        rounds = math.ceil((len(self._waiters) + 1) / max(1, self.max_active))
+        retry_after = min(_MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(self._avg_seconds * rounds)))
+        return Rejection(status=status, reason=reason, retry_after=retry_after)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": self.active,
+                "queued": len(self._waiters),
+                "max_active": self.max_active,
+                "max_queued": self.max_queued,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "avg_seconds": round(self._avg_seconds, 3),
+            }
+
+
+def busy_response(message: str, status: int, retry_after: int):
+    """JSON error with a Retry-After header (429/503), for requests refused before any work."""
+    response = jsonify({"error": message, "retry_after": retry_after})
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def rejection_response(rejection: Rejection):
+    return busy_response(
+        f"Server busy ({rejection.reason.replace('_', ' ')}), retry later", rejection.status, rejection.retry_after
+    )
+
+
+def admission_controlled(gate: AdmissionGate) -> Callable:
+    """
+    View decorator: the view only runs once `gate` admits the request, before the request
+    body is parsed, so refused uploads cost no buffering. The slot is held until the
+    response has been sent (streamed NDJSON responses included).
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            rejection = gate.acquire()
+            if rejection is not None:
+                return rejection_response(rejection)
+            started = time.perf_counter()
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                gate.release(time.perf_counter() - started)
+                raise
+            response.call_on_close(lambda: gate.release(time.perf_counter() - started))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# Image uploads, archive ingestion and face search: CPU-bound face detection + encoding.
+face_admission = AdmissionGate("face")
+# Video uploads: the file is written to disk and a job queued; the work itself is queued.
+upload_admission = AdmissionGate("video_upload")
+# Re-scoring every stored result: one at a time, a second request is refused rather than
+# running the same full-table pass twice.
+rescore_admission = AdmissionGate("rescore")
+ADMISSION_GATES = (face_admission, upload_admission, rescore_admission)
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import io
+import json
+import logging
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator, Optional
+
+from database import bulk_insert
+from models import TestImage
+from services.embedding_cache import faces_for_uploads
+from services.face_service import match_faces, stored_faces
+from services.storage import StoredUpload, save_stream_content_addressed
+from services.timing import STAGE_DB_WRITE, STAGE_UPLOAD_SAVE, stage
+from services.truth_service import get_truth_gallery
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+_ZIP_MAGICS = (b"PK\x03\x04", b"PK\x05\x06")  # first entry / empty archive
+# Errors a damaged or truncated archive raises while it is being read. tarfile reports bad
+# gzip/bz2/xz data as ReadError; an OSError (e.g. a full disk while saving) is not the archive's.
+_READ_ERRORS = (tarfile.TarError, zipfile.BadZipFile, zlib.error, EOFError)
+
+SKIP_NOT_IMAGE = "not_image"
+SKIP_TOO_LARGE = "too_large"
+SKIP_UNREADABLE = "unreadable"
+
+
+class ArchiveError(ValueError):
+    """The upload is not a readable ZIP or TAR archive."""
+
+
+@dataclass
+class ArchiveEntry:
+    name: str
+    size: int  # uncompressed size declared by the archive
+    stream: Optional[BinaryIO]  # None for entries that are not regular files
+    error: Optional[str] = None  # set when the member cannot be opened (encrypted, unknown method)
+
+
+@dataclass(frozen=True)
+class ArchiveIngestSettings:
+    """
+    - batch_size: images embedded, matched and committed together (one progress event each)
+    - max_entries: archive members looked at, images or not (guards against millions of tiny entries)
+    - max_entry_bytes: larger members are skipped without being decompressed
+    """
+
+    threshold: float = 0.6
+    workers: Optional[int] = None
+    batch_size: int = 32
+    max_entries: int = 50_000
+    max_entry_bytes: int = 50 * 1024 * 1024
+
+    @classmethod
+    def from_config(cls, config) -> "ArchiveIngestSettings":
+        return cls(
+            threshold=float(config["FACE_DISTANCE_THRESHOLD"]),
+            workers=int(config["FACE_WORKERS"]),
+            batch_size=max(1, int(config["ARCHIVE_BATCH_SIZE"])),
+            max_entries=int(config["ARCHIVE_MAX_ENTRIES"]),
+            max_entry_bytes=int(config["ARCHIVE_MAX_ENTRY_MB"]) * 1024 * 1024,
+        )
+
+
+def open_archive(fileobj: BinaryIO) -> Iterator[ArchiveEntry]:
+    """
+    Entries of a ZIP or TAR (optionally gzip/bz2/xz compressed) archive, read one at a time.
+    - a TAR is read as a stream: it works on a non-seekable request body and never seeks back
+    - a ZIP keeps its directory at the end; a non-seekable stream is spooled to a temp file first
+    - each entry's stream is only valid until the next entry is requested
+    Raises ArchiveError right away if the data is neither format.
+    """
+    seekable = fileobj.seekable() if hasattr(fileobj, "seekable") else False
+    if seekable:
+        start = fileobj.tell()
+        head = fileobj.read(4)
+        fileobj.seek(start)
+    else:
+        if not hasattr(fileobj, "peek"):
+            fileobj = io.BufferedReader(fileobj)  # type: ignore[arg-type]
+        head = fileobj.peek(4)[:4]
+
+    if head in _ZIP_MAGICS:
+        if not seekable:
+            spooled = tempfile.TemporaryFile()
+            shutil.copyfileobj(fileobj, spooled, 1024 * 1024)
+            spooled.seek(0)
+            fileobj = spooled
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile as e:
+            raise ArchiveError(f"Unreadable ZIP archive: {e}") from e
+        return _zip_entries(archive)
+
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode="r|*")
+    except tarfile.TarError as e:
+        raise ArchiveError("Expected a ZIP or TAR archive") from e
+    return _tar_entries(archive)
+
+
+def _zip_entries(archive: zipfile.ZipFile) -> Iterator[ArchiveEntry]:
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                yield ArchiveEntry(info.filename, 0, None)
+                continue
+            try:
+                stream = archive.open(info)
+            except (RuntimeError, NotImplementedError, zipfile.BadZipFile) as e:
+                yield ArchiveEntry(info.filename, info.file_size, None, error=str(e))
+                continue
+            with stream:
+                yield ArchiveEntry(info.filename, info.file_size, stream)
+
+
+def _tar_entries(archive: tarfile.TarFile) -> Iterator[ArchiveEntry]:
+    with archive:
+        for member in archive:
+            # Links, devices and directories have no content of their own.
+            stream = archive.extractfile(member) if member.isfile() else None
+            yield ArchiveEntry(member.name, member.size, stream)
+            # TarFile keeps every member it has read; a stream never needs them again.
+            archive.members = []
+
+
+def _is_image_name(name: str) -> bool:
+    path = PurePosixPath(name.replace("\\", "/"))
+    # Skip macOS resource forks (__MACOSX/, ._name) and other hidden files.
+    if any(part.startswith(".") or part == "__MACOSX" for part in path.parts):
+        return False
+    return path.suffix.lower() in ARCHIVE_IMAGE_SUFFIXES
+
+
+@dataclass
+class IngestProgress:
+    entries: int = 0  # archive members looked at
+    images: int = 0  # image entries saved
+    processed: int = 0  # images matched and committed
+    skipped: dict[str, int] = field(default_factory=dict)
+    match_status: dict[str, int] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+    def skip(self, reason: str) -> None:
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            "entries": self.entries,
+            "images": self.images,
+            "processed": self.processed,
+            "skipped": dict(self.skipped),
+            "match_status": dict(self.match_status),
+            "elapsed_seconds": round(time.perf_counter() - self.started, 3),
+        }
+
+
+_Batch = list[tuple[str, StoredUpload]]  # (entry name, saved upload)
+
+
+def ingest_archive(
+    session_factory,
+    entries: Iterator[ArchiveEntry],
+    uploads_root: Path,
+    settings: ArchiveIngestSettings,
+) -> Iterator[dict]:
+    """
+    Stream archive entries into test images. Yields one event per committed batch
+    ({"event": "progress", ..., "results": [...]}) and a final {"event": "done", "error": ...}.
+
+    - entries are saved content-addressed straight from the archive stream, one at a time
+    - a full batch is embedded (embedding cache + face worker pool) on a background thread
+      while the next batch is read from the archive; at most two batches are in flight,
+      so memory stays flat whatever the archive size
+    - each batch is matched against the gallery and bulk-inserted in one short transaction
+    - a damaged archive ends the run after the batches already read are committed
+    """
+    progress = IngestProgress()
+    error: Optional[str] = None
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive-embed")
+    in_flight: Optional[tuple[_Batch, Future]] = None
+    batch: _Batch = []
+
+    def submit(to_embed: _Batch) -> tuple[_Batch, Future]:
+        uploads = [upload for _name, upload in to_embed]
+        return to_embed, executor.submit(faces_for_uploads, session_factory, uploads, settings.workers)
+
+    try:
+        try:
+            for entry in entries:
+                progress.entries += 1
+                if progress.entries > settings.max_entries:
+                    error = f"Archive has more than {settings.max_entries} entries; the rest was not read"
+                    break
+                upload = _save_entry(entry, uploads_root, settings, progress)
+                if upload is None:
+                    continue
+                batch.append((entry.name, upload))
+                if len(batch) < settings.batch_size:
+                    continue
+                previous, in_flight = in_flight, submit(batch)
+                batch = []
+                if previous is not None:
+                    yield _commit_batch(session_factory, previous, settings, progress)
+        except _READ_ERRORS as e:
+            logger.warning("Archive ingestion stopped after %s entries: %s", progress.entries, e)
+            error = f"Archive could not be read to the end: {e}"
+
+        if in_flight is not None:
+            yield _commit_batch(session_factory, in_flight, settings, progress)
+            in_flight = None
+        if batch:
+            yield _commit_batch(session_factory, submit(batch), settings, progress)
+    finally:
+        # A client that disconnects closes this generator: drop work that has not started.
+        executor.shutdown(wait=True, cancel_futures=True)
+        close = getattr(entries, "close", None)
+        if close is not None:
+            close()
+
+    logger.info(
+        "Archive ingested: %s image(s) from %s entries in %.1fs",
+        progress.processed,
+        progress.entries,
+        time.perf_counter() - progress.started,
+    )
+    yield {"event": "done", **progress.to_dict(), "error": error}
+
+
+def _save_entry(
+    entry: ArchiveEntry,
+    uploads_root: Path,
+    settings: ArchiveIngestSettings,
+    progress: IngestProgress,
+) -> Optional[StoredUpload]:
+    if entry.error is not None:
+        logger.warning("Skipping archive entry %s: %s", entry.name, entry.error)
+        progress.skip(SKIP_UNREADABLE)
+        return None
+    if entry.stream is None:
+        return None  # directories and links are not counted as skipped files
+    if not _is_image_name(entry.name):
+        progress.skip(SKIP_NOT_IMAGE)
+        return None
+    if entry.size > settings.max_entry_bytes:
+        progress.skip(SKIP_TOO_LARGE)
+        return None
+    ext = PurePosixPath(entry.name).suffix.lower()
+    try:
+        with stage(STAGE_UPLOAD_SAVE):
+            upload = save_stream_content_addressed(entry.stream, uploads_root, "images", "img", ext)
+    except (zipfile.BadZipFile, zlib.error) as e:
+        # A bad CRC or deflate stream spoils this member only; later members are still readable.
+        logger.warning("Skipping unreadable archive entry %s: %s", entry.name, e)
+        progress.skip(SKIP_UNREADABLE)
+        return None
+    progress.images += 1
+    return upload
+
+
+def _commit_batch(
+    session_factory,
+    in_flight: tuple[_Batch, Future],
+    settings: ArchiveIngestSettings,
+    progress: IngestProgress,
+) -> dict:
+    batch, future = in_flight
+    faces = future.result()
+    with session_factory() as db:
+        gallery = get_truth_gallery(db)
+        matches, embeddings = match_faces(gallery, faces, threshold=settings.threshold)
+        with stage(STAGE_DB_WRITE):
+            rows = bulk_insert(
+                db,
+                TestImage,
+                [
+                    {
+                        "image_path": upload.rel_path,
+                        "content_hash": upload.content_hash,
+                        "match_status": match.match_status,
+                        "confidence_score": float(match.confidence_score),
+                        "truth_image_id": match.truth_image_id,
+                        "embedding": embedding,
+                        "face_box": json.dumps(match.face_box) if match.face_box else None,
+                        **stored_faces(f),
+                    }
+                    for (_name, upload), match, embedding, f in zip(batch, matches, embeddings, faces)
+                ],
+                returning=True,
+            )
+            ids = [row.id for row in rows]
+            db.commit()
+
+    results = []
+    for row_id, (name, upload), match in zip(ids, batch, matches):
+        progress.match_status[match.match_status] = progress.match_status.get(match.match_status, 0) + 1
+        results.append(
+            {
+                "id": row_id,
+                "entry": name,
+                "image_path": upload.rel_path,
+                "match_status": match.match_status,
+                "confidence_score": match.confidence_score,
+                "truth_image_id": match.truth_image_id,
+                "identity": match.identity,
+                "face_box": match.face_box,
+            }
+        )
+    progress.processed += len(batch)
+    return {"event": "progress", **progress.to_dict(), "results": results}
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy import delete, func, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from database import insert_ignoring_duplicates
+from models import EmbeddingCacheEntry
+from services.face_service import DetectedFaces, extract_faces_batch
+from services.storage import StoredUpload
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FRAME_MS = -1  # frame_ms used for still images
+DEFAULT_VARIANT = "default"
+
+# Keys are (content_hash, frame_ms); a cached value of None means "no face found".
+CacheKey = tuple[str, int]
+
+_LOOKUP_CHUNK = 400  # stays below SQLite's bound-parameter limit
+_KEY_COLUMNS = ["content_hash", "frame_ms", "variant"]  # uq_embedding_cache_key
+# Eviction deletes down to this share of max_entries, so the next few stores don't evict again.
+_EVICT_LOW_WATER = 0.9
+
+
+def _pack(faces: Optional[DetectedFaces]) -> tuple[Optional[bytes], Optional[bytes]]:
+    """DetectedFaces -> (embedding, face_boxes) column values."""
+    return faces.to_blobs() if faces is not None else (None, None)
+
+
+def _unpack(embedding: Optional[bytes], boxes: Optional[bytes]) -> Optional[DetectedFaces]:
+    return DetectedFaces.from_blobs(embedding, boxes) if embedding is not None else None
+
+
+class EmbeddingCache:
+    """
+    DB-backed, content-addressed embedding cache shared by all processes.
+
+    - lookups/stores are batched (one query per chunk of keys)
+    - size is bounded by `max_entries`; least recently used entries are evicted. The table
+      is only counted when this process's estimate (last count + entries stored since)
+      passes the bound or `evict_interval` seconds have gone by (other processes store too)
+    - hit/miss counters are per process; the table's `hits` column is the global view
+    - reads don't take the write lock on every hit: an entry's `last_used_at` is only
+      refreshed once it is older than `evict_interval` (finer LRU order is never used),
+      and its hits are kept in memory until then or the next eviction check
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_entries: int = 200_000,
+        variant: str = DEFAULT_VARIANT,
+        evict_interval: float = 60.0,
+    ):
+        self.enabled = enabled
+        self.max_entries = int(max_entries)
+        self.variant = variant
+        self.evict_interval = float(evict_interval)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._estimate: Optional[int] = None  # entries at the last count + stored since
+        self._counted_at = 0.0
+        self._pending_hits: dict[int, int] = {}  # entry id -> hits not yet written
+
+    def configure(
+        self,
+        enabled: bool,
+        max_entries: int,
+        variant: Optional[str] = None,
+        evict_interval: Optional[float] = None,
+    ) -> None:
+        self.enabled = bool(enabled)
+        self.max_entries = int(max_entries)
+        if variant is not None:
+            self.variant = variant
+        if evict_interval is not None:
+            self.evict_interval = float(evict_interval)
+        with self._lock:
+            self._estimate = None
+
+    def lookup(self, db: Session, keys: Iterable[CacheKey]) -> dict[CacheKey, Optional[DetectedFaces]]:
+        """
+        Returns the cached keys only (missing keys are absent from the dict).
+        """
+        keys = list(dict.fromkeys(keys))
+        if not self.enabled or not keys:
+            return {}
+
+        found: dict[CacheKey, Optional[DetectedFaces]] = {}
+        used: list[tuple[int, datetime]] = []
+        for start in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[start : start + _LOOKUP_CHUNK]
+            rows = db.execute(
+                select(
+                    EmbeddingCacheEntry.id,
+                    EmbeddingCacheEntry.content_hash,
+                    EmbeddingCacheEntry.frame_ms,
+                    EmbeddingCacheEntry.embedding,
+                    EmbeddingCacheEntry.face_boxes,
+                    EmbeddingCacheEntry.last_used_at,
+                ).where(
+                    EmbeddingCacheEntry.variant == self.variant,
+                    tuple_(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.frame_ms).in_(chunk),
+                )
+            ).all()
+            for row_id, content_hash, frame_ms, embedding, boxes, last_used_at in rows:
+                found[(content_hash, frame_ms)] = _unpack(embedding, boxes)
+                used.append((row_id, last_used_at))
+        self._record_use(db, used)
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def lookup_video(self, db: Session, content_hash: str) -> dict[int, Optional[DetectedFaces]]:
+        """
+        All cached frames of one video (frame_ms -> faces), loaded in one query.
+        Hit/miss accounting happens per frame via `count`.
+        """
+        if not self.enabled:
+            return {}
+        rows = db.execute(
+            select(
+                EmbeddingCacheEntry.id,
+                EmbeddingCacheEntry.frame_ms,
+                EmbeddingCacheEntry.embedding,
+                EmbeddingCacheEntry.face_boxes,
+                EmbeddingCacheEntry.last_used_at,
+            ).where(
+                EmbeddingCacheEntry.variant == self.variant,
+                EmbeddingCacheEntry.content_hash == content_hash,
+                EmbeddingCacheEntry.frame_ms != IMAGE_FRAME_MS,
+            )
+        ).all()
+        self._record_use(db, [(row_id, last_used_at) for row_id, _, _, _, last_used_at in rows])
+        return {frame_ms: _unpack(embedding, boxes) for _, frame_ms, embedding, boxes, _ in rows}
+
+    def _record_use(self, db: Session, used: list[tuple[int, datetime]]) -> None:
+        """
+        Count a hit on each (id, last_used_at) entry. Only entries last used more than
+        `evict_interval` ago are written, with the hits they collected in memory since.
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=self.evict_interval)
+        with self._lock:
+            for row_id, _ in used:
+                self._pending_hits[row_id] = self._pending_hits.get(row_id, 0) + 1
+            due = {
+                row_id: self._pending_hits.pop(row_id)
+                for row_id, last_used_at in used
+                if last_used_at is None or last_used_at <= stale_before
+            }
+        self._write_hits(db, due, touch=True)
+
+    def _write_hits(self, db: Session, hits: dict[int, int], touch: bool) -> None:
+        """Add hits to entries, one UPDATE per distinct count and chunk of ids."""
+        by_count: dict[int, list[int]] = defaultdict(list)
+        for row_id, n in hits.items():
+            by_count[n].append(row_id)
+        values = {"last_used_at": datetime.utcnow()} if touch else {}
+        for n, ids in by_count.items():
+            for start in range(0, len(ids), _LOOKUP_CHUNK):
+                db.execute(
+                    update(EmbeddingCacheEntry)
+                    .where(EmbeddingCacheEntry.id.in_(ids[start : start + _LOOKUP_CHUNK]))
+                    .values(hits=EmbeddingCacheEntry.hits + n, **values)
+                )
+
+    def count(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def store(self, db: Session, entries: dict[CacheKey, Optional[DetectedFaces]]) -> None:
+        """
+        Insert new entries in the caller's transaction. Keys already cached, including ones
+        another process stores concurrently, are skipped by the database (no constraint error).
+        """
+        if not self.enabled or not entries:
+            return
+        now = datetime.utcnow()
+        rows = []
+        for (content_hash, frame_ms), faces in entries.items():
+            embedding, boxes = _pack(faces)
+            rows.append(
+                {
+                    "content_hash": content_hash,
+                    "frame_ms": frame_ms,
+                    "variant": self.variant,
+                    "embedding": embedding,
+                    "face_boxes": boxes,
+                    "hits": 0,
+                    "created_at": now,
+                    "last_used_at": now,
+                }
+            )
+        insert_ignoring_duplicates(db, EmbeddingCacheEntry, rows, _KEY_COLUMNS)
+        with self._lock:
+            if self._estimate is not None:
+                self._estimate += len(rows)  # an upper bound: skipped duplicates count too
+
+    def evict(self, db: Session) -> int:
+        """
+        Drop least recently used entries once the table holds more than `max_entries`,
+        down to _EVICT_LOW_WATER of it. Returns how many were removed. Cheap between
+        counts (see the class docstring); the delete walks ix_embedding_cache_last_used_at.
+        """
+        if not self.enabled:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            due = (
+                self._estimate is None
+                or self._estimate > self.max_entries
+                or now - self._counted_at >= self.evict_interval
+            )
+        if not due:
+            return 0
+        with self._lock:
+            pending, self._pending_hits = self._pending_hits, {}
+        self._write_hits(db, pending, touch=False)  # counts only: these entries are recent
+        total = db.execute(select(func.count(EmbeddingCacheEntry.id))).scalar() or 0
+        excess = total - int(self.max_entries * _EVICT_LOW_WATER) if total > self.max_entries else 0
+        if excess > 0:
+            oldest = (
+                select(EmbeddingCacheEntry.id)
+                .order_by(EmbeddingCacheEntry.last_used_at, EmbeddingCacheEntry.id)
+                .limit(excess)
+                .scalar_subquery()
+            )
+            db.execute(delete(EmbeddingCacheEntry).where(EmbeddingCacheEntry.id.in_(oldest)))
+            logger.info("Evicted %s embedding cache entries", excess)
+        with self._lock:
+            self._estimate = total - excess
+            self._counted_at = now
+        return excess
+
+    def stats(self, db: Optional[Session] = None) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "max_entries": self.max_entries,
+            }
+        if db is not None:
+            entries, lifetime_hits = db.execute(
+                select(func.count(EmbeddingCacheEntry.id), func.coalesce(func.sum(EmbeddingCacheEntry.hits), 0))
+            ).one()
+            stats.update({"entries": entries, "lifetime_hits": lifetime_hits})
+        return stats
+
+
+embedding_cache = EmbeddingCache()
+
+
+def faces_for_uploads(
+    session_factory,
+    uploads: list[StoredUpload],
+    workers: Optional[int] = None,
+) -> list[Optional[DetectedFaces]]:
+    """
+    Faces of stored uploads, in order: cached ones come from the embedding cache,
+    the rest are computed once per distinct content hash and then cached.
+    """
+    keys = [(u.content_hash, IMAGE_FRAME_MS) for u in uploads]
+    with session_factory() as db:
+        cached = embedding_cache.lookup(db, keys)
+        db.commit()
+
+    to_compute: dict[CacheKey, str] = {}
+    for key, upload in zip(keys, uploads):
+        if key not in cached and key not in to_compute:
+            to_compute[key] = upload.abs_path
+
+    computed: dict[CacheKey, Optional[DetectedFaces]] = {}
+    if to_compute:
+        computed = dict(zip(to_compute, extract_faces_batch(list(to_compute.values()), workers=workers)))
+        with session_factory() as db:
+            embedding_cache.store(db, computed)
+            embedding_cache.evict(db)
+            db.commit()
+
+    return [cached[key] if key in cached else computed[key] for key in keys]
+
+
+def embeddings_for_uploads(
+    session_factory,
+    uploads: list[StoredUpload],
+    workers: Optional[int] = None,
+) -> list[Optional[np.ndarray]]:
+    """
+    Embedding of the largest face of each upload (truth enrollment, face search queries),
+    through the same cache as `faces_for_uploads`.
+    """
+    faces = faces_for_uploads(session_factory, uploads, workers)
+    return [f.embeddings[0] if f is not None else None for f in faces]
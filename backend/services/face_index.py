@@ -0,0 +1,567 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import LargeBinary, select, type_coerce
+from sqlalchemy.orm import Session, sessionmaker
+
+from embedding_codec import EMBEDDING_BYTES, EMBEDDING_DIM, decode_embedding, decode_embeddings
+from models import TestImage, VideoMatch
+from services.face_service import DetectedFaces, FaceBox
+
+logger = logging.getLogger(__name__)
+
+SOURCE_TEST_IMAGE = "test_image"
+SOURCE_VIDEO_FRAME = "video_frame"
+# Index-internal source codes (one byte per face instead of a string).
+_SOURCES = (SOURCE_TEST_IMAGE, SOURCE_VIDEO_FRAME)
+_SOURCE_MODELS = {SOURCE_TEST_IMAGE: TestImage, SOURCE_VIDEO_FRAME: VideoMatch}
+
+INDEX_EXACT = "exact"
+INDEX_IVF = "ivf"
+
+_LOAD_CHUNK = 10_000  # rows decoded per chunk while loading
+_ID_CHUNK = 1_000  # ids per IN (...) when sweeping for rows committed out of order
+_SWEEP_SECONDS = 5.0  # without the background thread, sweep on a search at most this often
+_ASSIGN_CHUNK = 65_536  # vectors per distance block when assigning partitions
+_KMEANS_SAMPLE = 64  # training vectors per partition
+_KMEANS_ITERATIONS = 12
+
+
+@dataclass
+class FaceHit:
+    source: str  # SOURCE_TEST_IMAGE / SOURCE_VIDEO_FRAME
+    row_id: int  # test_images.id / video_matches.id
+    distance: float  # euclidean; approximate (int8 codes) for an IVF candidate until re-ranked
+    face_box: Optional[FaceBox] = None  # the row's face closest to the query, for rows with several faces
+
+
+def _sq_distances(queries: np.ndarray, matrix: np.ndarray, sq_norms: np.ndarray) -> np.ndarray:
+    """(M x D) queries vs (N x D) matrix -> (M x N) squared distances (|a|^2 + |b|^2 - 2 a.b)."""
+    q_sq = np.einsum("ij,ij->i", queries, queries)
+    d2 = q_sq[:, None] + sq_norms[None, :] - 2.0 * (queries @ matrix.T)
+    return np.maximum(d2, 0.0, out=d2)
+
+
+def _top_k(d2: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k smallest values of a 1-d array, nearest first."""
+    if k >= d2.shape[0]:
+        return np.argsort(d2, kind="stable")
+    part = np.argpartition(d2, k - 1)[:k]
+    return part[np.argsort(d2[part], kind="stable")]
+
+
+class _ExactPartition:
+    """
+    Every vector in one float32 matrix: a search is one matrix-vector product.
+    Storage grows by doubling, so topping up with new faces does not copy the index each time.
+    """
+
+    def __init__(self, vectors: np.ndarray, sources: np.ndarray, ids: np.ndarray):
+        self._size = 0
+        self._vectors = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._sources = np.empty(0, dtype=np.int8)
+        self._ids = np.empty(0, dtype=np.int64)
+        self.add(vectors, sources, ids)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._vectors.nbytes + self._sq_norms.nbytes + self._sources.nbytes + self._ids.nbytes
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[: self._size]
+
+    @property
+    def sources(self) -> np.ndarray:
+        return self._sources[: self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[: self._size]
+
+    def add(self, vectors: np.ndarray, sources: np.ndarray, ids: np.ndarray) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        end = self._size + len(ids)
+        if end > len(self._ids):
+            capacity = max(end, 2 * len(self._ids), 1024)
+            for name in ("_vectors", "_sq_norms", "_sources", "_ids"):
+                old = getattr(self, name)
+                grown = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+                grown[: self._size] = old[: self._size]
+                setattr(self, name, grown)
+        self._vectors[self._size : end] = vectors
+        self._sq_norms[self._size : end] = np.einsum("ij,ij->i", vectors, vectors)
+        self._sources[self._size : end] = sources
+        self._ids[self._size : end] = ids
+        self._size = end
+
+    def search(self, query: np.ndarray, k: int) -> list[tuple[int, int, float]]:
+        if not self._size:
+            return []
+        d2 = _sq_distances(query[None, :], self.vectors, self._sq_norms[: self._size])[0]
+        return [(int(self._sources[i]), int(self._ids[i]), float(d2[i])) for i in _top_k(d2, k)]
+
+
+class _IVFPartition:
+    """
+    Approximate index for large collections:
+    - k-means splits the vectors into `nlist` partitions (inverted lists), stored contiguously
+    - vectors are stored as int8 codes (per-dimension scalar quantization): 128 bytes a face
+      instead of 512
+    - a search scans only the `nprobe` partitions whose centroids are closest; distances are
+      computed on the codes directly (|u - c|^2 weighted by scale^2, with |c|^2 precomputed),
+      so no dequantized copy of the candidates is made
+    """
+
+    def __init__(self, vectors: np.ndarray, sources: np.ndarray, ids: np.ndarray, nlist: int, seed: int = 0):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        self.centroids = _train_kmeans(vectors, nlist, seed)
+        self.centroid_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        # Quantization range from the data (with a little headroom for vectors added later).
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        pad = (high - low) * 0.05 + 1e-6
+        self.offset = (low + high) / 2.0
+        self.scale = ((high - low) + 2 * pad) / 254.0
+        self.scale_sq = self.scale * self.scale
+        self.codes = np.empty((0, EMBEDDING_DIM), dtype=np.int8)
+        self.code_sq = np.empty(0, dtype=np.float32)  # sum(scale^2 * code^2) per vector
+        self.sources = np.empty(0, dtype=np.int8)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.list_offsets = np.zeros(len(self.centroids) + 1, dtype=np.int64)
+        self.add(vectors, sources, ids)
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.code_sq.nbytes + self.sources.nbytes + self.ids.nbytes + self.centroids.nbytes
+
+    def _encode(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(int8 codes, their weighted squared norms, partition of each vector), in blocks."""
+        n = vectors.shape[0]
+        codes = np.empty((n, EMBEDDING_DIM), dtype=np.int8)
+        code_sq = np.empty(n, dtype=np.float32)
+        lists = np.empty(n, dtype=np.int64)
+        for start in range(0, n, _ASSIGN_CHUNK):
+            block = vectors[start : start + _ASSIGN_CHUNK]
+            end = start + len(block)
+            quantized = np.clip(np.rint((block - self.offset) / self.scale), -127, 127)
+            codes[start:end] = quantized
+            code_sq[start:end] = (quantized * quantized) @ self.scale_sq
+            lists[start:end] = np.argmin(_sq_distances(block, self.centroids, self.centroid_sq), axis=1)
+        return codes, code_sq, lists
+
+    def add(self, vectors: np.ndarray, sources: np.ndarray, ids: np.ndarray) -> None:
+        """Assign new vectors to the existing partitions (the centroids are not retrained)."""
+        if not len(ids):
+            return
+        codes, code_sq, new_lists = self._encode(np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM))
+        old_lists = np.repeat(np.arange(len(self.centroids)), np.diff(self.list_offsets))
+        lists = np.concatenate([old_lists, new_lists])
+        order = np.argsort(lists, kind="stable")
+        self.codes = np.concatenate([self.codes, codes])[order]
+        self.code_sq = np.concatenate([self.code_sq, code_sq])[order]
+        self.sources = np.concatenate([self.sources, sources])[order]
+        self.ids = np.concatenate([self.ids, ids])[order]
+        counts = np.bincount(lists, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def search(self, query: np.ndarray, k: int, nprobe: int) -> list[tuple[int, int, float]]:
+        if not len(self):
+            return []
+        to_centroids = _sq_distances(query[None, :], self.centroids, self.centroid_sq)[0]
+        probe = _top_k(to_centroids, min(nprobe, len(self.centroids)))
+        spans = [(self.list_offsets[p], self.list_offsets[p + 1]) for p in probe]
+        rows = np.concatenate([np.arange(a, b) for a, b in spans])
+        if not len(rows):
+            return []
+        codes = np.concatenate([self.codes[a:b] for a, b in spans])
+        code_sq = np.concatenate([self.code_sq[a:b] for a, b in spans])
+        # |q - x|^2 with x = offset + scale * c:  sum(scale^2 (u - c)^2),  u = (q - offset) / scale
+        u = (query - self.offset) / self.scale
+        weighted = (self.scale_sq * u).astype(np.float32)
+        d2 = float(u @ weighted) - 2.0 * (codes.astype(np.float32) @ weighted) + code_sq
+        np.maximum(d2, 0.0, out=d2)
+        return [(int(self.sources[rows[i]]), int(self.ids[rows[i]]), float(d2[i])) for i in _top_k(d2, k)]
+
+
+def _train_kmeans(vectors: np.ndarray, nlist: int, seed: int) -> np.ndarray:
+    """Lloyd's k-means on a sample of at most `_KMEANS_SAMPLE` vectors per partition."""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    nlist = min(nlist, n)
+    sample = vectors[rng.choice(n, size=min(n, nlist * _KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+    for _ in range(_KMEANS_ITERATIONS):
+        assign = np.argmin(_sq_distances(sample, centroids, np.einsum("ij,ij->i", centroids, centroids)), axis=1)
+        counts = np.bincount(assign, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Empty partitions restart from a random sample vector.
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(sample.shape[0], size=len(empty), replace=False)]
+    return centroids
+
+
+@dataclass
+class _LoadMark:
+    """How far one source table has been loaded into the index."""
+
+    max_id: int = 0  # highest id loaded
+    since: Optional[datetime] = None  # newest created_at loaded
+    recent: dict[int, datetime] = field(default_factory=dict)  # ids loaded with created_at >= since - overlap
+
+
+def _new_marks() -> dict[str, _LoadMark]:
+    return {source: _LoadMark() for source in _SOURCES}
+
+
+def _read_faces(db: Session, model, *conditions):
+    """Chunks of (id, created_at, embedding, faces) of the rows with an embedding."""
+    result = db.execute(
+        select(model.id, model.created_at, type_coerce(model.embedding, LargeBinary), model.faces)
+        .where(model.embedding.isnot(None), *conditions)
+        .order_by(model.id)
+        .execution_options(yield_per=_LOAD_CHUNK)
+    )
+    return result.partitions()
+
+
+def _load_faces(
+    db: Session, marks: dict[str, _LoadMark], overlap: timedelta, sweep: bool
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Faces of the rows committed since `marks` was last advanced (every row the first time),
+    and advance it. New rows are found by id. Ids are not committed in order, though (a
+    transaction that took id 10 can commit after the one that took id 11 was loaded), so
+    with `sweep` the rows created within `overlap` of the newest one loaded are listed too and
+    the ones not loaded yet are added: a row is only missed if it committed more than
+    `overlap` after its created_at.
+    """
+    vectors, sources, ids = [], [], []
+    for code, source in enumerate(_SOURCES):
+        model = _SOURCE_MODELS[source]
+        mark = marks[source]
+        started = datetime.utcnow()
+        chunks = _read_faces(db, model, model.id > mark.max_id)
+        if sweep and mark.since is not None:
+            window = db.execute(
+                select(model.id).where(
+                    model.embedding.isnot(None), model.id <= mark.max_id, model.created_at >= mark.since - overlap
+                )
+            ).scalars()
+            late = [row_id for row_id in window if row_id not in mark.recent]
+            if late:
+                logger.info("Face index: %s %s row(s) committed out of id order", len(late), source)
+            chunks = itertools.chain(
+                chunks,
+                *(_read_faces(db, model, model.id.in_(late[n : n + _ID_CHUNK])) for n in range(0, len(late), _ID_CHUNK)),
+            )
+        recent, newest, pruned = mark.recent, mark.since, len(mark.recent)
+        for chunk in chunks:
+            blobs = [faces if faces is not None else embedding for _, _, embedding, faces in chunk]
+            counts = np.fromiter((len(b) // EMBEDDING_BYTES for b in blobs), dtype=np.int64, count=len(blobs))
+            chunk_ids = np.fromiter((row[0] for row in chunk), dtype=np.int64, count=len(chunk))
+            vectors.append(decode_embeddings(blobs))
+            ids.append(np.repeat(chunk_ids, counts))
+            sources.append(np.full(int(counts.sum()), code, dtype=np.int8))
+            mark.max_id = max(mark.max_id, int(chunk_ids.max()))
+            stamps = [(row[0], row[1]) for row in chunk if row[1] is not None]
+            if not stamps:
+                continue
+            newest = max(newest or stamps[0][1], max(t for _, t in stamps))
+            cutoff = newest - overlap
+            recent.update((i, t) for i, t in stamps if t >= cutoff)
+            if len(recent) > 2 * pruned + _LOAD_CHUNK:  # prune now and then, not per chunk
+                recent = {i: t for i, t in recent.items() if t >= cutoff}
+                pruned = len(recent)
+        # Nothing with a created_at loaded yet: rows committed later are at least as new as this load.
+        mark.since = newest if newest is not None else started
+        cutoff = mark.since - overlap
+        mark.recent = {i: t for i, t in recent.items() if t >= cutoff}
+    if not ids:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32), np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int64)
+    return np.concatenate(vectors), np.concatenate(sources), np.concatenate(ids)
+
+
+class FaceIndexNotReady(RuntimeError):
+    """The background thread has not finished building the index yet."""
+
+
+class FaceIndex:
+    """
+    In-memory search index over every stored face embedding (test images + video frames).
+    Rows that kept several faces have each of them indexed; a search returns each row once.
+
+    - topped up before each search with the rows added since (ids above the last ones seen;
+      result rows are never updated); rows that committed out of id order are picked up by
+      a periodic sweep of the last `overlap` by created_at (see `_load_faces`)
+    - up to `exact_max` faces: exact brute force over one float32 matrix
+    - above: IVF (k-means partitions of int8-quantized vectors, `nprobe` partitions scanned
+      per query), rebuilt once the faces added since the last build reach `rebuild_ratio`
+      of it; `search_faces` re-ranks its candidates with the exact stored embeddings
+    - with `start`, a background thread builds (and retrains) the index and sweeps it every
+      `interval` seconds; searches meanwhile raise FaceIndexNotReady instead of waiting for
+      a full load plus k-means. Without it the first search builds the index.
+    - one index per process (each gunicorn worker builds its own)
+    """
+
+    def __init__(
+        self, exact_max: int = 200_000, nprobe: int = 32, rebuild_ratio: float = 0.2, overlap_seconds: float = 60.0
+    ):
+        self.exact_max = int(exact_max)
+        self.nprobe = int(nprobe)
+        self.rebuild_ratio = float(rebuild_ratio)
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._lock = threading.Lock()
+        self._partition: Optional[_ExactPartition | _IVFPartition] = None
+        self._marks = _new_marks()
+        self._built_size = 0
+        self._swept_at = 0.0
+        self._generation = 0  # bumped on reset: a background build started before is dropped
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.build_seconds: Optional[float] = None
+        self.searches = 0
+
+    def configure(
+        self, exact_max: int, nprobe: int, rebuild_ratio: float, overlap_seconds: Optional[float] = None
+    ) -> None:
+        with self._lock:
+            self.exact_max = int(exact_max)
+            self.nprobe = int(nprobe)
+            self.rebuild_ratio = float(rebuild_ratio)
+            if overlap_seconds is not None:
+                self.overlap = timedelta(seconds=overlap_seconds)
+            self._reset()
+
+    def invalidate(self) -> None:
+        """Drop the index; it is reloaded from the DB (by the next search, or the background thread)."""
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        # Caller holds the lock.
+        self._partition = None
+        self._marks = _new_marks()
+        self._built_size = 0
+        self._generation += 1
+
+    def start(self, session_factory: sessionmaker, interval: float) -> None:
+        """Build the index and keep it topped up on a background thread (after a fork: see gunicorn.conf.py)."""
+        if self._thread is not None:
+            return
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._maintain_loop,
+            args=(session_factory, float(interval), self._stopped),
+            name="face-index",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        """False while the background thread is building the index for the first time."""
+        return self._partition is not None or self._thread is None
+
+    @property
+    def mode(self) -> Optional[str]:
+        partition = self._partition
+        if partition is None:
+            return None
+        return INDEX_IVF if isinstance(partition, _IVFPartition) else INDEX_EXACT
+
+    def refresh(self, db: Session, sweep: Optional[bool] = None) -> None:
+        """
+        Load faces committed since the last refresh. Without a background thread, the first
+        call builds the index, due rebuilds happen here and it sweeps every _SWEEP_SECONDS;
+        with one, those are left to it (`sweep` forces or skips the sweep).
+        """
+        with self._lock:
+            partition = self._partition
+            background = self._thread is not None
+            if partition is None:
+                if not background:
+                    self._rebuild(db)
+                return
+            if sweep is None:
+                sweep = not background and time.monotonic() - self._swept_at >= _SWEEP_SECONDS
+            if sweep:
+                self._swept_at = time.monotonic()
+            vectors, sources, ids = _load_faces(db, self._marks, self.overlap, sweep)
+            if len(ids):
+                partition.add(vectors, sources, ids)
+            if not background and self._rebuild_due():
+                self._rebuild(db)
+
+    def _rebuild(self, db: Session) -> None:
+        # Caller holds the lock.
+        self._marks = _new_marks()
+        self._swept_at = time.monotonic()
+        self._build(*_load_faces(db, self._marks, self.overlap, sweep=False))
+
+    def _rebuild_due(self) -> bool:
+        # Caller holds the lock.
+        partition = self._partition
+        if isinstance(partition, _ExactPartition):
+            return len(partition) > self.exact_max
+        # Many faces since the partitions were trained: retrain them on everything.
+        return len(partition) - self._built_size > self._built_size * self.rebuild_ratio
+
+    def _maintain_loop(self, session_factory: sessionmaker, interval: float, stopped: threading.Event) -> None:
+        while not stopped.is_set():
+            try:
+                self._maintain(session_factory)
+            except Exception:  # noqa: BLE001 - keep the thread alive
+                logger.exception("Face index refresh error")
+            stopped.wait(interval)
+
+    def _maintain(self, session_factory: sessionmaker) -> None:
+        """Build or retrain the index outside the lock (searches go on), then top it up."""
+        with self._lock:
+            due = self._partition is None or self._rebuild_due()
+            generation = self._generation
+        with session_factory() as db:
+            if due:
+                marks = _new_marks()
+                vectors, sources, ids = _load_faces(db, marks, self.overlap, sweep=False)
+                partition = self._train(vectors, sources, ids)
+                with self._lock:
+                    if generation != self._generation:
+                        return
+                    self._partition, self._marks, self._built_size = partition, marks, len(ids)
+            self.refresh(db, sweep=True)  # also the rows committed during the build
+
+    def _build(self, vectors: np.ndarray, sources: np.ndarray, ids: np.ndarray) -> None:
+        # Caller holds the lock.
+        self._partition = self._train(vectors, sources, ids)
+        self._built_size = len(ids)
+
+    def _train(self, vectors: np.ndarray, sources: np.ndarray, ids: np.ndarray) -> _ExactPartition | _IVFPartition:
+        start = time.perf_counter()
+        if len(ids) > self.exact_max:
+            nlist = max(16, int(math.sqrt(len(ids))))
+            partition = _IVFPartition(vectors, sources, ids, nlist)
+        else:
+            partition = _ExactPartition(vectors, sources, ids)
+        self.build_seconds = time.perf_counter() - start
+        logger.info(
+            "Face index built: %s faces, %s, %.2fs, %.1f MB",
+            len(ids),
+            INDEX_IVF if isinstance(partition, _IVFPartition) else INDEX_EXACT,
+            self.build_seconds,
+            partition.nbytes / 1024 / 1024,
+        )
+        return partition
+
+    def search(self, query: np.ndarray, k: int) -> list[FaceHit]:
+        """
+        The `k` rows with the nearest stored faces to `query`, each at its nearest face
+        (call `refresh` first). Rows with several faces can fill several of the nearest
+        slots, so the search widens until it has `k` different rows or runs out of faces.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(EMBEDDING_DIM)
+        with self._lock:  # `refresh` may be adding to the partition
+            partition = self._partition
+            if partition is None or k <= 0:
+                return []
+            self.searches += 1
+            want = k
+            while True:
+                if isinstance(partition, _IVFPartition):
+                    found = partition.search(query, want, self.nprobe)
+                else:
+                    found = partition.search(query, want)
+                nearest: dict[tuple[int, int], float] = {}
+                for code, row_id, d2 in found:  # nearest first
+                    nearest.setdefault((code, row_id), d2)
+                if len(nearest) >= k or len(found) < want:
+                    break
+                want *= 2
+        return [FaceHit(_SOURCES[code], row_id, math.sqrt(d2)) for (code, row_id), d2 in list(nearest.items())[:k]]
+
+    def stats(self) -> dict:
+        partition = self._partition
+        return {
+            "mode": self.mode,
+            "faces": len(partition) if partition is not None else 0,
+            "bytes": partition.nbytes if partition is not None else 0,
+            "exact_max": self.exact_max,
+            "nprobe": self.nprobe,
+            "partitions": len(partition.centroids) if isinstance(partition, _IVFPartition) else None,
+            "ready": self.ready,
+            "build_seconds": round(self.build_seconds, 3) if self.build_seconds is not None else None,
+            "searches": self.searches,
+        }
+
+
+face_index = FaceIndex()
+
+
+def search_faces(db: Session, query: np.ndarray, k: int, rerank_factor: int = 4) -> list[FaceHit]:
+    """
+    The `k` stored rows whose faces are closest to `query`, nearest first, with exact distances.
+    The index is topped up first; for an IVF index `k * rerank_factor` candidates are
+    re-ranked with their stored float32 embeddings. Hits on rows with several faces get
+    the box of the face that is closest.
+    Raises FaceIndexNotReady while the background thread builds the index.
+    """
+    if not face_index.ready:
+        raise FaceIndexNotReady()
+    face_index.refresh(db)
+    approximate = face_index.mode == INDEX_IVF
+    hits = face_index.search(query, k * rerank_factor if approximate else k)
+    if not hits:
+        return hits
+    return _exact_hits(db, np.asarray(query, dtype=np.float32).reshape(EMBEDDING_DIM), hits, approximate)[:k]
+
+
+def _exact_hits(db: Session, query: np.ndarray, hits: list[FaceHit], approximate: bool) -> list[FaceHit]:
+    """
+    Hits with exact distances from the stored embeddings, re-sorted. Exact-index distances
+    of single-face rows are exact already, so only multi-face rows are read for those;
+    IVF candidates are all re-read (rows deleted since the index was built drop out).
+    """
+    resolved = {(h.source, h.row_id): h for h in hits} if not approximate else {}
+    for source in _SOURCES:
+        model = _SOURCE_MODELS[source]
+        ids = [h.row_id for h in hits if h.source == source]
+        if not ids:
+            continue
+        query_rows = select(
+            model.id, type_coerce(model.embedding, LargeBinary), model.faces, model.face_boxes
+        ).where(model.id.in_(ids))
+        if not approximate:
+            query_rows = query_rows.where(model.faces.isnot(None))
+        for row_id, embedding, faces, boxes in db.execute(query_rows):
+            if faces is None:
+                distance = float(np.linalg.norm(decode_embedding(embedding) - query))
+                resolved[(source, row_id)] = FaceHit(source, row_id, distance)
+                continue
+            stored = DetectedFaces.from_blobs(faces, boxes)
+            distances = np.linalg.norm(stored.embeddings - query, axis=1)
+            best = int(np.argmin(distances))
+            resolved[(source, row_id)] = FaceHit(source, row_id, float(distances[best]), stored.box(best))
+    return sorted(resolved.values(), key=lambda h: h.distance)
@@ -1,57 +1,711 @@
 from __future__ import annotations
 
-import json
 import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Sequence, Union
 
-import face_recognition
+import cv2
 import numpy as np
+from PIL import Image
+
+from embedding_codec import EMBEDDING_DIM, EMBEDDING_DTYPE, EmbeddingLike, decode_embeddings
+from services.metrics import call_with_stage_metrics, merge_stage_metrics
+from services.timing import STAGE_COMPARE, STAGE_DECODE, STAGE_DETECT, STAGE_ENCODE, stage
 
 logger = logging.getLogger(__name__)
 
 
+FaceBox = tuple[int, int, int, int]  # (top, right, bottom, left), as in face_recognition
+_BOX_DTYPE = np.dtype("<i4")
+
+
 @dataclass
 class MatchResult:
     match_status: str  # MATCH / NO_MATCH / NO_FACE / NO_TRUTH
     confidence_score: float
     face_distance: Optional[float] = None
+    truth_image_id: Optional[int] = None  # closest enrolled identity (gallery matching)
+    identity: Optional[str] = None
+    face_box: Optional[FaceBox] = None  # the face the result is about (multi-face matching)
+
+
+@dataclass
+class DetectedFaces:
+    """
+    The faces encoded from one image, largest first (at most DetectionProfile.max_faces):
+    embeddings and their boxes, row for row.
+    """
+
+    embeddings: np.ndarray  # (K, 128) float32
+    boxes: Optional[np.ndarray] = None  # (K, 4) int32 in image pixels; None from cache entries without boxes
+
+    def __len__(self) -> int:
+        return int(self.embeddings.shape[0])
 
+    def box(self, i: int) -> Optional[FaceBox]:
+        return tuple(int(v) for v in self.boxes[i]) if self.boxes is not None else None
 
-def extract_face_embedding(image_path: str) -> Optional[list[float]]:
+    def to_blobs(self) -> tuple[bytes, Optional[bytes]]:
+        """(embeddings, boxes) as float32 / int32 blobs, for the embedding cache and result rows."""
+        boxes = self.boxes.astype(_BOX_DTYPE).tobytes() if self.boxes is not None else None
+        return self.embeddings.astype(EMBEDDING_DTYPE).tobytes(), boxes
+
+    @classmethod
+    def from_blobs(cls, embeddings: bytes, boxes: Optional[bytes]) -> "DetectedFaces":
+        return cls(
+            embeddings=decode_embeddings([embeddings]),
+            boxes=np.frombuffer(boxes, dtype=_BOX_DTYPE).reshape(-1, 4) if boxes is not None else None,
+        )
+
+
+def stored_faces(faces: Optional[DetectedFaces]) -> dict:
+    """
+    `faces` / `face_boxes` column values of a result row: every encoded face when there
+    are several (the row's `embedding` is only the kept one), NULL with one face or none.
+    """
+    if faces is None or len(faces) < 2:
+        return {"faces": None, "face_boxes": None}
+    embeddings, boxes = faces.to_blobs()
+    return {"faces": embeddings, "face_boxes": boxes}
+
+
+@dataclass
+class TruthGallery:
     """
-    Returns the first face embedding found in the image, or None if no face.
+    All enrolled identities as one (N x 128) float32 matrix, for vectorized one-to-many matching.
+    Squared norms are precomputed so distances are a single matrix product:
+      |a - b|^2 = |a|^2 + |b|^2 - 2 a.b
     """
-    image = face_recognition.load_image_file(image_path)
-    encodings = face_recognition.face_encodings(image)
-    if not encodings:
+
+    truth_image_ids: np.ndarray  # (N,) int64
+    identities: list[str]
+    matrix: np.ndarray  # (N, 128) float32
+    sq_norms: np.ndarray  # (N,) float32
+
+    @classmethod
+    def build(cls, truth_image_ids: Sequence[int], identities: Sequence[str], matrix: np.ndarray) -> "TruthGallery":
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, 128)
+        return cls(
+            truth_image_ids=np.asarray(truth_image_ids, dtype=np.int64),
+            identities=list(identities),
+            matrix=matrix,
+            sq_norms=np.einsum("ij,ij->i", matrix, matrix),
+        )
+
+    def __len__(self) -> int:
+        return int(self.matrix.shape[0])
+
+    def distances(self, queries: np.ndarray) -> np.ndarray:
+        """(M x 128) queries -> (M x N) euclidean distances."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, 128)
+        q_sq = np.einsum("ij,ij->i", queries, queries)
+        d2 = q_sq[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2, out=d2)
+
+
+DETECT_ACCURATE = "accurate"  # decode and detect at full resolution
+DETECT_FAST = "fast"  # draft decode + downscaled detection + encoding on a face crop
+
+
+@dataclass(frozen=True)
+class DetectionProfile:
+    """
+    How faces are found and encoded. Picklable, so it travels with each pool task.
+    - accurate: the whole image at native resolution goes through detection and encoding
+    - fast: JPEGs are decoded at a reduced scale (PIL draft mode), detection runs on a copy
+      no larger than `detect_max_side`, and the first face is encoded from a crop around
+      its box, re-read at full resolution only when the face is smaller than `encode_face_side`
+    Every face is detected; the `max_faces` largest are encoded (1 = only the first face
+    dlib reports, as before multi-face matching).
+    """
+
+    mode: str = DETECT_ACCURATE
+    detect_max_side: int = 1280
+    encode_face_side: int = 150  # dlib aligns faces to a 150 px chip; more pixels add nothing
+    upsample: int = 1  # number_of_times_to_upsample for the detector
+    detector: str = "hog"  # "hog" or "cnn"
+    num_jitters: int = 1
+    model: str = "small"  # landmark model used for alignment: "small" (5 points) or "large" (68)
+    max_faces: int = 1
+
+    @classmethod
+    def from_config(cls, config) -> "DetectionProfile":
+        profile = cls(
+            mode=str(config["FACE_DETECTION_PROFILE"]),
+            detect_max_side=int(config["FACE_DETECT_MAX_SIDE"]),
+            encode_face_side=int(config["FACE_ENCODE_FACE_SIDE"]),
+            upsample=int(config["FACE_DETECT_UPSAMPLE"]),
+            detector=str(config["FACE_DETECT_MODEL"]),
+            num_jitters=int(config["FACE_ENCODING_JITTERS"]),
+            model=str(config["FACE_ENCODING_MODEL"]),
+            max_faces=int(config["FACE_MAX_FACES"]),
+        )
+        if profile.mode not in (DETECT_ACCURATE, DETECT_FAST):
+            raise ValueError(f"Unknown face detection profile: {profile.mode}")
+        if profile.max_faces < 1:
+            raise ValueError("FACE_MAX_FACES must be at least 1")
+        return profile
+
+    @property
+    def cache_variant(self) -> str:
+        """
+        Embedding cache variant: embeddings from different settings are not interchangeable.
+        The original settings map to "default" so entries cached before profiles existed stay valid.
+        """
+        variant = f"{self.mode}:{self.detector}:u{self.upsample}:j{self.num_jitters}:{self.model}"
+        if variant == "accurate:hog:u1:j1:small" and self.max_faces == 1:
+            return "default"
+        if self.mode == DETECT_FAST:
+            variant += f":d{self.detect_max_side}:e{self.encode_face_side}"
+        if self.max_faces != 1:
+            variant += f":f{self.max_faces}"
+        return variant
+
+
+_detection_profile = DetectionProfile()
+
+
+def configure_detection_profile(profile: DetectionProfile) -> None:
+    """Process-wide default profile (set from Config by the app and by video job workers)."""
+    global _detection_profile
+    _detection_profile = profile
+
+
+def get_detection_profile() -> DetectionProfile:
+    return _detection_profile
+
+
+class FaceModels:
+    """
+    Holds `face_recognition`, imported on first use: the import loads dlib and its model
+    files (seconds, and most of a worker's memory), so processes that never detect a face
+    (the dispatcher, thumbnail-only requests) do not pay for it.
+    `load()` is the explicit prewarm step; run it in a gunicorn master before fork and the
+    workers share the model memory copy-on-write.
+    """
+
+    def __init__(self):
+        self._module = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    @property
+    def api(self):
+        module = self._module
+        return module if module is not None else self.load()
+
+    def load(self):
+        with self._lock:
+            if self._module is None:
+                start = time.perf_counter()
+                import face_recognition
+
+                # Run the detector once so lazily initialised dlib state is set up now as well.
+                face_recognition.face_locations(np.zeros((8, 8, 3), dtype=np.uint8))
+                self._module = face_recognition
+                self.load_seconds = time.perf_counter() - start
+                logger.info("Face models loaded in %.2fs", self.load_seconds)
+            return self._module
+
+
+face_models = FaceModels()
+
+
+def prewarm() -> None:
+    """Load the face models now instead of on the first request."""
+    face_models.load()
+
+
+def _load_rgb(image_path: str, min_side: Optional[int] = None) -> np.ndarray:
+    """
+    Decode to RGB uint8. With `min_side`, JPEGs are decoded at 1/2, 1/4 or 1/8 scale
+    (whichever keeps the long side >= min_side); the DCT scaling makes this much cheaper
+    than a full decode followed by a resize.
+    """
+    with stage(STAGE_DECODE), Image.open(image_path) as img:
+        if min_side and img.format == "JPEG":
+            width, height = img.size
+            scale = min_side / float(max(width, height))
+            if scale < 1.0:
+                img.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+        return np.array(img.convert("RGB"))
+
+
+def _detect(image: np.ndarray, profile: DetectionProfile) -> list:
+    with stage(STAGE_DETECT):
+        return face_models.api.face_locations(
+            image, number_of_times_to_upsample=profile.upsample, model=profile.detector
+        )
+
+
+def _select_faces(locations: list, max_faces: int) -> list:
+    """The `max_faces` largest detections, largest first; with 1, the first one dlib reports."""
+    if max_faces == 1:
+        return locations[:1]
+    return sorted(locations, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]), reverse=True)[:max_faces]
+
+
+def _encode_faces(images: list[np.ndarray], boxes: list[list], profile: DetectionProfile) -> np.ndarray:
+    """Embeddings of the given faces of each image, as one (faces x 128) matrix in input order."""
+    with stage(STAGE_ENCODE):
+        rows = [
+            np.asarray(encoding, dtype=np.float32)
+            for image, locations in zip(images, boxes)
+            for encoding in face_models.api.face_encodings(
+                image, known_face_locations=locations, num_jitters=profile.num_jitters, model=profile.model
+            )
+        ]
+    return np.stack(rows) if rows else np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+
+def _resize_max_side(image: np.ndarray, max_side: int) -> tuple[np.ndarray, float]:
+    """Downscale so the long side is at most `max_side`; returns (image, scale applied)."""
+    height, width = image.shape[:2]
+    scale = max_side / float(max(height, width))
+    if max_side <= 0 or scale >= 1.0:
+        return image, 1.0
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def _face_crop(
+    image: np.ndarray, box: tuple[float, float, float, float], profile: DetectionProfile
+) -> tuple[np.ndarray, FaceBox]:
+    """
+    (crop, box in the crop) for one face given its (top, right, bottom, left) box in `image`
+    coordinates: a margin-padded crop, downscaled so the face is about `encode_face_side` px.
+    """
+    top, right, bottom, left = box
+    height, width = image.shape[:2]
+    side = max(bottom - top, right - left)
+    margin = side * 0.5
+    y0, y1 = max(0, int(top - margin)), min(height, int(math.ceil(bottom + margin)))
+    x0, x1 = max(0, int(left - margin)), min(width, int(math.ceil(right + margin)))
+    crop = image[y0:y1, x0:x1]
+    scale = 1.0
+    if side > profile.encode_face_side:
+        crop, scale = _resize_max_side(crop, int(round(max(crop.shape[:2]) * profile.encode_face_side / side)))
+    crop_box = (
+        int(round((top - y0) * scale)),
+        int(round((right - x0) * scale)),
+        int(round((bottom - y0) * scale)),
+        int(round((left - x0) * scale)),
+    )
+    return np.ascontiguousarray(crop), crop_box
+
+
+def _find_faces(
+    image: np.ndarray,
+    profile: DetectionProfile,
+    image_path: Optional[str] = None,
+) -> Optional[DetectedFaces]:
+    """
+    Detect every face, encode the `max_faces` largest, or None without a face. Boxes are in `image` coordinates.
+    """
+    if profile.mode != DETECT_FAST:
+        locations = _select_faces(_detect(image, profile), profile.max_faces)
+        if not locations:
+            return None
+        return DetectedFaces(
+            embeddings=_encode_faces([image], [locations], profile),
+            boxes=np.asarray(locations, dtype=np.int32),
+        )
+
+    small, scale = _resize_max_side(image, profile.detect_max_side)
+    locations = _select_faces(_detect(np.ascontiguousarray(small), profile), profile.max_faces)
+    if not locations:
         return None
-    return encodings[0].tolist()
+    boxes = [tuple(v / scale for v in location) for location in locations]
+    reported = np.rint(np.asarray(boxes)).astype(np.int32)
+
+    if image_path is not None and min(b[2] - b[0] for b in boxes) < profile.encode_face_side:
+        # A face is small in the draft-decoded image: re-read at full resolution for encoding.
+        full = _load_rgb(image_path)
+        if full.shape[0] > image.shape[0]:
+            factor = full.shape[0] / float(image.shape[0])
+            boxes = [tuple(v * factor for v in box) for box in boxes]
+            image = full
+    crops = [_face_crop(image, box, profile) for box in boxes]
+    return DetectedFaces(
+        embeddings=_encode_faces([crop for crop, _ in crops], [[crop_box] for _, crop_box in crops], profile),
+        boxes=reported,
+    )
+
+
+def extract_faces(image_path: str, profile: Optional[DetectionProfile] = None) -> Optional[DetectedFaces]:
+    """
+    The faces of an image file (the `max_faces` largest, largest first), or None if no face.
+    Boxes are in the file's full-resolution pixels.
+    """
+    profile = profile or _detection_profile
+    if profile.mode != DETECT_FAST:
+        return _find_faces(_load_rgb(image_path), profile)
+    image = _load_rgb(image_path, min_side=profile.detect_max_side)
+    faces = _find_faces(image, profile, image_path=image_path)
+    if faces is not None:
+        with Image.open(image_path) as img:
+            factor = img.size[1] / float(image.shape[0])  # > 1 after a draft decode
+        if factor != 1.0:
+            faces.boxes = np.rint(faces.boxes * factor).astype(np.int32)
+    return faces
+
+
+def extract_face_embedding(image_path: str, profile: Optional[DetectionProfile] = None) -> Optional[list[float]]:
+    """
+    Returns the embedding of the largest face found in the image (the first one dlib
+    reports with max_faces=1), or None if no face.
+    """
+    faces = extract_faces(image_path, profile)
+    return faces.embeddings[0].tolist() if faces is not None else None
+
+
+def extract_faces_from_array(
+    image: np.ndarray,
+    profile: Optional[DetectionProfile] = None,
+) -> Optional[DetectedFaces]:
+    """
+    Same as `extract_faces`, for an already decoded RGB uint8 image (H x W x 3), e.g. a
+    video frame. A C-contiguous array is passed to dlib as-is (no copy); anything else is
+    made contiguous once.
+    """
+    if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3:
+        raise ValueError("Expected an RGB uint8 image of shape (H, W, 3)")
+    return _find_faces(np.ascontiguousarray(image), profile or _detection_profile)
+
 
+def extract_face_embedding_from_array(
+    image: np.ndarray,
+    profile: Optional[DetectionProfile] = None,
+) -> Optional[list[float]]:
+    """Same as `extract_face_embedding`, for an already decoded RGB uint8 image (H x W x 3)."""
+    faces = extract_faces_from_array(image, profile)
+    return faces.embeddings[0].tolist() if faces is not None else None
 
-def embedding_to_json(embedding: list[float]) -> str:
-    return json.dumps(embedding)
+
+ImageSource = Union[str, np.ndarray]  # file path, or decoded RGB frame
+
+
+def _extract_faces_safe(
+    source: ImageSource,
+    profile: Optional[DetectionProfile] = None,
+) -> tuple[Optional[DetectedFaces], Optional[str]]:
+    # Runs inside pool workers: never raise, so one bad file cannot fail the whole batch.
+    try:
+        if isinstance(source, np.ndarray):
+            return extract_faces_from_array(source, profile), None
+        return extract_faces(source, profile), None
+    except Exception as e:  # noqa: BLE001
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _warm_worker() -> None:
+    # Pool initializer: spawned workers start without the models; load them before the first task.
+    face_models.load()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process-wide pool, created once and reused across requests so workers stay warm.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def extract_faces_batch(
+    image_paths: Sequence[ImageSource],
+    workers: Optional[int] = None,
+    profile: Optional[DetectionProfile] = None,
+) -> list[Optional[DetectedFaces]]:
+    """
+    Extract the faces of many images on a pool of worker processes.
+    - accepts file paths and/or decoded RGB arrays (arrays are pickled to workers, so
+      in-memory video frames are best encoded with workers=1)
+    - results keep the input order
+    - a file that fails to decode/encode yields None (logged) instead of failing the batch
+    - workers <= 1 (or a single path) runs in-process, without IPC
+    - the caller's detection profile is sent with every task (workers do not read Config)
+    """
+    paths = list(image_paths)
+    profile = profile or _detection_profile
+    workers = (os.cpu_count() or 1) if workers is None else int(workers)
+    workers = max(1, min(workers, len(paths) or 1))
+
+    if workers == 1:
+        outcomes = [_extract_faces_safe(p, profile) for p in paths]
+    else:
+        try:
+            pool = _get_pool(workers)
+            futures = [pool.submit(call_with_stage_metrics, _extract_faces_safe, p, profile) for p in paths]
+            outcomes = []
+            for future in futures:
+                outcome, stages = future.result()
+                merge_stage_metrics(stages)  # stage timings of the worker process
+                outcomes.append(outcome)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory inside dlib); drop the pool and finish serially.
+            logger.exception("Face worker pool broke; falling back to in-process extraction")
+            _reset_pool()
+            outcomes = [_extract_faces_safe(p, profile) for p in paths]
+
+    results: list[Optional[DetectedFaces]] = []
+    for path, (faces, error) in zip(paths, outcomes):
+        if error is not None:
+            label = path if isinstance(path, str) else f"<array {path.shape}>"
+            logger.warning("Face extraction failed for %s: %s", label, error)
+        results.append(faces)
+    return results
+
+
+def _confidence(distance: np.ndarray, threshold: float) -> np.ndarray:
+    # confidence = max(0, 1 - distance/threshold) * 100, capped at 100
+    return np.clip((1.0 - distance / threshold) * 100.0, 0.0, 100.0)
+
+
+def match_embeddings(
+    gallery: Optional[TruthGallery],
+    test_embeddings: Sequence[Optional[EmbeddingLike]],
+    threshold: float,
+) -> list[MatchResult]:
+    """
+    Score many test faces against every enrolled identity with one (M x N) distance matrix.
+    Each result reports the closest identity; None entries become NO_FACE.
+    """
+    with stage(STAGE_COMPARE):
+        return _match_embeddings(gallery, test_embeddings, threshold)
+
+
+def nearest_identities(
+    gallery: TruthGallery,
+    queries: np.ndarray,
+    threshold: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Closest identity for each row of an (M x 128) matrix, all as arrays (no per-face objects):
+    (gallery row index, distance, confidence 0-100 unrounded). A face is a MATCH when its
+    distance <= threshold.
+    """
+    dist = gallery.distances(queries)
+    best = np.argmin(dist, axis=1)
+    best_dist = dist[np.arange(dist.shape[0]), best]
+    return best, best_dist, _confidence(best_dist, threshold)
+
+
+# Distance matrix cells computed at once (faces x identities): bounds memory for big batches/galleries.
+_DISTANCE_BLOCK_CELLS = 4_000_000
+
+
+@dataclass
+class EmbeddingScores:
+    """MatchResult fields for a batch of faces, as one array per field (no per-face objects)."""
+
+    match_status: np.ndarray  # object (str): MATCH / NO_MATCH, NO_TRUTH without a gallery
+    confidence_score: np.ndarray  # float64, rounded like MatchResult
+    face_distance: np.ndarray  # float64, NaN without a gallery
+    truth_image_id: np.ndarray  # int64, -1 without a gallery
+    gallery_row: np.ndarray  # int64 index into gallery.identities, -1 without a gallery
+
+    def __len__(self) -> int:
+        return len(self.match_status)
+
+
+def score_embedding_matrix(
+    gallery: Optional[TruthGallery],
+    queries: np.ndarray,
+    threshold: float,
+) -> EmbeddingScores:
+    """
+    Score an (M x 128) matrix of faces against every enrolled identity, in blocks of rows
+    so the distance matrix stays bounded (tens of thousands of faces per call are fine).
+    """
+    n = queries.shape[0]
+    if gallery is None or len(gallery) == 0:
+        return EmbeddingScores(
+            match_status=np.full(n, "NO_TRUTH", dtype=object),
+            confidence_score=np.zeros(n),
+            face_distance=np.full(n, np.nan),
+            truth_image_id=np.full(n, -1, dtype=np.int64),
+            gallery_row=np.full(n, -1, dtype=np.int64),
+        )
+    status = np.empty(n, dtype=object)
+    confidence = np.empty(n)
+    distance = np.empty(n)
+    rows = np.empty(n, dtype=np.int64)
+    block = max(256, _DISTANCE_BLOCK_CELLS // len(gallery))
+    with stage(STAGE_COMPARE):
+        for start in range(0, n, block):
+            best, dist, conf = nearest_identities(gallery, queries[start : start + block], threshold)
+            end = start + len(best)
+            status[start:end] = np.where(dist <= threshold, "MATCH", "NO_MATCH")
+            confidence[start:end] = np.round(conf, 2)
+            distance[start:end] = dist
+            rows[start:end] = best
+    return EmbeddingScores(
+        match_status=status,
+        confidence_score=confidence,
+        face_distance=distance,
+        truth_image_id=gallery.truth_image_ids[rows],
+        gallery_row=rows,
+    )
+
+
+def _match_embeddings(
+    gallery: Optional[TruthGallery],
+    test_embeddings: Sequence[Optional[EmbeddingLike]],
+    threshold: float,
+) -> list[MatchResult]:
+    if gallery is None or len(gallery) == 0:
+        return [MatchResult(match_status="NO_TRUTH", confidence_score=0.0) for _ in test_embeddings]
+
+    results = [MatchResult(match_status="NO_FACE", confidence_score=0.0) for _ in test_embeddings]
+    present = [i for i, e in enumerate(test_embeddings) if e is not None]
+    if not present:
+        return results
+
+    queries = np.stack([np.asarray(test_embeddings[i], dtype=np.float32) for i in present])
+    best, best_dist, confidence = nearest_identities(gallery, queries, threshold)
+
+    for row, i in enumerate(present):
+        g = int(best[row])
+        d = float(best_dist[row])
+        results[i] = MatchResult(
+            match_status="MATCH" if d <= threshold else "NO_MATCH",
+            confidence_score=round(float(confidence[row]), 2),
+            face_distance=round(d, 4),
+            truth_image_id=int(gallery.truth_image_ids[g]),
+            identity=gallery.identities[g],
+        )
+    return results
+
+
+def closest_in_groups(distances: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Faces stored back to back, `counts[g]` of them per image: the position of each image's
+    face with the smallest distance (the first face on ties and NaN distances).
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    # Rows grouped by image, closest face first: each image's pick sits at its group start.
+    order = np.lexsort((distances, np.repeat(np.arange(len(counts)), counts)))
+    return order[starts]
+
+
+def match_faces(
+    gallery: Optional[TruthGallery],
+    faces: Sequence[Optional[DetectedFaces]],
+    threshold: float,
+) -> tuple[list[MatchResult], list[Optional[np.ndarray]]]:
+    """
+    Score every face of every image against every enrolled identity with one (all faces x N)
+    distance matrix and keep, per image, the face closest to any identity: in a group photo
+    the enrolled person is found even when dlib lists someone else first. Without a gallery
+    the largest face is kept.
+    Returns per image the result (with the kept face's box) and the kept face's embedding;
+    images without a face get NO_FACE (NO_TRUTH without a gallery) and None.
+    """
+    with stage(STAGE_COMPARE):
+        return _match_faces(gallery, faces, threshold)
+
+
+def _match_faces(
+    gallery: Optional[TruthGallery],
+    faces: Sequence[Optional[DetectedFaces]],
+    threshold: float,
+) -> tuple[list[MatchResult], list[Optional[np.ndarray]]]:
+    present = [i for i, f in enumerate(faces) if f is not None and len(f)]
+    kept: list[Optional[np.ndarray]] = [None] * len(faces)
+    if gallery is None or len(gallery) == 0:
+        results = [MatchResult(match_status="NO_TRUTH", confidence_score=0.0) for _ in faces]
+        for i in present:
+            kept[i] = faces[i].embeddings[0]
+            results[i].face_box = faces[i].box(0)
+        return results, kept
+
+    results = [MatchResult(match_status="NO_FACE", confidence_score=0.0) for _ in faces]
+    if not present:
+        return results, kept
+
+    counts = np.array([len(faces[i]) for i in present])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    best, best_dist, confidence = nearest_identities(
+        gallery, np.concatenate([faces[i].embeddings for i in present]), threshold
+    )
+    picks = closest_in_groups(best_dist, counts)
+    for group, i in enumerate(present):
+        row = int(picks[group])
+        face = row - int(starts[group])
+        g = int(best[row])
+        d = float(best_dist[row])
+        kept[i] = faces[i].embeddings[face]
+        results[i] = MatchResult(
+            match_status="MATCH" if d <= threshold else "NO_MATCH",
+            confidence_score=round(float(confidence[row]), 2),
+            face_distance=round(d, 4),
+            truth_image_id=int(gallery.truth_image_ids[g]),
+            identity=gallery.identities[g],
+            face_box=faces[i].box(face),
+        )
+    return results, kept
 
 
 def compare_embeddings(
-    truth_embedding: Optional[list[float]],
-    test_embedding: Optional[list[float]],
+    truth_embedding: Optional[Union[EmbeddingLike, TruthGallery]],
+    test_embedding: Optional[EmbeddingLike],
     threshold: float,
 ) -> MatchResult:
     """
     Uses face distance with a threshold of 0.6.
     Converts distance to confidence percentage:
       confidence = max(0, 1 - distance/threshold) * 100
+    `truth_embedding` may be a single embedding or a TruthGallery of enrolled identities
+    (the closest identity is reported).
     """
+    if isinstance(truth_embedding, TruthGallery):
+        return match_embeddings(truth_embedding, [test_embedding], threshold)[0]
     if truth_embedding is None:
         return MatchResult(match_status="NO_TRUTH", confidence_score=0.0)
     if test_embedding is None:
         return MatchResult(match_status="NO_FACE", confidence_score=0.0)
 
-    # face_recognition's face_distance subtracts arrays; ensure numpy arrays here.
+    # Same as face_recognition.face_distance (euclidean), without needing the models loaded.
     truth_np = np.asarray(truth_embedding, dtype=np.float64)
     test_np = np.asarray(test_embedding, dtype=np.float64)
-    distance = face_recognition.face_distance([truth_np], test_np)[0]
+    with stage(STAGE_COMPARE):
+        distance = float(np.linalg.norm(truth_np - test_np))
     is_match = distance <= threshold
     confidence = max(0.0, (1.0 - (float(distance) / threshold)) * 100.0)
     if confidence > 100.0:
@@ -62,5 +716,3 @@ def compare_embeddings(
         confidence_score=round(confidence, 2),
         face_distance=round(float(distance), 4),
     )
-
-
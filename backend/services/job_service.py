@@ -0,0 +1,878 @@
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from database import EngineOptions, bulk_insert, create_db_engine
+from models import TestVideo, VideoJob, VideoMatch, VideoSegment
+from services.embedding_cache import embedding_cache
+from services.face_service import (
+    DetectedFaces,
+    DetectionProfile,
+    MatchResult,
+    TruthGallery,
+    configure_detection_profile,
+    extract_faces_batch,
+    extract_faces_from_array,
+    match_faces,
+    stored_faces,
+)
+from services.metrics import call_with_stage_metrics, merge_stage_metrics
+from services.segments import Segment, SegmentBuilder
+from services.timing import STAGE_DB_WRITE, stage
+from services.truth_service import get_truth_gallery, truth_gallery_cache
+from services.video_service import (
+    ACTION_ENCODE,
+    SAMPLE_ADAPTIVE,
+    AdaptivePolicy,
+    AdaptiveSampler,
+    ExtractedFrame,
+    SamplingPolicy,
+    SearchPolicy,
+    TimeRange,
+    estimate_sample_count,
+    iter_frames,
+    persist_frame,
+    search_appearances,
+    split_time_ranges,
+)
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "QUEUED"
+JOB_RUNNING = "RUNNING"
+JOB_DONE = "DONE"
+JOB_FAILED = "FAILED"
+JOB_CANCELLED = "CANCELLED"
+
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING) + FINISHED_STATUSES
+
+JOB_MODE_FULL = "full"  # every sampled frame, to the end of the video
+JOB_MODE_SEARCH = "search"  # coarse-to-fine search for appearances, with early exit
+JOB_MODES = (JOB_MODE_FULL, JOB_MODE_SEARCH)
+
+
+def job_settings_from_config(config) -> dict:
+    """
+    Plain, picklable settings handed to worker processes (they do not have a Flask app).
+    """
+    return {
+        "database_url": config["DATABASE_URL"],
+        "db_engine": EngineOptions.from_config(config),
+        "upload_folder": config["UPLOAD_FOLDER"],
+        "threshold": float(config["FACE_DISTANCE_THRESHOLD"]),
+        "face_workers": int(config["VIDEO_FACE_WORKERS"]),
+        "shard_workers": int(config["VIDEO_SHARD_WORKERS"]),
+        "shard_min_seconds": float(config["VIDEO_SHARD_MIN_SECONDS"]),
+        "shard_max_seconds": float(config["VIDEO_SHARD_MAX_SECONDS"]),
+        "frame_batch_size": int(config["VIDEO_FRAME_BATCH_SIZE"]),
+        "result_flush_rows": int(config["VIDEO_RESULT_FLUSH_ROWS"]),
+        "result_flush_seconds": float(config["VIDEO_RESULT_FLUSH_SECONDS"]),
+        "sampling": SamplingPolicy.from_config(config),
+        "adaptive": AdaptivePolicy.from_config(config),
+        "candidate_margin": float(config["VIDEO_CANDIDATE_MARGIN"]),
+        "search": SearchPolicy.from_config(config),
+        "frame_persist_policy": str(config["FRAME_PERSIST_POLICY"]),
+        "frame_thumbnail_max_side": int(config["FRAME_THUMBNAIL_MAX_SIDE"]),
+        "truth_cache_check_interval": float(config["TRUTH_CACHE_CHECK_INTERVAL"]),
+        "embedding_cache_enabled": bool(config["EMBEDDING_CACHE_ENABLED"]),
+        "embedding_cache_max_entries": int(config["EMBEDDING_CACHE_MAX_ENTRIES"]),
+        "embedding_cache_evict_interval": float(config["EMBEDDING_CACHE_EVICT_INTERVAL"]),
+        "detection_profile": DetectionProfile.from_config(config),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Worker side (runs inside a pool process)
+# ---------------------------------------------------------------------------
+
+_worker_sessions: dict[str, sessionmaker] = {}
+
+
+def _worker_session(db_url: str, options: Optional[EngineOptions] = None) -> Session:
+    # One engine per worker process, reused across jobs.
+    if db_url not in _worker_sessions:
+        engine = create_db_engine(db_url, options)
+        _worker_sessions[db_url] = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    return _worker_sessions[db_url]()
+
+
+def job_status_counts(db: Session) -> dict[str, int]:
+    """Number of video jobs per status (every status present, 0 if none)."""
+    counts = dict.fromkeys(JOB_STATUSES, 0)
+    for status, n in db.execute(select(VideoJob.status, func.count()).group_by(VideoJob.status)):
+        counts[status] = n
+    return counts
+
+
+def run_video_job(job_id: int, settings: dict) -> str:
+    """
+    Process one queued video job:
+    - decode sampled frames in memory (config sampling policy, 1 frame/sec by default)
+    - match each frame vs all enrolled truth identities (frames are encoded in small batches)
+    - write frames to uploads/frames/video_<id>/ only as FRAME_PERSIST_POLICY says
+    - store per-frame results, committing progress after each batch
+    - a long video is split into time ranges decoded and encoded by several processes
+      (see `_run_sharded`); results are still stored in time order
+    - search jobs only look at the frames needed to locate appearances (see `_run_search`)
+    Returns the final job status.
+    """
+    uploads_dir = Path(settings["upload_folder"])
+    truth_gallery_cache.configure(settings["truth_cache_check_interval"])
+    profile = settings["detection_profile"]
+    configure_detection_profile(profile)
+    embedding_cache.configure(
+        settings["embedding_cache_enabled"],
+        settings["embedding_cache_max_entries"],
+        variant=profile.cache_variant,
+        evict_interval=settings["embedding_cache_evict_interval"],
+    )
+    batch_size = max(1, int(settings["frame_batch_size"]))
+
+    with _worker_session(settings["database_url"], settings["db_engine"]) as db:
+        job = db.get(VideoJob, job_id)
+        if job is None:
+            logger.warning("Video job %s disappeared before it started", job_id)
+            return JOB_FAILED
+
+        try:
+            video = db.get(TestVideo, job.video_id)
+            abs_video_path = uploads_dir / video.video_path
+            out_frames_dir = uploads_dir / "frames" / f"video_{video.id}"
+
+            ctx = _JobContext(
+                job=job,
+                video_id=video.id,
+                out_frames_dir=out_frames_dir,
+                gallery=get_truth_gallery(db),
+                settings=settings,
+                content_hash=video.content_hash,
+                # Frames of identical video bytes seen before skip detection + encoding.
+                frame_cache=embedding_cache.lookup_video(db, video.content_hash) if video.content_hash else {},
+            )
+
+            policy = settings["sampling"]
+            # A search looks at an unknown number of frames: progress is reported without a total.
+            is_search = job.mode == JOB_MODE_SEARCH
+            # Search frames arrive out of time order; its segments come from the located ranges.
+            ctx.track_segments = not is_search
+            # A re-run (or a re-queued stale job) starts from the first frame: drop what an
+            # earlier run stored, so its frames are not stored twice.
+            db.execute(delete(VideoSegment).where(VideoSegment.video_id == video.id))
+            db.execute(delete(VideoMatch).where(VideoMatch.video_id == video.id))
+            job.frames_total = 0 if is_search else estimate_sample_count(str(abs_video_path), policy)
+            job.frames_done = 0
+            job.updated_at = datetime.utcnow()
+            db.commit()
+
+            if is_search:
+                search = settings["search"]
+                if job.max_matches is not None:
+                    search = replace(search, max_matches=job.max_matches)
+                if not _run_search(db, ctx, str(abs_video_path), search, batch_size):
+                    return JOB_CANCELLED
+            elif policy.mode == SAMPLE_ADAPTIVE:
+                if not _run_adaptive(db, ctx, str(abs_video_path), policy, batch_size):
+                    return JOB_CANCELLED
+            else:
+                ranges = _time_ranges(str(abs_video_path), policy, settings)
+                if len(ranges) > 1:
+                    if not _run_sharded(db, ctx, str(abs_video_path), policy, ranges):
+                        return JOB_CANCELLED
+                else:
+                    batch: list[ExtractedFrame] = []
+                    for fr in iter_frames(str(abs_video_path), policy):
+                        batch.append(fr)
+                        if len(batch) < batch_size:
+                            continue
+                        if not _process_frame_batch(db, ctx, batch):
+                            return JOB_CANCELLED
+                        batch = []
+                    if batch and not _process_frame_batch(db, ctx, batch):
+                        return JOB_CANCELLED
+
+            _flush_results(db, ctx)
+            embedding_cache.evict(db)
+            _finish(db, job, JOB_DONE)
+            return JOB_DONE
+        except Exception as e:  # noqa: BLE001 - any failure must end up on the job row
+            logger.exception("Video job %s failed", job_id)
+            db.rollback()
+            _finish(db, job, JOB_FAILED, error=str(e))
+            return JOB_FAILED
+
+
+@dataclass
+class _JobContext:
+    job: VideoJob
+    video_id: int
+    out_frames_dir: Path
+    gallery: Optional[TruthGallery]
+    settings: dict
+    content_hash: Optional[str] = None
+    frame_cache: dict[int, Optional[DetectedFaces]] = field(default_factory=dict)  # frame_ms -> faces
+    # Results waiting for the next bulk insert (see _flush_results).
+    pending_rows: list[dict] = field(default_factory=list)
+    pending_cache_entries: dict = field(default_factory=dict)
+    pending_frames_done: int = 0
+    last_flush: float = field(default_factory=time.monotonic)
+    # Timeline segments, extended frame by frame and stored with each flush.
+    segments: SegmentBuilder = field(default_factory=SegmentBuilder)
+    track_segments: bool = True
+
+
+def _frame_faces(ctx: _JobContext, frames: list[ExtractedFrame]) -> tuple[list[Optional[DetectedFaces]], dict]:
+    """
+    Faces of a batch of frames: cache hits first, the rest detected + encoded.
+    Returns (faces in frame order, new cache entries to store).
+    """
+    keys = [int(round(fr.timestamp_ms)) for fr in frames]
+    missing = [i for i, key in enumerate(keys) if key not in ctx.frame_cache]
+    embedding_cache.count(hits=len(frames) - len(missing), misses=len(missing))
+
+    computed = extract_faces_batch(
+        [frames[i].image for i in missing],
+        workers=ctx.settings["face_workers"],
+    )
+    faces = [ctx.frame_cache.get(key) for key in keys]
+    new_entries = {}
+    for i, frame_faces in zip(missing, computed):
+        faces[i] = frame_faces
+        if ctx.content_hash:
+            new_entries[(ctx.content_hash, keys[i])] = frame_faces
+    return faces, new_entries
+
+
+def _process_frame_batch(db: Session, ctx: _JobContext, frames: list[ExtractedFrame]) -> bool:
+    """
+    Encode + match one batch of frames and commit it with the job progress.
+    Returns False if the job was cancelled (it is then already marked CANCELLED).
+    """
+    if _cancel_requested(db, ctx):
+        return False
+    faces, new_cache_entries = _frame_faces(ctx, frames)
+    matches, embeddings = match_faces(ctx.gallery, faces, threshold=float(ctx.settings["threshold"]))
+    return _record_frames(db, ctx, frames, matches, embeddings, faces, new_cache_entries)
+
+
+def _run_adaptive(db: Session, ctx: _JobContext, video_path: str, policy: SamplingPolicy, batch_size: int) -> bool:
+    """
+    Adaptive mode: frames come from an AdaptiveSampler, and only the frames it asks for are
+    encoded (one at a time, since each outcome steers the next decision); the others reuse
+    the last encoded result. Results are still committed in batches.
+    Returns False if the job was cancelled.
+    """
+    settings = ctx.settings
+    threshold = float(settings["threshold"])
+    candidate_distance = threshold + float(settings["candidate_margin"])
+    sampler = AdaptiveSampler(video_path, policy, settings["adaptive"])
+
+    current = MatchResult(match_status="NO_FACE", confidence_score=0.0)
+    frames: list[ExtractedFrame] = []
+    matches: list[MatchResult] = []
+    embeddings: list = []
+    frame_faces: list[Optional[DetectedFaces]] = []
+    new_cache_entries: dict = {}
+    for step in sampler:
+        # Frames that reuse the last result add nothing to the face index.
+        embedding, faces = None, None
+        if step.action == ACTION_ENCODE:
+            faces, entries = _encode_keyframe(ctx, step.frame)
+            new_cache_entries.update(entries)
+            (current,), (embedding,) = match_faces(ctx.gallery, [faces], threshold=threshold)
+            # The sampler tracks the face the result is about (the best match in a crowd).
+            sampler.report(
+                current.face_box,
+                candidate=current.face_distance is not None and current.face_distance <= candidate_distance,
+                confirmed=current.match_status == "MATCH",
+            )
+        frames.append(step.frame)
+        matches.append(current)
+        embeddings.append(embedding)
+        frame_faces.append(faces)
+        if len(frames) < batch_size:
+            continue
+        if not _record_frames(db, ctx, frames, matches, embeddings, frame_faces, new_cache_entries):
+            return False
+        frames, matches, embeddings, frame_faces, new_cache_entries = [], [], [], [], {}
+    if frames and not _record_frames(db, ctx, frames, matches, embeddings, frame_faces, new_cache_entries):
+        return False
+
+    stats = sampler.stats()
+    logger.info(
+        "Video %s: encoded %s of %s sampled frames (adaptive)",
+        ctx.video_id,
+        stats["encoded"],
+        stats["encoded"] + stats["reused"],
+    )
+    return True
+
+
+def _time_ranges(video_path: str, policy: SamplingPolicy, settings: dict) -> list[TimeRange]:
+    if int(settings["shard_workers"]) <= 1:
+        return []
+    return split_time_ranges(
+        video_path,
+        policy,
+        int(settings["shard_workers"]),
+        min_range_sec=float(settings["shard_min_seconds"]),
+        max_range_sec=float(settings["shard_max_seconds"]),
+    )
+
+
+_shard_pool: Optional[ProcessPoolExecutor] = None
+_shard_pool_workers = 0
+
+
+def _get_shard_pool(workers: int) -> ProcessPoolExecutor:
+    # Created once per job worker process and reused by its jobs, so shard processes stay warm.
+    global _shard_pool, _shard_pool_workers
+    if _shard_pool is None or _shard_pool_workers != workers:
+        if _shard_pool is not None:
+            _shard_pool.shutdown(wait=False)
+        _shard_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _shard_pool_workers = workers
+    return _shard_pool
+
+
+def _reset_shard_pool() -> None:
+    global _shard_pool
+    if _shard_pool is not None:
+        _shard_pool.shutdown(wait=False, cancel_futures=True)
+    _shard_pool = None
+
+
+def _process_time_range(
+    job_id: int,
+    video_path: str,
+    policy: SamplingPolicy,
+    time_range: TimeRange,
+    video_id: int,
+    out_frames_dir: Path,
+    gallery: Optional[TruthGallery],
+    settings: dict,
+    content_hash: Optional[str],
+    frame_cache: dict[int, Optional[DetectedFaces]],
+) -> tuple[list[ExtractedFrame], list[MatchResult], list, list, dict]:
+    """
+    Runs in a shard process: decode one time range (a single seek), encode + match its
+    frames and persist them as the policy says. Returns the frames without their images,
+    with their matches, kept embeddings, faces and new cache entries, for the job process
+    to store. Checks the job's cancel flag before each batch and stops early once it is set
+    (the job process sees the flag too and drops the result).
+    """
+    configure_detection_profile(settings["detection_profile"])
+    # The shard processes are the parallelism: frames are encoded in-process here.
+    ctx = _JobContext(
+        job=None,  # type: ignore[arg-type] - only the job process touches the job row
+        video_id=video_id,
+        out_frames_dir=out_frames_dir,
+        gallery=gallery,
+        settings={**settings, "face_workers": 1},
+        content_hash=content_hash,
+        frame_cache=frame_cache,
+    )
+    threshold = float(settings["threshold"])
+    batch_size = max(1, int(settings["frame_batch_size"]))
+    frames: list[ExtractedFrame] = []
+    matches: list[MatchResult] = []
+    embeddings: list = []
+    frame_faces: list[Optional[DetectedFaces]] = []
+    new_cache_entries: dict = {}
+
+    batch: list[ExtractedFrame] = []
+    for fr in iter_frames(video_path, policy, start_sec=time_range.start_sec, end_sec=time_range.end_sec):
+        batch.append(fr)
+        if len(batch) < batch_size:
+            continue
+        if _shard_cancelled(settings, job_id):
+            return frames, matches, embeddings, frame_faces, new_cache_entries
+        _encode_range_batch(ctx, batch, threshold, frames, matches, embeddings, frame_faces, new_cache_entries)
+        batch = []
+    if batch and not _shard_cancelled(settings, job_id):
+        _encode_range_batch(ctx, batch, threshold, frames, matches, embeddings, frame_faces, new_cache_entries)
+    return frames, matches, embeddings, frame_faces, new_cache_entries
+
+
+def _shard_cancelled(settings: dict, job_id: int) -> bool:
+    """The job's cancel flag, read from a shard process (only the job process updates the job row)."""
+    with _worker_session(settings["database_url"], settings["db_engine"]) as db:
+        return bool(db.scalar(select(VideoJob.cancel_requested).where(VideoJob.id == job_id)))
+
+
+def _encode_range_batch(
+    ctx: _JobContext,
+    batch: list[ExtractedFrame],
+    threshold: float,
+    frames: list[ExtractedFrame],
+    matches: list[MatchResult],
+    embeddings: list,
+    frame_faces: list[Optional[DetectedFaces]],
+    new_cache_entries: dict,
+) -> None:
+    batch_faces, entries = _frame_faces(ctx, batch)
+    batch_matches, batch_embeddings = match_faces(ctx.gallery, batch_faces, threshold=threshold)
+    for fr, match in zip(batch, batch_matches):
+        persist_frame(
+            fr,
+            str(ctx.out_frames_dir),
+            ctx.settings["frame_persist_policy"],
+            matched=match.match_status == "MATCH",
+            thumbnail_max_side=ctx.settings["frame_thumbnail_max_side"],
+        )
+        fr.image = None  # only the result travels back to the job process
+    frames.extend(batch)
+    matches.extend(batch_matches)
+    embeddings.extend(batch_embeddings)
+    frame_faces.extend(batch_faces)
+    new_cache_entries.update(entries)
+
+
+def _run_sharded(
+    db: Session, ctx: _JobContext, video_path: str, policy: SamplingPolicy, ranges: list[TimeRange]
+) -> bool:
+    """
+    Full run over a long video with the decode loop split by time: each range is decoded,
+    encoded, matched and persisted by a shard process with its own capture, so wall-clock
+    time scales with VIDEO_SHARD_WORKERS instead of one decode loop on one core.
+    Ranges are stored strictly in time order as they complete (rows, segments, progress),
+    so the result is the same as a sequential run.
+    Returns False if the job was cancelled (ranges not started yet are dropped, running ones
+    stop at their next batch).
+    """
+    workers = int(ctx.settings["shard_workers"])
+    pool = _get_shard_pool(workers)
+    futures = []
+    for r in ranges:
+        start_ms, end_ms = r.start_sec * 1000.0 - 1000.0, r.end_sec * 1000.0 + 1000.0
+        cached = {ms: e for ms, e in ctx.frame_cache.items() if start_ms <= ms < end_ms}
+        futures.append(
+            pool.submit(
+                call_with_stage_metrics,
+                _process_time_range,
+                ctx.job.id,
+                video_path,
+                policy,
+                r,
+                ctx.video_id,
+                ctx.out_frames_dir,
+                ctx.gallery,
+                ctx.settings,
+                ctx.content_hash,
+                cached,
+            )
+        )
+    logger.info("Video %s: decoding %s time ranges on %s shard process(es)", ctx.video_id, len(ranges), workers)
+
+    try:
+        for future in futures:
+            (frames, matches, embeddings, frame_faces, new_cache_entries), stages = future.result()
+            merge_stage_metrics(stages)
+            if not _record_frames(db, ctx, frames, matches, embeddings, frame_faces, new_cache_entries):
+                return False
+    except BrokenProcessPool:
+        # A shard process died (e.g. out of memory in dlib): the job fails, the next one gets a new pool.
+        _reset_shard_pool()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+    return True
+
+
+class _JobCancelled(Exception):
+    pass
+
+
+def _run_search(db: Session, ctx: _JobContext, video_path: str, search: SearchPolicy, batch_size: int) -> bool:
+    """
+    Search mode: only the frames `search_appearances` asks for are decoded and matched,
+    and the job ends as soon as enough appearances are located. Every looked-at frame is
+    stored like in a full run; the ranges (with their best match) go to `job.ranges`.
+    Returns False if the job was cancelled.
+    """
+    threshold = float(ctx.settings["threshold"])
+    frames: list[ExtractedFrame] = []
+    matches: list[MatchResult] = []
+    embeddings: list = []
+    frame_faces: list[Optional[DetectedFaces]] = []
+    new_cache_entries: dict = {}
+    hits: list[tuple[float, MatchResult]] = []
+
+    def is_match(frame: ExtractedFrame) -> bool:
+        nonlocal frames, matches, embeddings, frame_faces, new_cache_entries
+        faces, entries = _frame_faces(ctx, [frame])
+        (match,), frame_embeddings = match_faces(ctx.gallery, faces, threshold=threshold)
+        frames.append(frame)
+        matches.append(match)
+        embeddings.extend(frame_embeddings)
+        frame_faces.extend(faces)
+        new_cache_entries.update(entries)
+        if len(frames) >= batch_size:
+            if not _record_frames(db, ctx, frames, matches, embeddings, frame_faces, new_cache_entries):
+                raise _JobCancelled()
+            frames, matches, embeddings, frame_faces, new_cache_entries = [], [], [], [], {}
+        if match.match_status != "MATCH":
+            return False
+        hits.append((frame.timestamp_ms / 1000.0, match))
+        return True
+
+    try:
+        ranges = search_appearances(video_path, is_match, search)
+    except _JobCancelled:
+        return False
+    if frames and not _record_frames(db, ctx, frames, matches, embeddings, frame_faces, new_cache_entries):
+        return False
+
+    located = []
+    segments = []
+    for r in ranges:
+        inside = [m for t, m in hits if r.start_sec <= t <= r.end_sec]
+        best = max(inside, key=lambda m: m.confidence_score) if inside else None
+        segments.append(
+            Segment(
+                "MATCH",
+                best.truth_image_id if best else None,
+                start_sec=r.start_sec,
+                end_sec=r.end_sec,
+                frame_count=len(inside),
+                max_confidence=best.confidence_score if best else 0.0,
+                confidence_sum=sum(m.confidence_score for m in inside),
+            )
+        )
+        located.append(
+            {
+                "start_sec": r.start_sec,
+                "end_sec": r.end_sec,
+                "truth_image_id": best.truth_image_id if best else None,
+                "identity": best.identity if best else None,
+                "confidence_score": best.confidence_score if best else None,
+            }
+        )
+    ctx.job.ranges = json.dumps(located)
+    _store_segments(db, ctx.video_id, segments)
+    _flush_results(db, ctx)
+    logger.info(
+        "Video %s: search located %s range(s) after %s frame(s)", ctx.video_id, len(located), ctx.job.frames_done
+    )
+    return True
+
+
+def _encode_keyframe(ctx: _JobContext, frame: ExtractedFrame) -> tuple[Optional[DetectedFaces], dict]:
+    """
+    (faces, new cache entries) for one frame. Cache entries stored before boxes were kept
+    have none, so the sampler then cannot track that face and falls back to its scene tests.
+    """
+    key = int(round(frame.timestamp_ms))
+    if key in ctx.frame_cache:
+        embedding_cache.count(hits=1, misses=0)
+        return ctx.frame_cache[key], {}
+    embedding_cache.count(hits=0, misses=1)
+
+    try:
+        faces = extract_faces_from_array(frame.image)
+    except Exception:  # noqa: BLE001 - one bad frame must not fail the job
+        logger.warning("Face extraction failed for frame %s of video %s", frame.frame_index, ctx.video_id, exc_info=True)
+        faces = None
+    entries = {(ctx.content_hash, key): faces} if ctx.content_hash else {}
+    return faces, entries
+
+
+def _cancel_requested(db: Session, ctx: _JobContext) -> bool:
+    """Checks the cancel flag; a cancelled job keeps its buffered results and is marked CANCELLED."""
+    job = ctx.job
+    db.refresh(job, attribute_names=["cancel_requested"])
+    if job.cancel_requested:
+        _flush_results(db, ctx)
+        _finish(db, job, JOB_CANCELLED)
+        return True
+    return False
+
+
+def _record_frames(
+    db: Session,
+    ctx: _JobContext,
+    frames: list[ExtractedFrame],
+    matches: list[MatchResult],
+    embeddings: list,
+    faces: list[Optional[DetectedFaces]],
+    new_cache_entries: dict,
+) -> bool:
+    """
+    Persist frames as the policy says and buffer their results (with the kept face embedding
+    of each encoded frame, and all its faces when there were several, for rescoring and the
+    face search index); the buffer is bulk-inserted
+    by `_flush_results` once it is large or old enough.
+    Returns False if the job was cancelled (nothing of this batch is stored then).
+    """
+    if _cancel_requested(db, ctx):
+        return False
+    settings = ctx.settings
+    for fr, match, embedding, frame_faces in zip(frames, matches, embeddings, faces):
+        # Frames from a shard process arrive already persisted (and without their image).
+        written = fr.frame_path if fr.image is None else persist_frame(
+            fr,
+            str(ctx.out_frames_dir),
+            settings["frame_persist_policy"],
+            matched=match.match_status == "MATCH",
+            thumbnail_max_side=settings["frame_thumbnail_max_side"],
+        )
+        # Store frame paths relative to uploads/ for easy serving ("" = not persisted)
+        rel_frame_path = str(Path("frames") / f"video_{ctx.video_id}" / Path(written).name) if written else ""
+        fr.image = None  # release the decoded frame early
+
+        ctx.pending_rows.append(
+            {
+                "video_id": ctx.video_id,
+                "frame_path": rel_frame_path,
+                "timestamp_sec": fr.timestamp_ms / 1000.0,
+                "match_status": match.match_status,
+                "confidence_score": float(match.confidence_score),
+                "truth_image_id": match.truth_image_id,
+                "embedding": embedding,
+                "face_box": json.dumps(match.face_box) if match.face_box else None,
+                **stored_faces(frame_faces),
+            }
+        )
+        if ctx.track_segments:
+            ctx.segments.add(
+                fr.timestamp_ms / 1000.0, match.match_status, float(match.confidence_score), match.truth_image_id
+            )
+
+    ctx.pending_cache_entries.update(new_cache_entries)
+    # Extra samples around candidate matches are not part of frames_total.
+    ctx.pending_frames_done += sum(1 for fr in frames if not fr.densified)
+
+    due = time.monotonic() - ctx.last_flush >= float(settings["result_flush_seconds"])
+    if due or len(ctx.pending_rows) >= int(settings["result_flush_rows"]):
+        _flush_results(db, ctx)
+    return True
+
+
+def _flush_results(db: Session, ctx: _JobContext) -> None:
+    """
+    Bulk-insert buffered frame results + cache entries and update progress, in one short
+    transaction (the SQLite write lock is held only for these statements).
+    """
+    job = ctx.job
+    with stage(STAGE_DB_WRITE):
+        if ctx.pending_rows:
+            bulk_insert(db, VideoMatch, ctx.pending_rows)
+        _store_segments(db, ctx.video_id, ctx.segments.take_changed())
+        embedding_cache.store(db, ctx.pending_cache_entries)
+        job.frames_done += ctx.pending_frames_done
+        job.updated_at = datetime.utcnow()
+        db.commit()
+    ctx.pending_rows = []
+    ctx.pending_cache_entries = {}
+    ctx.pending_frames_done = 0
+    ctx.last_flush = time.monotonic()
+
+
+def _store_segments(db: Session, video_id: int, segments: list[Segment]) -> None:
+    """
+    Insert new segments and update the ones stored before (in practice only the segment that
+    was still open at the previous flush), inside the caller's transaction.
+    """
+    stored = [s for s in segments if s.row_id is not None]
+    if stored:
+        db.execute(update(VideoSegment), [{"id": s.row_id, **s.to_row(video_id)} for s in stored])
+    new = [s for s in segments if s.row_id is None]
+    if new:
+        rows = bulk_insert(db, VideoSegment, [s.to_row(video_id) for s in new], returning=True)
+        for seg, row in zip(new, rows):
+            seg.row_id = row.id
+    for seg in segments:
+        seg.dirty = False
+
+
+def _finish(db: Session, job: VideoJob, status: str, error: Optional[str] = None) -> None:
+    now = datetime.utcnow()
+    job.status = status
+    job.error = error
+    job.updated_at = now
+    job.finished_at = now
+    db.commit()
+
+
+# ---------------------------------------------------------------------------
+# App side (dispatcher thread inside the Flask process)
+# ---------------------------------------------------------------------------
+
+
+class VideoJobRunner:
+    """
+    Claims QUEUED jobs from the DB and runs them on a pool of worker processes.
+
+    Job state lives in `video_jobs`, so queued work survives restarts. Claiming is an
+    atomic UPDATE ... WHERE status='QUEUED', so several app processes can share one queue.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        settings: dict,
+        workers: int = 2,
+        poll_interval: float = 2.0,
+        stale_after_seconds: int = 600,
+    ):
+        self.session_factory = session_factory
+        self.settings = settings
+        self.workers = max(1, int(workers))
+        self.poll_interval = float(poll_interval)
+        self.stale_after = timedelta(seconds=int(stale_after_seconds))
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight: set[int] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._requeue_stale_jobs()
+        self._executor = self._new_executor()
+        self._thread = threading.Thread(target=self._dispatch_loop, name="video-job-dispatcher", daemon=True)
+        self._thread.start()
+        logger.info("Video job runner started with %s worker(s)", self.workers)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # "spawn" keeps workers independent of the Flask process state (threads, DB connections).
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def notify(self) -> None:
+        """Wake the dispatcher right away (called after new jobs are committed)."""
+        self._wakeup.set()
+
+    def _requeue_stale_jobs(self) -> None:
+        # RUNNING jobs without a recent heartbeat belonged to a process that died.
+        cutoff = datetime.utcnow() - self.stale_after
+        with self.session_factory() as db:
+            result = db.execute(
+                update(VideoJob)
+                .where(VideoJob.status == JOB_RUNNING, VideoJob.updated_at < cutoff)
+                .values(status=JOB_QUEUED, updated_at=datetime.utcnow())
+            )
+            db.commit()
+        if result.rowcount:
+            logger.info("Re-queued %s stale video job(s)", result.rowcount)
+
+    def _dispatch_loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                while self._has_capacity():
+                    job_id = self._claim_next()
+                    if job_id is None:
+                        break
+                    self._submit(job_id)
+            except Exception:  # noqa: BLE001 - keep the dispatcher alive
+                logger.exception("Video job dispatcher error")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def in_flight(self) -> int:
+        """Jobs this process has handed to its workers and not seen finish yet."""
+        with self._lock:
+            return len(self._in_flight)
+
+    def _has_capacity(self) -> bool:
+        with self._lock:
+            return len(self._in_flight) < self.workers
+
+    def _claim_next(self) -> Optional[int]:
+        with self.session_factory() as db:
+            candidates = (
+                db.execute(
+                    select(VideoJob.id)
+                    .where(VideoJob.status == JOB_QUEUED)
+                    .order_by(VideoJob.id)
+                    .limit(self.workers)
+                )
+                .scalars()
+                .all()
+            )
+            for job_id in candidates:
+                now = datetime.utcnow()
+                claimed = db.execute(
+                    update(VideoJob)
+                    .where(VideoJob.id == job_id, VideoJob.status == JOB_QUEUED)
+                    .values(status=JOB_RUNNING, started_at=now, updated_at=now)
+                )
+                db.commit()
+                if claimed.rowcount == 1:
+                    return job_id
+        return None
+
+    def _submit(self, job_id: int) -> None:
+        with self._lock:
+            self._in_flight.add(job_id)
+        try:
+            # The worker's stage timings come back with the result (see services.metrics).
+            future = self._executor.submit(call_with_stage_metrics, run_video_job, job_id, self.settings)
+        except Exception as e:
+            # Not handed over: the job goes back to the queue instead of staying RUNNING.
+            with self._lock:
+                self._in_flight.discard(job_id)
+            self._release_claim(job_id)
+            if isinstance(e, BrokenProcessPool):
+                # A worker process died (e.g. out of memory in dlib) and took the pool down
+                # with it; the next claim goes to a new one.
+                logger.warning("Video job pool is broken, starting a new one")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+                return
+            raise
+        future.add_done_callback(lambda f, jid=job_id: self._on_done(jid, f))
+
+    def _release_claim(self, job_id: int) -> None:
+        with self.session_factory() as db:
+            db.execute(
+                update(VideoJob)
+                .where(VideoJob.id == job_id, VideoJob.status == JOB_RUNNING)
+                .values(status=JOB_QUEUED, started_at=None, updated_at=datetime.utcnow())
+            )
+            db.commit()
+
+    def _on_done(self, job_id: int, future: Future) -> None:
+        with self._lock:
+            self._in_flight.discard(job_id)
+
+        error = future.exception() if not future.cancelled() else None
+        if error is None and not future.cancelled():
+            _status, stages = future.result()
+            merge_stage_metrics(stages)
+        if error is not None:
+            # The worker process itself died (e.g. OOM in dlib); record it on the job.
+            logger.error("Video job %s crashed: %s", job_id, error)
+            with self.session_factory() as db:
+                now = datetime.utcnow()
+                db.execute(
+                    update(VideoJob)
+                    .where(VideoJob.id == job_id, VideoJob.status == JOB_RUNNING)
+                    .values(status=JOB_FAILED, error=str(error), updated_at=now, finished_at=now)
+                )
+                db.commit()
+
+        self._wakeup.set()
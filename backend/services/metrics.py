@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Optional
+
+from services.timing import add_stage_observer, remove_stage_observer
+
+# Upper bounds (seconds). Stages span sub-millisecond compares to multi-second detections.
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HistogramState = dict[tuple, tuple[list[int], float]]  # labels -> (bucket counts incl. +Inf, sum)
+
+
+class HistogramFamily:
+    """
+    One Prometheus histogram metric with labels. `observe` is a bisect + a locked
+    increment, cheap enough for every stage and request.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last slot is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][idx] += 1
+            series[1] += value
+
+    def state(self) -> HistogramState:
+        """Picklable copy, e.g. to send from a worker process back to the app."""
+        with self._lock:
+            return {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+    def merge(self, state: HistogramState) -> None:
+        with self._lock:
+            for labels, (counts, total) in state.items():
+                series = self._series.get(labels)
+                if series is None:
+                    series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+                for i, n in enumerate(counts):
+                    series[0][i] += n
+                series[1] += total
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.state().items()):
+            base = [f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels)]
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else str(float(bound))
+                bucket_labels = ",".join(base + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            label_str = "{" + ",".join(base) + "}" if base else ""
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _stage_family() -> HistogramFamily:
+    return HistogramFamily(
+        "facematch_stage_seconds",
+        "Time spent in each pipeline stage (decode, detect, encode, compare, db_write, ...).",
+        ("stage",),
+        STAGE_BUCKETS,
+    )
+
+
+stage_seconds = _stage_family()
+request_seconds = HistogramFamily(
+    "facematch_http_request_seconds",
+    "HTTP request latency by route (until the response object is ready; streamed bodies excluded).",
+    ("method", "route", "status"),
+    REQUEST_BUCKETS,
+)
+
+
+def _observe_stage(name: str, seconds: float) -> None:
+    stage_seconds.observe((name,), seconds)
+
+
+_installed = False
+_install_lock = threading.Lock()
+# Families of running `call_with_stage_metrics` calls (a job worker may itself use a face pool).
+_collectors: list[HistogramFamily] = []
+
+
+def install_stage_metrics() -> None:
+    """Feed `services.timing` stages of this process into `stage_seconds` (idempotent)."""
+    global _installed
+    with _install_lock:
+        if not _installed:
+            add_stage_observer(_observe_stage)
+            _installed = True
+
+
+def call_with_stage_metrics(fn: Callable, *args: Any) -> tuple[Any, HistogramState]:
+    """
+    Run `fn(*args)` inside a pool worker process and return its result together with the
+    stage histograms it recorded; the app merges them with `merge_stage_metrics`.
+    Top-level so it pickles for ProcessPoolExecutor.submit.
+    """
+    family = _stage_family()
+
+    def observer(name: str, seconds: float) -> None:
+        family.observe((name,), seconds)
+
+    add_stage_observer(observer)
+    _collectors.append(family)
+    try:
+        result = fn(*args)
+    finally:
+        _collectors.remove(family)
+        remove_stage_observer(observer)
+    return result, family.state()
+
+
+def merge_stage_metrics(state: Optional[HistogramState]) -> None:
+    if not state:
+        return
+    stage_seconds.merge(state)
+    for family in list(_collectors):
+        family.merge(state)
+
+
+class RequestTimer:
+    """Flask before/after hooks feeding `request_seconds` and an in-flight gauge."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def init_app(self, app) -> None:
+        from flask import g, request
+
+        @app.before_request
+        def _start_timer():
+            g._metrics_start = time.perf_counter()
+            with self._lock:
+                self.in_flight += 1
+
+        @app.after_request
+        def _observe_request(response):
+            start = g.get("_metrics_start")
+            if start is not None:
+                route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+                labels = (request.method, route, str(response.status_code))
+                request_seconds.observe(labels, time.perf_counter() - start)
+            return response
+
+        @app.teardown_request
+        def _end_request(_exc=None):
+            if g.pop("_metrics_start", None) is not None:
+                with self._lock:
+                    self.in_flight -= 1
+
+
+request_timer = RequestTimer()
+
+
+def process_memory() -> dict[str, int]:
+    """
+    Memory of this process in bytes: rss, plus pss (shared pages split between the processes
+    sharing them) and uss (private pages) on Linux. uss is what a forked worker really adds.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0]) * 1024
+        return {
+            "rss": fields["Rss"],
+            "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+        }
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return {}
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Peak, not current: the best available without /proc. kB on Linux, bytes on macOS.
+    return {"rss": peak if sys.platform == "darwin" else peak * 1024}
+
+
+def format_memory(memory: dict[str, int]) -> str:
+    return " ".join(f"{kind}={value / 1024 / 1024:.0f}MB" for kind, value in memory.items()) or "n/a"
+
+
+def render_metrics(gauges: list[tuple[str, str, list[tuple[dict, float]]]]) -> str:
+    """
+    Prometheus text exposition of the histograms plus the given gauges:
+    (name, help, [(labels, value), ...]).
+    Values are per process: with several app processes, scrape each one.
+    """
+    lines = stage_seconds.render() + request_seconds.render()
+    for name, help_text, samples in gauges:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+    return "\n".join(lines) + "\n"
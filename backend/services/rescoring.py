@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import LargeBinary, bindparam, delete, select, type_coerce, update
+from sqlalchemy.orm import Session
+
+from database import bulk_insert
+from embedding_codec import EMBEDDING_BYTES, decode_embeddings
+from models import TestImage, VideoJob, VideoMatch, VideoSegment
+from services.face_service import DetectedFaces, TruthGallery, closest_in_groups, score_embedding_matrix
+from services.job_service import JOB_QUEUED, JOB_RUNNING
+from services.segments import build_segments
+from services.timing import STAGE_DB_WRITE, stage
+from services.truth_service import get_truth_gallery
+
+logger = logging.getLogger(__name__)
+
+RESCORE_COLLECTIONS = ("test_images", "video_matches")
+
+
+@dataclass
+class RescoreCounts:
+    rows: int = 0  # rows looked at
+    updated: int = 0  # rows whose verdict changed and were written
+    unscorable: int = 0  # MATCH/NO_MATCH rows without an embedding (stored before embeddings were kept)
+
+    def to_dict(self) -> dict:
+        return {"rows": self.rows, "updated": self.updated, "unscorable": self.unscorable}
+
+
+@dataclass
+class _Chunk:
+    ids: np.ndarray  # int64
+    video_ids: Optional[np.ndarray]  # int64, video frames only
+    statuses: np.ndarray  # object (str)
+    confidences: np.ndarray  # float64
+    truth_ids: np.ndarray  # int64, -1 for NULL
+    embeddings: list[Optional[bytes]]
+    faces: list[Optional[bytes]]  # every face of multi-face rows, else None
+    face_boxes: list[Optional[bytes]]
+
+
+def _last_anchor(video_ids: np.ndarray, anchor: np.ndarray) -> np.ndarray:
+    """
+    For each row, the index of the closest earlier-or-same anchor row of the same video
+    (rows in id order, videos interleaved), or -1 if the chunk has none.
+    """
+    n = len(video_ids)
+    order = np.lexsort((np.arange(n), video_ids))  # grouped by video, id order inside
+    videos = video_ids[order]
+    group_start = np.r_[True, videos[1:] != videos[:-1]]
+    first_of_group = np.maximum.accumulate(np.where(group_start, np.arange(n), 0))
+    last = np.maximum.accumulate(np.where(anchor[order], np.arange(n), -1))
+    found = last >= first_of_group
+    source = np.full(n, -1, dtype=np.int64)
+    source[order[found]] = order[last[found]]
+    return source
+
+
+def _update_statement(model):
+    # Core executemany by primary key: the ORM bulk UPDATE path spends more time building
+    # per-row parameters than SQLite spends writing them.
+    table = model.__table__
+    return (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(
+            match_status=bindparam("status"),
+            confidence_score=bindparam("confidence"),
+            truth_image_id=bindparam("truth_id"),
+        )
+    )
+
+
+def _kept_face_statement(model):
+    table = model.__table__
+    return (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(embedding=bindparam("embedding", type_=LargeBinary), face_box=bindparam("face_box"))
+    )
+
+
+def _load_chunk(db: Session, model, after_id: int, limit: int, excluded_videos: set[int]) -> Optional[_Chunk]:
+    table = model.__table__
+    is_frame = model is VideoMatch
+    columns = [
+        table.c.id,
+        table.c.match_status,
+        table.c.confidence_score,
+        table.c.truth_image_id,
+        type_coerce(table.c.embedding, LargeBinary),
+        table.c.faces,
+        table.c.face_boxes,
+    ]
+    if is_frame:
+        columns.append(table.c.video_id)
+    query = select(*columns).where(table.c.id > after_id).order_by(table.c.id).limit(limit)
+    if is_frame and excluded_videos:
+        query = query.where(table.c.video_id.notin_(excluded_videos))
+    # Core rows (no ORM entity loading): this runs over every stored row.
+    rows = db.connection().execute(query).all()
+    if not rows:
+        return None
+    values = list(zip(*rows))
+    return _Chunk(
+        ids=np.array(values[0], dtype=np.int64),
+        video_ids=np.array(values[7], dtype=np.int64) if is_frame else None,
+        statuses=np.array(values[1], dtype=object),
+        confidences=np.array([c or 0.0 for c in values[2]], dtype=np.float64),
+        truth_ids=np.array([-1 if t is None else t for t in values[3]], dtype=np.int64),
+        embeddings=list(values[4]),
+        faces=list(values[5]),
+        face_boxes=list(values[6]),
+    )
+
+
+def _kept_face_changes(chunk: _Chunk, scored: np.ndarray, face_counts: np.ndarray, picks: np.ndarray) -> list[dict]:
+    """Multi-face rows whose closest face is now another one than the stored `embedding`."""
+    starts = np.cumsum(face_counts) - face_counts
+    changes = []
+    for group, i in enumerate(np.flatnonzero(scored).tolist()):
+        if chunk.faces[i] is None:
+            continue
+        faces = DetectedFaces.from_blobs(chunk.faces[i], chunk.face_boxes[i])
+        face = int(picks[group] - starts[group])
+        embedding = faces.embeddings[face].tobytes()
+        if embedding != chunk.embeddings[i]:
+            box = faces.box(face)
+            changes.append(
+                {"row_id": int(chunk.ids[i]), "embedding": embedding, "face_box": json.dumps(box) if box else None}
+            )
+    return changes
+
+
+def rescore_collection(
+    session_factory,
+    model,
+    gallery: Optional[TruthGallery],
+    threshold: float,
+    chunk_size: int = 50_000,
+    excluded_videos: Optional[set[int]] = None,
+) -> tuple[RescoreCounts, set[int]]:
+    """
+    Recompute match_status / confidence_score / truth_image_id of every row of `model`
+    (TestImage or VideoMatch) from its stored embedding, `chunk_size` rows per transaction.
+    - each chunk is scored and compared with the stored verdicts as whole arrays; only rows
+      whose verdict changed are written (one executemany UPDATE by primary key per chunk)
+    - rows that kept several faces are re-matched over all of them: the face closest to an
+      identity is kept again (its embedding and box are updated when that is another face)
+    - NO_FACE rows stay NO_FACE; rows without an embedding cannot be re-scored, except
+      video frames whose result was reused from the previous encoded frame (adaptive
+      sampling): they take that frame's new result again
+    Returns the counts and, for video frames, the videos whose rows changed.
+    """
+    counts = RescoreCounts()
+    changed_videos: set[int] = set()
+    excluded_videos = excluded_videos or set()
+    is_frame = model is VideoMatch
+    # Per video: the new (status, confidence, truth id) of its last encoded frame in earlier chunks.
+    carried: dict[int, tuple[str, float, int]] = {}
+
+    after_id = 0
+    while True:
+        with session_factory() as db:
+            chunk = _load_chunk(db, model, after_id, chunk_size, excluded_videos)
+            if chunk is None:
+                break
+            after_id = int(chunk.ids[-1])
+            counts.rows += len(chunk.ids)
+
+            status = chunk.statuses.copy()
+            confidence = chunk.confidences.copy()
+            truth_ids = chunk.truth_ids.copy()
+            scored = np.array([e is not None for e in chunk.embeddings], dtype=bool)
+            # Every face of each scored row (one for most rows), back to back.
+            blobs = [f if f is not None else e for e, f in zip(chunk.embeddings, chunk.faces) if e is not None]
+            face_counts = np.array([len(b) // EMBEDDING_BYTES for b in blobs], dtype=np.int64)
+            scores = score_embedding_matrix(gallery, decode_embeddings(blobs), threshold)
+            picks = closest_in_groups(scores.face_distance, face_counts)
+            status[scored] = scores.match_status[picks]
+            confidence[scored] = scores.confidence_score[picks]
+            truth_ids[scored] = scores.truth_image_id[picks]
+            kept_faces = _kept_face_changes(chunk, scored, face_counts, picks)
+
+            no_face = chunk.statuses == "NO_FACE"
+            unscored = ~scored & ~no_face
+            if is_frame:
+                source = _last_anchor(chunk.video_ids, scored | no_face)
+                in_chunk = unscored & (source >= 0)
+                status[in_chunk] = status[source[in_chunk]]
+                confidence[in_chunk] = confidence[source[in_chunk]]
+                truth_ids[in_chunk] = truth_ids[source[in_chunk]]
+                # Reused frames at the start of the chunk continue the previous chunk's frame.
+                for i in np.flatnonzero(unscored & (source < 0)):
+                    previous = carried.get(int(chunk.video_ids[i]))
+                    if previous is None:
+                        counts.unscorable += 1
+                    else:
+                        status[i], confidence[i], truth_ids[i] = previous
+                anchors = np.flatnonzero(scored | no_face)[::-1]
+                videos, first = np.unique(chunk.video_ids[anchors], return_index=True)
+                for video_id, i in zip(videos.tolist(), anchors[first]):  # each video's last anchor
+                    carried[video_id] = (status[i], confidence[i], truth_ids[i])
+            else:
+                counts.unscorable += int(unscored.sum())
+
+            changed = (
+                (status != chunk.statuses)
+                | (truth_ids != chunk.truth_ids)
+                | (np.abs(confidence - chunk.confidences) >= 0.005)
+            )
+            changes = [
+                {"row_id": row_id, "status": s, "confidence": c, "truth_id": t if t >= 0 else None}
+                for row_id, s, c, t in zip(
+                    chunk.ids[changed].tolist(),
+                    status[changed].tolist(),
+                    confidence[changed].tolist(),
+                    truth_ids[changed].tolist(),
+                )
+            ]
+            if changes or kept_faces:
+                with stage(STAGE_DB_WRITE):
+                    if changes:
+                        db.connection().execute(_update_statement(model), changes)
+                    if kept_faces:
+                        db.connection().execute(_kept_face_statement(model), kept_faces)
+                    db.commit()
+                counts.updated += len(changes)
+                if is_frame:
+                    changed_videos.update(np.unique(chunk.video_ids[changed]).tolist())
+    return counts, changed_videos
+
+
+def rebuild_video_segments(db: Session, video_id: int) -> int:
+    """Replace a video's timeline segments with ones built from its frame rows (caller commits)."""
+    db.execute(delete(VideoSegment).where(VideoSegment.video_id == video_id))
+    frames = db.execute(
+        select(VideoMatch.timestamp_sec, VideoMatch.match_status, VideoMatch.confidence_score, VideoMatch.truth_image_id)
+        .where(VideoMatch.video_id == video_id, VideoMatch.timestamp_sec.isnot(None))
+        .order_by(VideoMatch.timestamp_sec, VideoMatch.id)
+    ).all()
+    segments = build_segments(frames)
+    if segments:
+        bulk_insert(db, VideoSegment, [s.to_row(video_id) for s in segments])
+    return len(segments)
+
+
+@dataclass
+class RescoreReport:
+    threshold: float
+    identities: int
+    collections: dict[str, RescoreCounts] = field(default_factory=dict)
+    skipped_videos: int = 0  # videos with a queued/running job, left to that job
+    segments_rebuilt: int = 0  # videos whose timeline was rebuilt
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "threshold": self.threshold,
+            "identities": self.identities,
+            **{name: counts.to_dict() for name, counts in self.collections.items()},
+            "skipped_videos": self.skipped_videos,
+            "segments_rebuilt": self.segments_rebuilt,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+def rescore_results(
+    session_factory,
+    threshold: float,
+    collections: tuple[str, ...] = RESCORE_COLLECTIONS,
+    chunk_size: int = 50_000,
+) -> RescoreReport:
+    """
+    Bring stored verdicts in line with the current truth gallery and threshold, from the
+    stored embeddings only (no decoding or dlib).
+    - frames of videos with a queued/running job are skipped (the job keeps the gallery it loaded)
+    - timelines of videos whose frames changed are rebuilt; search jobs' timelines come from
+      their located ranges and are left as they are
+    """
+    started = time.perf_counter()
+    with session_factory() as db:
+        gallery = get_truth_gallery(db)
+        jobs = db.execute(select(VideoJob.video_id, VideoJob.status, VideoJob.mode)).all()
+    busy_videos = {v for v, status, _mode in jobs if status in (JOB_QUEUED, JOB_RUNNING)}
+    search_videos = {v for v, _status, mode in jobs if mode == "search"}
+
+    report = RescoreReport(threshold=threshold, identities=len(gallery) if gallery is not None else 0)
+    report.skipped_videos = len(busy_videos)
+    if "test_images" in collections:
+        report.collections["test_images"], _ = rescore_collection(
+            session_factory, TestImage, gallery, threshold, chunk_size
+        )
+    if "video_matches" in collections:
+        counts, changed_videos = rescore_collection(
+            session_factory, VideoMatch, gallery, threshold, chunk_size, excluded_videos=busy_videos
+        )
+        report.collections["video_matches"] = counts
+        with session_factory() as db:
+            with stage(STAGE_DB_WRITE):
+                for video_id in sorted(changed_videos - search_videos):
+                    rebuild_video_segments(db, video_id)
+                    report.segments_rebuilt += 1
+                db.commit()
+
+    report.seconds = time.perf_counter() - started
+    logger.info("Re-scored stored results: %s", report.to_dict())
+    return report
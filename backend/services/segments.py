@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+
+@dataclass
+class Segment:
+    match_status: str
+    truth_image_id: Optional[int]  # only set for MATCH segments
+    start_sec: float
+    end_sec: float
+    frame_count: int = 0
+    max_confidence: float = 0.0
+    confidence_sum: float = 0.0
+    row_id: Optional[int] = None  # video_segments.id once stored
+    dirty: bool = True  # changed since it was last stored
+
+    @property
+    def mean_confidence(self) -> float:
+        return self.confidence_sum / self.frame_count if self.frame_count else 0.0
+
+    def add(self, timestamp_sec: float, confidence: float) -> None:
+        self.end_sec = max(self.end_sec, timestamp_sec)
+        self.frame_count += 1
+        self.max_confidence = max(self.max_confidence, confidence)
+        self.confidence_sum += confidence
+        self.dirty = True
+
+    def to_row(self, video_id: int) -> dict:
+        return {
+            "video_id": video_id,
+            "match_status": self.match_status,
+            "truth_image_id": self.truth_image_id,
+            "start_sec": round(self.start_sec, 3),
+            "end_sec": round(self.end_sec, 3),
+            "frame_count": self.frame_count,
+            "max_confidence": round(self.max_confidence, 2),
+            "mean_confidence": round(self.mean_confidence, 2),
+        }
+
+
+class SegmentBuilder:
+    """
+    Collapses time-ordered frame results into segments, incrementally: a frame either
+    extends the open segment or closes it and opens a new one.
+    A new segment starts when the status changes, or for MATCH when the identity changes.
+    """
+
+    def __init__(self):
+        self.open: Optional[Segment] = None
+        self._closed: list[Segment] = []
+
+    def add(self, timestamp_sec: float, match_status: str, confidence: float, truth_image_id: Optional[int]) -> None:
+        identity = truth_image_id if match_status == "MATCH" else None
+        seg = self.open
+        if seg is None or seg.match_status != match_status or seg.truth_image_id != identity:
+            if seg is not None:
+                self._closed.append(seg)
+            seg = self.open = Segment(match_status, identity, start_sec=timestamp_sec, end_sec=timestamp_sec)
+        seg.add(timestamp_sec, confidence)
+
+    def take_changed(self) -> list[Segment]:
+        """Segments closed since the last call plus the open one if it changed (oldest first)."""
+        changed, self._closed = self._closed, []
+        if self.open is not None and self.open.dirty:
+            changed.append(self.open)
+        return changed
+
+
+def build_segments(frames: Iterable[tuple[float, str, float, Optional[int]]]) -> list[Segment]:
+    """Segments of (timestamp_sec, match_status, confidence, truth_image_id) rows in time order."""
+    builder = SegmentBuilder()
+    for timestamp_sec, match_status, confidence, truth_image_id in frames:
+        builder.add(timestamp_sec, match_status, confidence, truth_image_id)
+    return builder.take_changed()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from services.timing import STAGE_UPLOAD_SAVE, stage
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class StoredUpload:
+    abs_path: str
+    rel_path: str  # relative to uploads/, what the DB stores
+    content_hash: str  # sha256 hex of the file bytes
+    size: int
+    reused: bool  # True if identical bytes were already stored
+
+
+def save_stream_content_addressed(
+    stream: BinaryIO,
+    uploads_root: Path,
+    subdir: str,
+    prefix: str,
+    ext: str,
+) -> StoredUpload:
+    """
+    Stream an upload to disk while hashing it, then store it under a name derived from
+    the hash (`<prefix>_<sha256[:32]><ext>`). Re-uploading the same bytes reuses the
+    existing file instead of writing another copy.
+    """
+    target_dir = uploads_root / subdir
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=target_dir, prefix=".upload_", suffix=ext)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        content_hash = digest.hexdigest()
+        filename = f"{prefix}_{content_hash[:32]}{ext}"
+        final_path = target_dir / filename
+        reused = final_path.exists()
+        if reused:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return StoredUpload(
+        abs_path=str(final_path),
+        rel_path=str(Path(subdir) / filename),
+        content_hash=content_hash,
+        size=size,
+        reused=reused,
+    )
+
+
+def save_upload(file, uploads_root: Path, subdir: str, prefix: str, default_ext: str) -> StoredUpload:
+    """
+    Content-addressed save for a Werkzeug FileStorage (see save_stream_content_addressed).
+    """
+    ext = os.path.splitext(file.filename or "")[1].lower() or default_ext
+    with stage(STAGE_UPLOAD_SAVE):
+        return save_stream_content_addressed(file.stream, uploads_root, subdir, prefix, ext)
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from services.timing import STAGE_THUMBNAIL, stage
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+# Upload names end in 32 hex chars: the sha256 prefix (services.storage) or, for older
+# uploads, a uuid4. Either way a name never gets different bytes.
+_IMMUTABLE_NAME_RE = re.compile(r"_([0-9a-f]{32})\.[A-Za-z0-9]+$")
+
+# EXIF orientations that swap width and height.
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def is_immutable_upload(path: Path) -> bool:
+    return _IMMUTABLE_NAME_RE.search(path.name) is not None
+
+
+def file_etag(path: Path, st: os.stat_result) -> str:
+    """
+    Strong validator for an upload: the hash/uuid in the name when there is one, else
+    size + mtime (video frames are only rewritten when a job is re-run).
+    """
+    m = _IMMUTABLE_NAME_RE.search(path.name)
+    if m:
+        return m.group(1)
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+class ThumbnailCache:
+    """
+    Downscaled JPEG copies of uploaded images, generated on demand and kept on disk.
+
+    - requested widths snap up to the configured steps, so clients cannot fill the cache
+      with one copy per pixel width
+    - bounded by `max_bytes`; the least recently served thumbnails are evicted (recency is
+      the file mtime, so the order survives restarts)
+    - each process keeps its own index; a thumbnail evicted by another process is regenerated
+    """
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        max_bytes: int = 512 * 1024 * 1024,
+        widths: tuple[int, ...] = (64, 128, 256, 512, 1024),
+        quality: int = 80,
+    ):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.widths = tuple(sorted(widths))
+        self.quality = int(quality)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()  # file name -> bytes, oldest first
+        self._bytes = 0
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, root: Path, max_bytes: int, widths: tuple[int, ...], quality: int) -> None:
+        with self._lock:
+            self.root = Path(root)
+            self.max_bytes = int(max_bytes)
+            self.widths = tuple(sorted(widths))
+            self.quality = int(quality)
+            self._entries.clear()
+            self._bytes = 0
+            self._loaded = False
+
+    def snap_width(self, width: int) -> Optional[int]:
+        """Smallest configured width >= `width`; None if it is wider than all (serve the original)."""
+        for step in self.widths:
+            if step >= width:
+                return step
+        return None
+
+    def get(self, source: Path, etag: str, width: int) -> Path:
+        """
+        Path of the thumbnail of `source` at most `width` px wide, rendering it on a miss.
+        `etag` identifies the source bytes, so a rewritten source gets a new thumbnail.
+        """
+        key = hashlib.sha1(f"{source}\0{etag}".encode()).hexdigest()
+        name = f"{key}_w{width}.jpg"
+        target = self.root / name
+        with self._lock:
+            self._load_index()
+
+        if target.exists():
+            try:
+                os.utime(target)  # mark as recently used for the next restart's index
+            except OSError:
+                pass
+            with self._lock:
+                self.hits += 1
+                if name in self._entries:
+                    self._entries.move_to_end(name)
+            return target
+
+        with stage(STAGE_THUMBNAIL):
+            self._render(source, target, width)
+        size = target.stat().st_size
+        with self._lock:
+            self.misses += 1
+            self._bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._evict()
+        return target
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "evictions": self.evictions,
+            }
+
+    def _render(self, source: Path, target: Path, width: int) -> None:
+        with Image.open(source) as img:
+            transposed = img.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS
+            src_w, src_h = (img.height, img.width) if transposed else img.size
+            if img.format == "JPEG":
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when that is still big enough.
+                draft_w = min(width, src_w)
+                draft_h = max(1, src_h * draft_w // max(src_w, 1))
+                img.draft("RGB", (draft_h, draft_w) if transposed else (draft_w, draft_h))
+            thumb = ImageOps.exif_transpose(img).convert("RGB")
+        thumb.thumbnail((width, thumb.height), Image.LANCZOS)
+
+        # Write next to the target and rename, so readers never see a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".thumb_", suffix=".jpg")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                thumb.save(out, "JPEG", quality=self.quality)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _load_index(self) -> None:
+        # Caller holds the lock.
+        if self._loaded:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.startswith("."):
+                st = entry.stat()
+                files.append((st.st_mtime, entry.name, st.st_size))
+        for _mtime, name, size in sorted(files):
+            self._entries[name] = size
+            self._bytes += size
+        self._loaded = True
+        self._evict()
+
+    def _evict(self) -> None:
+        # Caller holds the lock. Keep at least the newest thumbnail.
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.root / name)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning("Could not evict thumbnail %s", name, exc_info=True)
+
+
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# Pipeline stages timed on the hot path.
+STAGE_UPLOAD_SAVE = "upload_save"
+STAGE_DECODE = "decode"  # image decode, video demux/decode + color conversion
+STAGE_DETECT = "detect"  # face_locations
+STAGE_ENCODE = "encode"  # face_encodings
+STAGE_COMPARE = "compare"  # distances to the truth gallery
+STAGE_DB_WRITE = "db_write"  # inserts + commit
+STAGE_SERIALIZE = "serialize"  # JSON responses
+STAGE_THUMBNAIL = "thumbnail"  # rendering a missing /uploads thumbnail
+
+StageObserver = Callable[[str, float], None]  # (stage, seconds)
+
+# Copy-on-write: `stage()` iterates the current list without taking the lock.
+_observers: tuple[StageObserver, ...] = ()
+_observers_lock = threading.Lock()
+
+
+def add_stage_observer(observer: StageObserver) -> None:
+    global _observers
+    with _observers_lock:
+        _observers = _observers + (observer,)
+
+
+def remove_stage_observer(observer: StageObserver) -> None:
+    global _observers
+    with _observers_lock:
+        _observers = tuple(o for o in _observers if o is not observer)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a block of the pipeline and report it to every registered observer.
+    Costs two perf_counter() calls per block, so it stays on in production.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for observer in _observers:
+            observer(name, elapsed)
+
+
+class StageRecorder:
+    """
+    Collects per-stage totals while active (`with StageRecorder() as rec:`).
+    Records every thread of this process; work done in pool worker processes is not seen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals: dict[str, float] = defaultdict(float)
+        self.counts: dict[str, int] = defaultdict(int)
+
+    def __call__(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.totals[name] += seconds
+            self.counts[name] += 1
+
+    def __enter__(self) -> "StageRecorder":
+        add_stage_observer(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        remove_stage_observer(self)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "count": self.counts[name],
+                    "total_ms": round(total * 1000.0, 3),
+                    "mean_ms": round(total * 1000.0 / self.counts[name], 3),
+                }
+                for name, total in sorted(self.totals.items())
+            }
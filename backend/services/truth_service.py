@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import LargeBinary, select, type_coerce, update
+from sqlalchemy.orm import Session
+
+from embedding_codec import decode_embeddings
+from models import CacheVersion, TruthImage
+from services.face_service import TruthGallery
+
+logger = logging.getLogger(__name__)
+
+TRUTH_GALLERY_CACHE = "truth_gallery"
+
+
+def identity_name(truth_id: int, label: Optional[str]) -> str:
+    return label or f"truth_{truth_id}"
+
+
+def load_truth_gallery(db: Session) -> Optional[TruthGallery]:
+    """
+    Load every active enrolled identity into one TruthGallery (None if nothing is enrolled).
+    Only the id/label/blob columns are selected; blobs are decoded in a single copy.
+    """
+    rows = db.execute(
+        # Raw bytes (skip per-row EmbeddingBlob decoding); the matrix is built in one go below.
+        select(TruthImage.id, TruthImage.label, type_coerce(TruthImage.embedding, LargeBinary))
+        .where(TruthImage.active.is_(True))
+        .order_by(TruthImage.id)
+    ).all()
+    if not rows:
+        return None
+
+    matrix = decode_embeddings(r[2] for r in rows)
+    return TruthGallery.build(
+        truth_image_ids=[r[0] for r in rows],
+        identities=[identity_name(r[0], r[1]) for r in rows],
+        matrix=matrix,
+    )
+
+
+def read_cache_version(db: Session, name: str) -> int:
+    return db.execute(select(CacheVersion.version).where(CacheVersion.name == name)).scalar() or 0
+
+
+def bump_cache_version(db: Session, name: str) -> None:
+    """
+    Increment a cache version inside the caller's transaction (commit it together with the write).
+    """
+    result = db.execute(
+        update(CacheVersion).where(CacheVersion.name == name).values(version=CacheVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.add(CacheVersion(name=name, version=1))
+
+
+class TruthGalleryCache:
+    """
+    Process-wide cache of the active truth gallery as a ready-to-use TruthGallery.
+
+    - local invalidation: `invalidate()` after enrollment commits in this process
+    - cross-process invalidation: the `cache_versions` row is re-read (a primary-key lookup)
+      at most every `check_interval` seconds; a changed version triggers a reload
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = float(check_interval)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._gallery: Optional[TruthGallery] = None
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+
+    def get(self, db: Session) -> Optional[TruthGallery]:
+        now = time.monotonic()
+        with self._lock:
+            if self._loaded and now - self._checked_at < self.check_interval:
+                self.hits += 1
+                return self._gallery
+
+        version = read_cache_version(db, TRUTH_GALLERY_CACHE)
+        with self._lock:
+            if self._loaded and version == self._version:
+                self._checked_at = now
+                self.hits += 1
+                return self._gallery
+
+        gallery = load_truth_gallery(db)
+        with self._lock:
+            self._gallery = gallery
+            self._version = version
+            self._loaded = True
+            self._checked_at = now
+            self.misses += 1
+        logger.info("Truth gallery loaded: %s identities (version %s)", len(gallery) if gallery else 0, version)
+        return gallery
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded = False
+            self._gallery = None
+
+    def configure(self, check_interval: float) -> None:
+        self.check_interval = float(check_interval)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "version": self._version,
+                "identities": len(self._gallery) if self._gallery is not None else 0,
+            }
+
+
+truth_gallery_cache = TruthGalleryCache()
+
+
+def get_truth_gallery(db: Session) -> Optional[TruthGallery]:
+    """Cached active gallery (what routes and video jobs should use)."""
+    return truth_gallery_cache.get(db)
+
+
+def mark_truth_gallery_changed(db: Session) -> None:
+    """
+    Call in the same transaction as any change to truth_images: other processes reload on
+    their next version check. Call `truth_gallery_cache.invalidate()` after the commit.
+    """
+    bump_cache_version(db, TRUTH_GALLERY_CACHE)
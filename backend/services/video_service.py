@@ -1,75 +1,703 @@
 from __future__ import annotations
 
 import logging
+import math
 import os
 from dataclasses import dataclass
-from typing import Iterator, Optional
+from typing import Callable, Iterator, Optional
 
 import cv2
+import numpy as np
+
+from services.timing import STAGE_DECODE, stage
 
 logger = logging.getLogger(__name__)
 
+SAMPLE_FPS = "fps"  # N frames per second of video time
+SAMPLE_EVERY_N = "every_n"  # every Kth decoded frame
+SAMPLE_KEYFRAMES = "keyframes"  # only frames the demuxer flags as keyframes
+SAMPLE_ADAPTIVE = "adaptive"  # fps grid, but faces are tracked between encoded frames (AdaptiveSampler)
+
+PERSIST_ALL = "all"  # full-size JPEG for every sampled frame
+PERSIST_MATCHES = "matches"  # full-size JPEG only for frames that matched the truth image
+PERSIST_THUMBNAILS = "thumbnails"  # small JPEG for every sampled frame
+PERSIST_NONE = "none"
+
+# Not every OpenCV build exposes the keyframe flag; keyframe sampling needs it.
+_CAP_PROP_KEY_FRAME = getattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME", None)
+
 
 @dataclass
 class ExtractedFrame:
-    frame_path: str
+    frame_path: Optional[str]  # None while the frame only lives in memory
     frame_index: int
     timestamp_sec: int
+    timestamp_ms: float = 0.0
+    sample_index: int = 0
+    image: Optional[np.ndarray] = None  # decoded frame, RGB (what dlib expects)
+    densified: bool = False  # extra sample taken around a candidate match (adaptive mode)
 
 
-def extract_frames_one_per_second(
+@dataclass
+class SamplingPolicy:
+    mode: str = SAMPLE_FPS
+    frames_per_second: float = 1.0
+    every_n: int = 1
+
+    @classmethod
+    def from_config(cls, config) -> "SamplingPolicy":
+        return cls(
+            mode=str(config["VIDEO_SAMPLING_MODE"]),
+            frames_per_second=float(config["VIDEO_SAMPLE_FPS"]),
+            every_n=int(config["VIDEO_SAMPLE_EVERY_N"]),
+        )
+
+
+def _video_fps(cap) -> float:
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    return float(fps) if fps > 0 else 25.0
+
+
+def _grab(cap) -> bool:
+    """cap.grab() demuxes and decodes the next frame, so it counts as decode time."""
+    with stage(STAGE_DECODE):
+        return cap.grab()
+
+
+def _position_ms(cap, idx: int, frame_ms: float) -> float:
+    pos_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+    if pos_ms <= 0 and idx > 0:
+        pos_ms = idx * frame_ms
+    return pos_ms
+
+
+def iter_frames(
     video_path: str,
-    output_dir: str,
+    policy: Optional[SamplingPolicy] = None,
     max_seconds: Optional[int] = None,
+    start_sec: float = 0.0,
+    end_sec: Optional[float] = None,
 ) -> Iterator[ExtractedFrame]:
     """
-    Extract 1 frame per second from a video and save as JPG.
-    Keeps logic simple: seeks by frame index using FPS.
+    Decode a video front-to-back and yield the sampled frames in memory (RGB ndarray).
+
+    Frames are walked with `grab()` (demux + decode only, no conversion/copy) and only
+    sampled frames are materialised with `retrieve()`. There is no seeking: with
+    H.264/HEVC every `CAP_PROP_POS_FRAMES` seek re-decodes from the previous keyframe.
+    Timestamps come from the container (`CAP_PROP_POS_MSEC`); if the backend does not
+    report them, they are derived from the frame index and FPS.
+
+    `start_sec` / `end_sec` decode one time range only (see `split_time_ranges`): one seek
+    to the start, then front-to-back as usual. Frames are sampled and numbered as in a pass
+    over the whole video, so adjacent ranges neither overlap nor leave a gap.
     """
-    os.makedirs(output_dir, exist_ok=True)
+    policy = policy or SamplingPolicy()
+    if policy.mode == SAMPLE_ADAPTIVE:
+        raise ValueError("Adaptive sampling needs encoder feedback: use AdaptiveSampler")
+    if policy.mode not in (SAMPLE_FPS, SAMPLE_EVERY_N, SAMPLE_KEYFRAMES):
+        raise ValueError(f"Unknown sampling mode: {policy.mode}")
+    if policy.mode == SAMPLE_KEYFRAMES and _CAP_PROP_KEY_FRAME is None:
+        raise RuntimeError("This OpenCV build cannot report keyframes")
+    if policy.mode == SAMPLE_KEYFRAMES and start_sec > 0:
+        # Keyframe sample numbers depend on every keyframe before the range.
+        raise ValueError("Keyframe sampling cannot start mid-video")
 
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise RuntimeError("Could not open video")
 
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
-    fps = float(fps) if fps > 0 else 25.0
+    fps = _video_fps(cap)
+    frame_ms = 1000.0 / fps
+    interval_ms = 1000.0 / max(policy.frames_per_second, 1e-6)
+    every_n = max(1, int(policy.every_n))
+    limit_ms = float(max_seconds) * 1000.0 if max_seconds is not None else None
+    start_ms = float(start_sec) * 1000.0
+    end_ms = float(end_sec) * 1000.0 if end_sec is not None else None
 
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
-    duration_sec = int(total_frames / fps) if total_frames > 0 else 0
+    next_due_ms = start_ms
+    idx = -1
+    sample_no = 0
+    if start_ms > 0:
+        # Land a frame early: frames before the range start are skipped below.
+        first = max(0, int(start_ms / frame_ms) - 1)
+        with stage(STAGE_DECODE):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        idx = first - 1
+        # The fps grid is numbered from 0 s (range starts are on the grid).
+        sample_no = int(round(start_ms / interval_ms))
+    try:
+        while _grab(cap):
+            idx += 1
+            pos_ms = _position_ms(cap, idx, frame_ms)
+            if limit_ms is not None and pos_ms >= limit_ms:
+                break
+            # A frame belongs to the range its sampling point (half a frame late) falls in.
+            if pos_ms + frame_ms / 2.0 < start_ms:
+                continue
+            if end_ms is not None and pos_ms + frame_ms / 2.0 >= end_ms:
+                break
 
-    seconds_to_process = duration_sec if duration_sec > 0 else 0
-    if max_seconds is not None:
-        seconds_to_process = min(seconds_to_process, int(max_seconds))
-
-    # If duration is unknown, just iterate until read fails, sampling every ~fps frames.
-    if seconds_to_process == 0:
-        frame_step = int(round(fps))
-        idx = 0
-        sec = 0
-        while True:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ok, frame = cap.read()
+            if policy.mode == SAMPLE_FPS:
+                # Half a frame of tolerance so 1 fps on 29.97 fps video does not drift.
+                wanted = pos_ms + frame_ms / 2.0 >= next_due_ms
+            elif policy.mode == SAMPLE_EVERY_N:
+                wanted = idx % every_n == 0
+            else:
+                wanted = cap.get(_CAP_PROP_KEY_FRAME) > 0
+            if not wanted:
+                continue
+
+            with stage(STAGE_DECODE):
+                ok, frame = cap.retrieve()
+                # One BGR->RGB pass here; face encoding then uses the array as-is.
+                image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if ok else None
             if not ok:
                 break
-            out_path = os.path.join(output_dir, f"frame_{sec:06d}.jpg")
-            cv2.imwrite(out_path, frame)
-            yield ExtractedFrame(frame_path=out_path, frame_index=idx, timestamp_sec=sec)
-            idx += frame_step
-            sec += 1
+            if policy.mode == SAMPLE_FPS:
+                while next_due_ms <= pos_ms + frame_ms / 2.0:
+                    next_due_ms += interval_ms
+
+            yield ExtractedFrame(
+                frame_path=None,
+                frame_index=idx,
+                timestamp_sec=int(pos_ms // 1000),
+                timestamp_ms=round(pos_ms, 3),
+                # every_n: the Kth sampled frame is frame K * every_n, wherever decoding started.
+                sample_index=idx // every_n if policy.mode == SAMPLE_EVERY_N else sample_no,
+                image=image,
+            )
+            sample_no += 1
+    finally:
         cap.release()
-        return
 
-    for sec in range(seconds_to_process):
-        frame_idx = int(sec * fps)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-        ok, frame = cap.read()
+
+ACTION_ENCODE = "encode"  # run detection + encoding on this frame
+ACTION_REUSE = "reuse"  # same face (or same empty shot) as the last encoded frame: reuse its result
+
+FaceBox = tuple[int, int, int, int]  # (top, right, bottom, left) in frame pixels
+
+
+@dataclass
+class AdaptivePolicy:
+    dense_fps: float = 4.0  # sampling rate while a candidate match is in view
+    keyframe_interval_sec: float = 10.0  # re-encode at least this often, even in a static shot
+    scene_change_threshold: float = 0.35  # Bhattacharyya distance between gray histograms
+    static_threshold: float = 0.06  # a frame is "unchanged" if no 0.5% of it moved by more than this (0..1)
+    track_min_score: float = 0.6  # normalized template-match score below which a track is lost
+    candidate_window_sec: float = 2.0  # how long the dense rate lasts after a candidate match
+
+    @classmethod
+    def from_config(cls, config) -> "AdaptivePolicy":
+        return cls(
+            dense_fps=float(config["VIDEO_ADAPTIVE_DENSE_FPS"]),
+            keyframe_interval_sec=float(config["VIDEO_ADAPTIVE_KEYFRAME_SECONDS"]),
+            scene_change_threshold=float(config["VIDEO_SCENE_CHANGE_THRESHOLD"]),
+            static_threshold=float(config["VIDEO_STATIC_THRESHOLD"]),
+            track_min_score=float(config["VIDEO_TRACK_MIN_SCORE"]),
+            candidate_window_sec=float(config["VIDEO_CANDIDATE_WINDOW_SECONDS"]),
+        )
+
+
+@dataclass
+class AdaptiveStep:
+    frame: ExtractedFrame
+    action: str  # ACTION_ENCODE / ACTION_REUSE
+    reason: str  # first, refresh, scene_change, track_lost, changed, candidate / static, tracked
+
+
+@dataclass
+class _Keyframe:
+    pos_ms: float
+    gray: np.ndarray  # frame at tracking resolution
+    thumb: np.ndarray  # tiny gray copy for the "unchanged" test
+    hist: np.ndarray
+    template: Optional[np.ndarray] = None  # face patch at tracking resolution
+    box: Optional[tuple[int, int, int, int]] = None  # (x, y, w, h) where the face was last seen
+    confirmed: bool = False  # the encoded face matched an identity
+
+
+class AdaptiveSampler:
+    """
+    Adaptive sampling for one video: decides, frame by frame, whether the face encoder has
+    to run or the result of the last encoded frame (the keyframe) still holds.
+
+    - frames are taken on the policy's fps grid, and at `dense_fps` for
+      `candidate_window_sec` after an encoded frame that was a candidate match
+    - a frame is encoded when: it is the first one, the keyframe is older than
+      `keyframe_interval_sec`, the gray histogram shows a scene change, the tracked face
+      is lost, or the picture changed while no face was being tracked
+    - otherwise the keyframe result is reused: the shot is unchanged, or the keyframe face
+      is still found by normalized template matching near its last position
+    - near a candidate that did not match, tracked frames are re-encoded as well
+      (another pose may match)
+
+    Iterate to get `AdaptiveStep`s. After every ENCODE step, call `report()` with what the
+    encoder found before asking for the next step.
+    """
+
+    TRACK_WIDTH = 480  # tracking and scene tests run on frames scaled to this width
+    THUMB_SIZE = (128, 72)
+    STATIC_PERCENTILE = 99.5  # small enough that a face entering the shot counts as a change
+
+    def __init__(
+        self,
+        video_path: str,
+        policy: Optional[SamplingPolicy] = None,
+        adaptive: Optional[AdaptivePolicy] = None,
+        max_seconds: Optional[int] = None,
+    ):
+        self.video_path = video_path
+        self.policy = policy or SamplingPolicy(mode=SAMPLE_ADAPTIVE)
+        self.adaptive = adaptive or AdaptivePolicy()
+        self.max_seconds = max_seconds
+        self.encoded = 0
+        self.reused = 0
+        self._key: Optional[_Keyframe] = None
+        self._pending: Optional[_Keyframe] = None
+        self._track_scale = 1.0
+        self._window_until_ms = -1.0
+
+    def stats(self) -> dict:
+        return {"encoded": self.encoded, "reused": self.reused}
+
+    def __iter__(self) -> Iterator[AdaptiveStep]:
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise RuntimeError("Could not open video")
+
+        fps = _video_fps(cap)
+        frame_ms = 1000.0 / fps
+        half_frame = frame_ms / 2.0
+        base_interval = 1000.0 / max(self.policy.frames_per_second, 1e-6)
+        dense_interval = 1000.0 / max(self.adaptive.dense_fps, self.policy.frames_per_second, 1e-6)
+        limit_ms = float(self.max_seconds) * 1000.0 if self.max_seconds is not None else None
+
+        next_base_ms = 0.0
+        next_dense_ms = 0.0
+        idx = -1
+        sample_no = 0
+        try:
+            while _grab(cap):
+                idx += 1
+                pos_ms = _position_ms(cap, idx, frame_ms)
+                if limit_ms is not None and pos_ms >= limit_ms:
+                    break
+
+                on_base = pos_ms + half_frame >= next_base_ms
+                in_window = pos_ms <= self._window_until_ms
+                on_dense = in_window and pos_ms + half_frame >= next_dense_ms
+                if not (on_base or on_dense):
+                    continue
+
+                with stage(STAGE_DECODE):
+                    ok, bgr = cap.retrieve()
+                    image = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB) if ok else None
+                if not ok:
+                    break
+                while next_base_ms <= pos_ms + half_frame:
+                    next_base_ms += base_interval
+                next_dense_ms = pos_ms + dense_interval
+
+                action, reason = self._decide(bgr, pos_ms, in_window)
+                frame = ExtractedFrame(
+                    frame_path=None,
+                    frame_index=idx,
+                    timestamp_sec=int(pos_ms // 1000),
+                    timestamp_ms=round(pos_ms, 3),
+                    sample_index=sample_no,
+                    image=image,
+                    densified=not on_base,
+                )
+                sample_no += 1
+                yield AdaptiveStep(frame=frame, action=action, reason=reason)
+                if self._pending is not None:
+                    raise RuntimeError("AdaptiveSampler.report() must be called after an encode step")
+        finally:
+            cap.release()
+
+    def report(self, box: Optional[FaceBox], candidate: bool = False, confirmed: bool = False) -> None:
+        """
+        Outcome of the last ENCODE step: the face box in frame pixels (None if no face, or
+        unknown), whether it is a candidate match and whether it actually matched.
+        """
+        key, self._pending = self._pending, None
+        if key is None:
+            raise RuntimeError("report() called without a pending encode step")
+        key.confirmed = confirmed
+        if box is not None:
+            top, right, bottom, left = (int(round(v * self._track_scale)) for v in box)
+            height, width = key.gray.shape[:2]
+            top, left = max(0, top), max(0, left)
+            bottom, right = min(height, bottom), min(width, right)
+            if bottom - top >= 8 and right - left >= 8:  # too small to track reliably
+                key.template = key.gray[top:bottom, left:right].copy()
+                key.box = (left, top, right - left, bottom - top)
+        if candidate:
+            self._window_until_ms = key.pos_ms + self.adaptive.candidate_window_sec * 1000.0
+        self._key = key
+
+    def _decide(self, bgr: np.ndarray, pos_ms: float, in_window: bool) -> tuple[str, str]:
+        height, width = bgr.shape[:2]
+        self._track_scale = min(1.0, self.TRACK_WIDTH / float(width))
+        small = bgr
+        if self._track_scale < 1.0:
+            small = cv2.resize(
+                bgr,
+                (self.TRACK_WIDTH, max(1, int(round(height * self._track_scale)))),
+                interpolation=cv2.INTER_AREA,
+            )
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        thumb = cv2.resize(gray, self.THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        hist = cv2.calcHist([gray], [0], None, [64], [0, 256])
+        cv2.normalize(hist, hist)
+
+        key = self._key
+        reason = None
+        if key is None:
+            reason = "first"
+        elif pos_ms - key.pos_ms >= self.adaptive.keyframe_interval_sec * 1000.0:
+            reason = "refresh"
+        elif cv2.compareHist(key.hist, hist, cv2.HISTCMP_BHATTACHARYYA) > self.adaptive.scene_change_threshold:
+            reason = "scene_change"
+        elif self._unchanged(key, thumb):
+            self.reused += 1
+            return ACTION_REUSE, "static"
+        elif key.template is not None:
+            if not self._track(key, gray):
+                reason = "track_lost"
+            elif in_window and not key.confirmed:
+                reason = "candidate"
+            else:
+                self.reused += 1
+                return ACTION_REUSE, "tracked"
+        else:
+            reason = "changed"
+
+        self.encoded += 1
+        self._pending = _Keyframe(pos_ms=pos_ms, gray=gray, thumb=thumb, hist=hist)
+        return ACTION_ENCODE, reason
+
+    def _unchanged(self, key: _Keyframe, thumb: np.ndarray) -> bool:
+        # A high percentile rather than the mean: a small face appearing in a static shot
+        # barely moves the average, but it is a large change where it appears.
+        change = float(np.percentile(cv2.absdiff(thumb, key.thumb), self.STATIC_PERCENTILE)) / 255.0
+        return change < self.adaptive.static_threshold
+
+    def _track(self, key: _Keyframe, gray: np.ndarray) -> bool:
+        """Find the keyframe face near its last position; updates `key.box` on success."""
+        x, y, w, h = key.box
+        height, width = gray.shape[:2]
+        x0, y0 = max(0, x - w), max(0, y - h)
+        x1, y1 = min(width, x + 2 * w), min(height, y + 2 * h)
+        region = gray[y0:y1, x0:x1]
+        if region.shape[0] < h or region.shape[1] < w:
+            return False
+        scores = cv2.matchTemplate(region, key.template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < self.adaptive.track_min_score:
+            return False
+        key.box = (x0 + bx, y0 + by, w, h)
+        return True
+
+
+@dataclass
+class SearchPolicy:
+    coarse_seconds: float = 10.0  # first pass: one frame every N seconds
+    fine_seconds: float = 1.0  # precision of range boundaries, and the finest pass
+    max_matches: int = 1  # stop once this many appearances are located (0 = find all)
+
+    @classmethod
+    def from_config(cls, config) -> "SearchPolicy":
+        return cls(
+            coarse_seconds=float(config["VIDEO_SEARCH_COARSE_SECONDS"]),
+            fine_seconds=float(config["VIDEO_SEARCH_FINE_SECONDS"]),
+            max_matches=int(config["VIDEO_SEARCH_MAX_MATCHES"]),
+        )
+
+
+@dataclass
+class TimeRange:
+    start_sec: float
+    end_sec: float
+
+
+class FrameReader:
+    """
+    Random access to single frames (seek + decode), for searches that look at a few
+    frames spread over a long video instead of decoding it front to back.
+    """
+
+    def __init__(self, video_path: str):
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise RuntimeError("Could not open video")
+        fps = _video_fps(self.cap)
+        self.frame_ms = 1000.0 / fps
+        self.duration_ms = float(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0) * self.frame_ms
+        self.reads = 0
+
+    def read_at(self, timestamp_ms: float) -> Optional[ExtractedFrame]:
+        with stage(STAGE_DECODE):
+            self.cap.set(cv2.CAP_PROP_POS_MSEC, float(timestamp_ms))
+            ok, frame = self.cap.read()
+            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if ok else None
         if not ok:
+            return None
+        self.reads += 1
+        return ExtractedFrame(
+            frame_path=None,
+            frame_index=int(round(timestamp_ms / self.frame_ms)),
+            timestamp_sec=int(timestamp_ms // 1000),
+            timestamp_ms=round(float(timestamp_ms), 3),
+            sample_index=self.reads - 1,
+            image=image,
+        )
+
+    def close(self) -> None:
+        self.cap.release()
+
+    def __enter__(self) -> "FrameReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def search_appearances(
+    video_path: str,
+    is_match: Callable[[ExtractedFrame], bool],
+    policy: Optional[SearchPolicy] = None,
+    max_seconds: Optional[int] = None,
+) -> list[TimeRange]:
+    """
+    Locate the time ranges where `is_match` holds, looking at as few frames as possible.
+
+    - coarse-to-fine: one frame every `coarse_seconds`, then passes at half the step
+      (only frames not looked at yet) down to `fine_seconds`, stopping at the first
+      pass that found anything
+    - every hit is refined right away: its start and end are bisected against the
+      nearest misses to `fine_seconds` precision
+    - stops as soon as `max_matches` ranges are located (early exit)
+    Ranges are returned in time order. An appearance shorter than the pass step can be
+    missed by that pass; with max_matches=1 the result is the earliest range seen at the
+    coarsest step that found one. When the container does not report its frame count, the
+    end is found first by reading forward (decoding only, `is_match` is not called).
+    """
+    policy = policy or SearchPolicy()
+    fine_ms = max(1, int(round(policy.fine_seconds * 1000)))
+    step_ms = max(fine_ms, int(round(policy.coarse_seconds * 1000)))
+    seen: dict[int, bool] = {}
+    ranges: list[TimeRange] = []
+
+    with FrameReader(video_path) as reader:
+        limit_ms = int(max_seconds * 1000) if max_seconds is not None else None
+        if reader.duration_ms > 0:
+            end_ms = int(reader.duration_ms - reader.frame_ms)
+            if limit_ms is not None:
+                end_ms = min(end_ms, limit_ms)
+        else:
+            end_ms = _last_readable_ms(reader, step_ms, fine_ms, limit_ms)
+
+        def probe(ms: int) -> bool:
+            if ms not in seen:
+                frame = reader.read_at(ms)
+                seen[ms] = frame is not None and is_match(frame)
+            return seen[ms]
+
+        def boundary(hit: int, direction: int, step: int) -> int:
+            # Walk `step` outwards while frames still match, then bisect hit/miss down to fine_ms.
+            while True:
+                nxt = min(max(hit + direction * step, 0), end_ms)
+                if nxt == hit:
+                    return hit
+                if not probe(nxt):
+                    miss = nxt
+                    break
+                hit = nxt
+            while abs(miss - hit) > fine_ms:
+                mid = (hit + miss) // 2
+                if probe(mid):
+                    hit = mid
+                else:
+                    miss = mid
+            return hit
+
+        while end_ms >= 0:
+            for t in range(0, end_ms + 1, step_ms):
+                if t in seen or any(r.start_sec * 1000 <= t <= r.end_sec * 1000 for r in ranges):
+                    continue
+                if probe(t):
+                    start, end = boundary(t, -1, step_ms), boundary(t, 1, step_ms)
+                    ranges.append(TimeRange(start_sec=start / 1000.0, end_sec=end / 1000.0))
+                    if policy.max_matches and len(ranges) >= policy.max_matches:
+                        return sorted(ranges, key=lambda r: r.start_sec)
+            if ranges or step_ms <= fine_ms:
+                break
+            step_ms = max(fine_ms, step_ms // 2)
+
+    return sorted(ranges, key=lambda r: r.start_sec)
+
+
+def _last_readable_ms(reader: FrameReader, step_ms: int, fine_ms: int, limit_ms: Optional[int]) -> int:
+    """
+    Timestamp of the last frame (to `fine_ms`) of a stream without a frame count: read
+    forward every `step_ms` until a read fails, then bisect. Raises if nothing decodes.
+    """
+    if reader.read_at(0) is None:
+        raise RuntimeError("Could not decode any frame of the video")
+    last, t = 0, step_ms
+    while limit_ms is None or last < limit_ms:
+        t = t if limit_ms is None else min(t, limit_ms)
+        if reader.read_at(t) is None:
             break
-        out_path = os.path.join(output_dir, f"frame_{sec:06d}.jpg")
-        cv2.imwrite(out_path, frame)
-        yield ExtractedFrame(frame_path=out_path, frame_index=frame_idx, timestamp_sec=sec)
+        last, t = t, t + step_ms
+    else:
+        return last
+    missing = t
+    while missing - last > fine_ms:
+        mid = (last + missing) // 2
+        if reader.read_at(mid) is not None:
+            last = mid
+        else:
+            missing = mid
+    return last
+
+
+def sample_frames(
+    video_path: str,
+    output_dir: str,
+    policy: Optional[SamplingPolicy] = None,
+    max_seconds: Optional[int] = None,
+) -> Iterator[ExtractedFrame]:
+    """
+    Like `iter_frames`, but also saves every sampled frame as a full-size JPG.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for fr in iter_frames(video_path, policy, max_seconds=max_seconds):
+        out_path = os.path.join(output_dir, frame_filename(fr))
+        cv2.imwrite(out_path, cv2.cvtColor(fr.image, cv2.COLOR_RGB2BGR))
+        fr.frame_path = out_path
+        yield fr
+
+
+def frame_filename(frame: ExtractedFrame) -> str:
+    return f"frame_{frame.sample_index:06d}.jpg"
+
+
+def persist_frame(
+    frame: ExtractedFrame,
+    output_dir: str,
+    persist_policy: str,
+    matched: bool,
+    thumbnail_max_side: int = 320,
+) -> Optional[str]:
+    """
+    Write a sampled frame to disk if the persist policy asks for it.
+    Returns the written path (also set on `frame.frame_path`), or None.
+    """
+    if persist_policy == PERSIST_NONE or frame.image is None:
+        return None
+    if persist_policy == PERSIST_MATCHES and not matched:
+        return None
+    if persist_policy not in (PERSIST_ALL, PERSIST_MATCHES, PERSIST_THUMBNAILS):
+        raise ValueError(f"Unknown frame persist policy: {persist_policy}")
+
+    image = frame.image
+    name = frame_filename(frame)
+    if persist_policy == PERSIST_THUMBNAILS:
+        height, width = image.shape[:2]
+        scale = thumbnail_max_side / float(max(height, width))
+        if scale < 1.0:
+            image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        name = name.replace(".jpg", "_thumb.jpg")
 
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, name)
+    cv2.imwrite(out_path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+    frame.frame_path = out_path
+    return out_path
+
+
+def extract_frames_one_per_second(
+    video_path: str,
+    output_dir: str,
+    max_seconds: Optional[int] = None,
+) -> Iterator[ExtractedFrame]:
+    """
+    Extract 1 frame per second from a video and save as JPG.
+    Thin wrapper over `sample_frames` (sequential decode, no seeking).
+    """
+    return sample_frames(video_path, output_dir, SamplingPolicy(), max_seconds=max_seconds)
+
+
+def estimate_sample_count(
+    video_path: str,
+    policy: Optional[SamplingPolicy] = None,
+    max_seconds: Optional[int] = None,
+) -> int:
+    """
+    Approximate number of frames `sample_frames` will produce, from container metadata.
+    Returns 0 when it cannot be known up front (unknown duration, keyframe sampling);
+    progress is then reported without a total. Adaptive sampling counts its fps grid only
+    (extra samples around candidate matches are not part of the total).
+    """
+    policy = policy or SamplingPolicy()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError("Could not open video")
+
+    fps = _video_fps(cap)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+
+    if total_frames <= 0 or policy.mode == SAMPLE_KEYFRAMES:
+        return 0
+    if max_seconds is not None:
+        total_frames = min(total_frames, int(max_seconds * fps))
+
+    if policy.mode == SAMPLE_EVERY_N:
+        every_n = max(1, int(policy.every_n))
+        return (total_frames + every_n - 1) // every_n
+
+    duration_sec = total_frames / fps
+    return max(1, int(round(duration_sec * policy.frames_per_second)))
+
+
+def split_time_ranges(
+    video_path: str,
+    policy: SamplingPolicy,
+    parts: int,
+    min_range_sec: float = 60.0,
+    max_range_sec: float = 300.0,
+) -> list[TimeRange]:
+    """
+    Cut a video into consecutive time ranges that `iter_frames(start_sec=, end_sec=)` can
+    decode independently (one process each): at least `parts` ranges when the video is long
+    enough, none shorter than `min_range_sec` nor longer than `max_range_sec`.
+    With fps sampling, range starts are on the sampling grid. The last range runs to the
+    end of the stream (container durations are approximate).
+    Returns a single range when splitting is not possible or not worth it: unknown
+    duration, keyframe/adaptive sampling, or a video shorter than two minimum ranges.
+    """
+    whole = [TimeRange(start_sec=0.0, end_sec=math.inf)]
+    if policy.mode not in (SAMPLE_FPS, SAMPLE_EVERY_N):
+        return whole
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError("Could not open video")
+    fps = _video_fps(cap)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
     cap.release()
 
+    duration_sec = total_frames / fps
+    count = max(int(parts), math.ceil(duration_sec / max(max_range_sec, 1e-6)))
+    count = min(count, int(duration_sec // max(min_range_sec, 1e-6)))
+    if count <= 1:
+        return whole
 
+    grid_sec = 1.0 / max(policy.frames_per_second, 1e-6) if policy.mode == SAMPLE_FPS else 0.0
+    bounds = [duration_sec * k / count for k in range(count)]
+    if grid_sec:
+        bounds = [round(b / grid_sec) * grid_sec for b in bounds]
+    bounds.append(math.inf)
+    return [TimeRange(start_sec=bounds[k], end_sec=bounds[k + 1]) for k in range(count)]
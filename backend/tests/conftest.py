@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from database import create_db_engine
+from embedding_codec import EMBEDDING_DIM
+from models import Base
+
+
+@pytest.fixture
+def app_config() -> dict:
+    """Extra app config; override with @pytest.mark.parametrize("app_config", [{...}])."""
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path: Path, app_config: dict):
+    """The app on a temporary SQLite database and upload folder, without background workers."""
+    from app import create_app
+    from services.admission import ADMISSION_GATES
+    from services.face_index import face_index
+    from services.truth_service import truth_gallery_cache
+
+    app = create_app(
+        start_job_runner=False,
+        config={
+            "TESTING": True,
+            "DATABASE_URL": f"sqlite:///{tmp_path / 'test.db'}",
+            "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+            "THUMBNAIL_CACHE_FOLDER": str(tmp_path / "thumbnails"),
+            "FACE_MODELS_PREWARM": False,
+            "VIDEO_JOBS_ENABLED": False,
+            "TRUTH_CACHE_CHECK_INTERVAL": 0.0,
+            **app_config,
+        },
+    )
+    # Process-wide caches must not carry state from another test's database.
+    truth_gallery_cache.invalidate()
+    face_index.invalidate()
+    yield app
+    for gate in ADMISSION_GATES:
+        gate.configure(0, 0, 30.0)
+    app.db_engine.dispose()  # type: ignore[attr-defined]
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def session_factory(tmp_path: Path):
+    """Sessions on a fresh database with the current schema (no app)."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def identities() -> np.ndarray:
+    """Well separated synthetic 128-d embeddings, one per identity."""
+    rng = np.random.default_rng(0)
+    return rng.normal(0.0, 0.1, size=(3, EMBEDDING_DIM)).astype(np.float32)
+
+
+@pytest.fixture
+def make_video(tmp_path: Path):
+    """
+    make_video(seconds, fps=10) -> path of a small synthetic MP4 whose frames all differ.
+    `draw(n) -> BGR image` replaces the default frames (`size` is then the image size).
+    """
+
+    def make(
+        seconds: float, fps: int = 10, name: str = "video.mp4", draw=None, size: tuple[int, int] = (64, 48)
+    ) -> Path:
+        return _write_video(tmp_path / name, seconds, fps, size, draw)
+
+    return make
+
+
+def _write_video(path: Path, seconds: float, fps: int, size: tuple[int, int], draw=None) -> Path:
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for n in range(int(seconds * fps)):
+        if draw is not None:
+            writer.write(draw(n))
+            continue
+        frame = np.full((size[1], size[0], 3), n % 256, dtype=np.uint8)
+        cv2.putText(frame, str(n), (2, size[1] - 4), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+        writer.write(frame)
+    writer.release()
+    return path
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import cv2
+import numpy as np
+import pytest
+
+from services.video_service import (
+    ACTION_ENCODE,
+    SAMPLE_ADAPTIVE,
+    AdaptivePolicy,
+    AdaptiveSampler,
+    SamplingPolicy,
+)
+
+FPS = 5
+SIZE = (160, 120)
+POLICY = SamplingPolicy(SAMPLE_ADAPTIVE, 1.0)
+ADAPTIVE = AdaptivePolicy(dense_fps=4.0, keyframe_interval_sec=10.0, candidate_window_sec=2.0)
+
+
+def _scene() -> np.ndarray:
+    """A still shot: gradient background with a few shapes."""
+    ramp = np.linspace(40, 200, SIZE[0], dtype=np.uint8)
+    frame = np.repeat(np.repeat(ramp[None, :, None], SIZE[1], axis=0), 3, axis=2)
+    cv2.rectangle(frame, (10, 10), (50, 40), (0, 0, 255), -1)
+    cv2.circle(frame, (110, 80), 20, (0, 255, 0), -1)
+    return frame
+
+
+def _other_scene() -> np.ndarray:
+    """A different shot: a dark room with one bright window."""
+    frame = np.full((SIZE[1], SIZE[0], 3), 20, dtype=np.uint8)
+    cv2.rectangle(frame, (100, 20), (140, 60), (230, 230, 230), -1)
+    return frame
+
+
+def _steps(video: str, report=None) -> list[tuple[float, str, str]]:
+    """(timestamp ms, action, reason) of every sample; `report(step)` answers each encode."""
+    sampler = AdaptiveSampler(video, POLICY, ADAPTIVE)
+    steps = []
+    for step in sampler:
+        steps.append((step.frame.timestamp_ms, step.action, step.reason))
+        if step.action == ACTION_ENCODE:
+            sampler.report(*(report(step) if report else (None,)))
+    return steps
+
+
+def _encodes(steps) -> list[tuple[float, str]]:
+    return [(round(ms), reason) for ms, action, reason in steps if action == ACTION_ENCODE]
+
+
+def test_static_shot_is_encoded_only_first_and_on_refresh(make_video):
+    video = make_video(25, fps=FPS, draw=lambda n: _scene(), size=SIZE)
+
+    steps = _steps(str(video))
+
+    assert len(steps) == 25  # one sample a second
+    assert _encodes(steps) == [(0, "first"), (10000, "refresh"), (20000, "refresh")]
+    assert {reason for _, _, reason in steps} == {"first", "refresh", "static"}
+
+
+def test_object_entering_the_shot_is_encoded(make_video):
+    def draw(n):
+        frame = _scene()
+        if n >= 3 * FPS:  # someone walks in at 3 s
+            cv2.rectangle(frame, (60, 30), (95, 75), (255, 255, 255), -1)
+        return frame
+
+    steps = _steps(str(make_video(6, fps=FPS, draw=draw, size=SIZE)))
+
+    assert _encodes(steps)[:2] == [(0, "first"), (3000, "changed")]
+    assert len(_encodes(steps)) == 2  # still again afterwards
+
+
+def test_cut_is_encoded_as_a_scene_change(make_video):
+    steps = _steps(str(make_video(6, fps=FPS, draw=lambda n: _other_scene() if n >= 4 * FPS else _scene(), size=SIZE)))
+
+    assert _encodes(steps) == [(0, "first"), (4000, "scene_change")]
+
+
+def test_candidate_report_samples_at_the_dense_rate(make_video):
+    video = make_video(6, fps=20, draw=lambda n: _scene(), size=SIZE)
+
+    def report(step):
+        # The first face is a near miss: the next candidate_window_sec is sampled densely.
+        return ((10, 50, 40, 10), True, False) if step.reason == "first" else (None,)
+
+    times = [ms for ms, _, _ in _steps(str(video), report)]
+
+    assert times[:10] == pytest.approx([0, 250, 500, 750, 1000, 1250, 1500, 1750, 2000, 3000], abs=1)
+    assert times[10:] == pytest.approx([4000, 5000], abs=1)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import io
+import threading
+
+import pytest
+
+from services.admission import (
+    REJECT_QUEUE_FULL,
+    REJECT_QUEUE_TIMEOUT,
+    AdmissionGate,
+    face_admission,
+    rescore_admission,
+    upload_admission,
+)
+
+
+def _gate(max_active: int, max_queued: int, queue_timeout: float = 5.0) -> AdmissionGate:
+    gate = AdmissionGate("test")
+    gate.configure(max_active, max_queued, queue_timeout)
+    return gate
+
+
+def test_unconfigured_gate_admits_everything():
+    gate = AdmissionGate("test")
+    assert all(gate.acquire() is None for _ in range(50))
+
+
+def test_full_queue_is_refused_with_429():
+    gate = _gate(1, 0)
+    assert gate.acquire() is None
+
+    rejection = gate.acquire()
+
+    assert (rejection.status, rejection.reason) == (429, REJECT_QUEUE_FULL)
+    assert rejection.retry_after >= 1
+    assert gate.stats()["rejected"][REJECT_QUEUE_FULL] == 1
+
+
+def test_waiting_too_long_is_refused_with_503():
+    gate = _gate(1, 1, queue_timeout=0.05)
+    assert gate.acquire() is None
+
+    rejection = gate.acquire()
+
+    assert (rejection.status, rejection.reason) == (503, REJECT_QUEUE_TIMEOUT)
+    assert gate.queued == 0  # the timed-out waiter left the queue
+
+
+def test_released_slot_goes_to_the_oldest_waiter():
+    gate = _gate(1, 2)
+    assert gate.acquire() is None
+    order, threads = [], []
+    for n in range(2):
+        thread = threading.Thread(target=lambda n=n: order.append((n, gate.acquire())))
+        thread.start()
+        threads.append(thread)
+        while gate.queued != n + 1:  # queue them in a known order
+            pass
+
+    gate.release(0.1)
+    threads[0].join(2)
+    gate.release(0.1)
+    threads[1].join(2)
+
+    assert order == [(0, None), (1, None)]
+    assert gate.stats()["active"] == 1
+
+
+def _photo() -> dict:
+    return {"files": (io.BytesIO(b"not really a jpeg"), "a.jpg")}
+
+
+@pytest.mark.parametrize(
+    ("gate", "method", "path", "data"),
+    [
+        (face_admission, "post", "/api/test-images", _photo),
+        (face_admission, "post", "/api/faces/search", lambda: {"file": (io.BytesIO(b"x"), "q.jpg")}),
+        (face_admission, "post", "/api/truth-image", lambda: {"file": (io.BytesIO(b"x"), "t.jpg")}),
+        (upload_admission, "post", "/api/test-videos", lambda: {"files": (io.BytesIO(b"x"), "v.mp4")}),
+        (rescore_admission, "post", "/api/results/rescore", dict),
+    ],
+    ids=["test-images", "face-search", "truth-image", "test-videos", "rescore"],
+)
+def test_busy_endpoint_answers_429_with_retry_after(client, gate, method, path, data):
+    gate.configure(1, 0, 0.1)
+    assert gate.acquire() is None  # another request holds the only slot
+    try:
+        response = getattr(client, method)(path, data=data(), content_type="multipart/form-data")
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert response.get_json()["retry_after"] == int(response.headers["Retry-After"])
+    finally:
+        gate.release(0.0)
+
+
+def test_busy_endpoint_answers_503_after_waiting(client):
+    face_admission.configure(1, 1, 0.05)
+    assert face_admission.acquire() is None
+    try:
+        response = client.post("/api/test-images", data=_photo(), content_type="multipart/form-data")
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+    finally:
+        face_admission.release(0.0)
+
+
+def test_slot_is_released_once_the_response_is_closed(client):
+    face_admission.configure(1, 0, 0.1)
+
+    response = client.post("/api/test-images", data={}, content_type="multipart/form-data")
+    response.close()
+
+    assert response.status_code == 400  # no file: refused by the view, not by the gate
+    assert face_admission.stats()["active"] == 0
+
+
+def test_rescore_runs_one_at_a_time_by_default(client):
+    assert rescore_admission.acquire() is None  # a re-score is running
+    try:
+        response = client.post("/api/results/rescore", json={})
+    finally:
+        rescore_admission.release(0.0)
+
+    assert response.status_code == 429
+    assert client.post("/api/results/rescore", json={}).status_code == 200
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import io
+import json
+import random
+import tarfile
+import zipfile
+
+import pytest
+from sqlalchemy import func, select
+
+import services.archive_ingest
+from models import TestImage
+
+
+@pytest.fixture
+def ingest(app, client, monkeypatch):
+    """ingest(data, **post kwargs) -> the NDJSON events of one archive upload (no face found in any image)."""
+    monkeypatch.setattr(
+        services.archive_ingest, "faces_for_uploads", lambda sessions, uploads, workers: [None] * len(uploads)
+    )
+    app.config.update(ARCHIVE_BATCH_SIZE=2)
+
+    def post(data: bytes, multipart: bool = True):
+        if multipart:
+            response = client.post(
+                "/api/test-images/archive",
+                data={"file": (io.BytesIO(data), "images.zip")},
+                content_type="multipart/form-data",
+            )
+        else:
+            response = client.post("/api/test-images/archive", data=data, content_type="application/x-tar")
+        body = response.get_data(as_text=True)
+        response.close()  # frees the face admission slot
+        if response.status_code != 200:
+            return response.status_code, response.get_json()
+        return response.status_code, [json.loads(line) for line in body.splitlines()]
+
+    return post
+
+
+def _image(seed: int, size: int = 4096) -> bytes:
+    """Distinct, incompressible file content (the images are never decoded: no face is found)."""
+    return random.Random(seed).randbytes(size)
+
+
+def _zip(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _tar(files: dict[str, bytes], mode: str = "w:gz") -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def _stored(app) -> int:
+    with app.session_local() as db:
+        return db.scalar(select(func.count(TestImage.id)))
+
+
+def test_zip_entries_are_ingested_in_batches_and_skips_counted(app, ingest):
+    app.config.update(ARCHIVE_MAX_ENTRY_MB=1)
+    data = _zip(
+        {
+            "a.jpg": _image(1),
+            "dir/b.PNG": _image(2),
+            "dir/c.webp": _image(3),
+            "notes.txt": b"not an image",
+            "__MACOSX/dir/._b.PNG": b"resource fork",
+            "huge.jpg": b"\0" * (1024 * 1024 + 1),
+        }
+    )
+
+    status, events = ingest(data)
+
+    assert status == 200
+    progress, done = events[:-1], events[-1]
+    assert [len(e["results"]) for e in progress] == [2, 1]
+    assert [r["entry"] for e in progress for r in e["results"]] == ["a.jpg", "dir/b.PNG", "dir/c.webp"]
+    assert done["event"] == "done" and done["error"] is None
+    assert (done["entries"], done["images"], done["processed"]) == (6, 3, 3)
+    assert done["skipped"] == {"not_image": 2, "too_large": 1}
+    assert _stored(app) == 3
+
+
+def test_tar_body_is_read_as_a_stream(app, ingest):
+    files = {f"img/{n}.jpg": _image(n) for n in range(5)}
+
+    status, events = ingest(_tar(files), multipart=False)
+
+    assert status == 200
+    assert events[-1]["processed"] == 5 and events[-1]["error"] is None
+    assert _stored(app) == 5
+
+
+def test_truncated_tar_keeps_the_batches_read_before_the_break(app, ingest):
+    data = _tar({f"{n}.jpg": _image(n, 16 * 1024) for n in range(8)})
+
+    status, events = ingest(data[: len(data) * 6 // 10], multipart=False)
+
+    done = events[-1]
+    assert status == 200
+    assert done["error"].startswith("Archive could not be read to the end")
+    assert 0 < done["processed"] < 8
+    assert _stored(app) == done["processed"]
+
+
+def test_truncated_or_foreign_uploads_are_rejected(ingest):
+    data = _zip({"a.jpg": _image(1)})
+
+    assert ingest(data[: len(data) // 2])[0] == 400  # the ZIP directory is at the end
+    assert ingest(b"just some bytes, not an archive")[0] == 400
+
+
+def test_entries_beyond_max_entries_are_not_read(app, ingest):
+    app.config.update(ARCHIVE_MAX_ENTRIES=3)
+
+    status, events = ingest(_zip({f"{n}.jpg": _image(n) for n in range(5)}))
+
+    done = events[-1]
+    assert done["error"] == "Archive has more than 3 entries; the rest was not read"
+    assert done["processed"] == 3
+    assert _stored(app) == 3
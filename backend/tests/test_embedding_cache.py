@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import event, func, select, update
+
+from models import EmbeddingCacheEntry
+from services.embedding_cache import IMAGE_FRAME_MS, EmbeddingCache
+from services.face_service import DetectedFaces
+
+
+def _faces(seed: int) -> DetectedFaces:
+    rng = np.random.default_rng(seed)
+    return DetectedFaces(
+        embeddings=rng.normal(0.0, 0.1, size=(1, 128)).astype(np.float32),
+        boxes=np.array([[1, 2, 3, 0]], dtype=np.int32),
+    )
+
+
+def _count(session_factory) -> int:
+    with session_factory() as db:
+        return db.scalar(select(func.count(EmbeddingCacheEntry.id)))
+
+
+def test_storing_a_cached_key_again_is_a_no_op(session_factory):
+    cache = EmbeddingCache()
+    key = ("a" * 64, IMAGE_FRAME_MS)
+    for seed in (1, 2):
+        with session_factory() as db:
+            cache.store(db, {key: _faces(seed), ("b" * 64, 0): None})
+            db.commit()
+
+    with session_factory() as db:
+        found = cache.lookup(db, [key, ("b" * 64, 0)])
+    assert _count(session_factory) == 2
+    np.testing.assert_array_equal(found[key].embeddings, _faces(1).embeddings)  # the first store wins
+    assert found[("b" * 64, 0)] is None
+
+
+def test_two_sessions_storing_the_same_key_both_succeed(session_factory):
+    # Both transactions are open before either commits: a check-then-insert would let both
+    # insert, and the second commit would fail on uq_embedding_cache_key.
+    cache = EmbeddingCache()
+    entries = {("c" * 64, ms): _faces(ms) for ms in range(0, 5000, 1000)}
+    first, second = session_factory(), session_factory()
+    errors = []
+
+    def store_second():
+        try:
+            cache.store(second, entries)
+            second.commit()
+        except Exception as e:  # noqa: BLE001 - reported by the assertion below
+            errors.append(e)
+
+    try:
+        cache.store(first, entries)
+        stored_second = threading.Thread(target=store_second)
+        stored_second.start()
+        time.sleep(0.3)  # the second store is now waiting for SQLite's write lock
+        first.commit()
+        stored_second.join(10)
+        assert not stored_second.is_alive()
+    finally:
+        first.close()
+        second.close()
+
+    assert errors == []
+    assert _count(session_factory) == len(entries)
+
+
+def test_other_variants_are_separate_entries(session_factory):
+    key = ("d" * 64, IMAGE_FRAME_MS)
+    with session_factory() as db:
+        EmbeddingCache(variant="default").store(db, {key: _faces(1)})
+        EmbeddingCache(variant="fast:hog").store(db, {key: _faces(2)})
+        db.commit()
+    assert _count(session_factory) == 2
+
+
+def _fill(session_factory, cache: EmbeddingCache, n: int, start: int = 0) -> None:
+    with session_factory() as db:
+        cache.store(db, {(f"{i:064d}", IMAGE_FRAME_MS): None for i in range(start, start + n)})
+        db.commit()
+
+
+def test_evict_drops_least_recently_used_entries_below_the_bound(session_factory):
+    cache = EmbeddingCache(max_entries=10)
+    _fill(session_factory, cache, 12)
+    with session_factory() as db:  # entry 0 was used recently, so it survives
+        db.execute(
+            update(EmbeddingCacheEntry)
+            .where(EmbeddingCacheEntry.content_hash == f"{0:064d}")
+            .values(last_used_at=datetime.utcnow() + timedelta(hours=1))
+        )
+        db.commit()
+
+    with session_factory() as db:
+        removed = cache.evict(db)
+        db.commit()
+        kept = set(db.scalars(select(EmbeddingCacheEntry.content_hash)))
+
+    assert removed == 3  # down to 90% of max_entries
+    assert f"{0:064d}" in kept
+    assert {f"{i:064d}" for i in (1, 2, 3)}.isdisjoint(kept)
+
+
+def test_evict_only_counts_when_the_bound_may_be_exceeded(session_factory):
+    cache = EmbeddingCache(max_entries=10, evict_interval=3600)
+    counts = []
+
+    def count_statements(conn, cursor, statement, *args):
+        if "count(" in statement.lower():
+            counts.append(statement)
+
+    with session_factory() as db:
+        engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", count_statements)
+    try:
+        for step in range(5):
+            _fill(session_factory, cache, 2, start=2 * step)
+            with session_factory() as db:
+                assert cache.evict(db) == 0
+        assert len(counts) == 1  # the first call; later stores stay under the bound
+
+        _fill(session_factory, cache, 1, start=10)
+        with session_factory() as db:
+            assert cache.evict(db) == 2
+            db.commit()
+        assert len(counts) == 2
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statements)
+
+
+def test_disabled_cache_stores_nothing(session_factory):
+    cache = EmbeddingCache(enabled=False)
+    _fill(session_factory, cache, 3)
+    assert _count(session_factory) == 0
+
+
+def test_lookups_write_only_entries_not_used_within_the_evict_interval(session_factory):
+    cache = EmbeddingCache(max_entries=100, evict_interval=3600)
+    fresh, stale = (f"{0:064d}", IMAGE_FRAME_MS), (f"{1:064d}", IMAGE_FRAME_MS)
+    _fill(session_factory, cache, 2)
+    two_hours_ago = datetime.utcnow() - timedelta(hours=2)
+    with session_factory() as db:
+        db.execute(
+            update(EmbeddingCacheEntry)
+            .where(EmbeddingCacheEntry.content_hash == stale[0])
+            .values(last_used_at=two_hours_ago)
+        )
+        db.commit()
+    updates = []
+
+    def count_updates(conn, cursor, statement, *args):
+        if statement.lstrip().lower().startswith("update"):
+            updates.append(statement)
+
+    with session_factory() as db:
+        engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", count_updates)
+    try:
+        for _ in range(3):
+            with session_factory() as db:
+                assert set(cache.lookup(db, [fresh, stale])) == {fresh, stale}
+                db.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", count_updates)
+
+    def row(key):
+        with session_factory() as db:
+            return db.execute(
+                select(EmbeddingCacheEntry.hits, EmbeddingCacheEntry.last_used_at).where(
+                    EmbeddingCacheEntry.content_hash == key[0]
+                )
+            ).one()
+
+    assert len(updates) == 1  # the stale entry, once; then it is recent again
+    assert row(stale).hits == 1 and row(stale).last_used_at > two_hours_ago
+    assert row(fresh).hits == 0
+    assert cache.hits == 6
+
+    with session_factory() as db:  # the next eviction check writes the held-back hits
+        cache.evict(db)
+        db.commit()
+    assert (row(fresh).hits, row(stale).hits) == (3, 3)
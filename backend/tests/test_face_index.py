@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import io
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from embedding_codec import EMBEDDING_DIM
+from models import TestImage
+from services.face_index import SOURCE_TEST_IMAGE, FaceIndex, FaceIndexNotReady, face_index, search_faces
+from services.face_service import DetectedFaces, stored_faces
+
+
+@pytest.fixture
+def faces(identities) -> np.ndarray:
+    """Twenty stored faces: identity 0 and 19 others."""
+    rng = np.random.default_rng(7)
+    others = rng.normal(0.0, 0.1, size=(19, EMBEDDING_DIM)).astype(np.float32)
+    return np.concatenate([identities[:1], others])
+
+
+def _store(session_factory, rows: list[dict]) -> list[int]:
+    with session_factory() as db:
+        images = [TestImage(image_path=f"{n}.jpg", match_status="NO_MATCH", **row) for n, row in enumerate(rows)]
+        db.add_all(images)
+        db.commit()
+        return [i.id for i in images]
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    face_index.configure(exact_max=200_000, nprobe=32, rebuild_ratio=0.2)
+    yield
+    face_index.invalidate()
+
+
+def test_exact_search_returns_the_nearest_rows_first(session_factory, faces):
+    ids = _store(session_factory, [{"embedding": f.tobytes()} for f in faces])
+
+    with session_factory() as db:
+        hits = search_faces(db, faces[0] + 0.001, k=3)
+
+    assert [h.row_id for h in hits][0] == ids[0]
+    assert all(h.source == SOURCE_TEST_IMAGE for h in hits)
+    assert [h.distance for h in hits] == sorted(h.distance for h in hits)
+
+
+def test_new_rows_are_found_after_the_first_search(session_factory, faces):
+    _store(session_factory, [{"embedding": f.tobytes()} for f in faces[1:]])
+    with session_factory() as db:
+        search_faces(db, faces[0], k=1)
+    (new_id,) = _store(session_factory, [{"embedding": faces[0].tobytes()}])
+
+    with session_factory() as db:
+        assert search_faces(db, faces[0], k=1)[0].row_id == new_id
+
+
+@pytest.mark.parametrize("exact_max", [200_000, 10], ids=["exact", "ivf"])
+def test_every_face_of_a_group_photo_is_searchable_and_reported_once(session_factory, faces, identities, exact_max):
+    face_index.configure(exact_max=exact_max, nprobe=32, rebuild_ratio=0.2)
+    group = DetectedFaces(
+        embeddings=np.stack([faces[5], faces[6], identities[1]]),
+        boxes=np.array([[0, 90, 90, 0], [0, 190, 90, 100], [100, 40, 140, 0]], dtype=np.int32),
+    )
+    rows = [{"embedding": f.tobytes()} for f in faces]
+    rows.append({"embedding": faces[5].tobytes(), "face_box": "[0, 90, 90, 0]", **stored_faces(group)})
+    *_, group_id = _store(session_factory, rows)
+
+    with session_factory() as db:
+        hits = search_faces(db, identities[1], k=5)
+
+    assert face_index.mode == ("ivf" if exact_max == 10 else "exact")
+    assert hits[0].row_id == group_id  # found by a face that is not the kept one
+    assert hits[0].distance == pytest.approx(0.0, abs=1e-5)
+    assert hits[0].face_box == (100, 40, 140, 0)
+    assert len({h.row_id for h in hits}) == 5
+
+
+def test_search_widens_past_rows_that_fill_several_slots():
+    index = FaceIndex()
+    index._build(
+        np.zeros((6, EMBEDDING_DIM), dtype=np.float32) + np.arange(6, dtype=np.float32)[:, None] * 0.01,
+        np.zeros(6, dtype=np.int8),
+        np.array([1, 1, 1, 1, 2, 3]),
+    )
+
+    hits = index.search(np.zeros(EMBEDDING_DIM, dtype=np.float32), k=3)
+
+    assert [h.row_id for h in hits] == [1, 2, 3]
+
+
+def test_rows_committed_out_of_id_order_are_picked_up_by_the_sweep(session_factory, faces):
+    now = datetime.utcnow()
+    _store(session_factory, [{"id": 10, "embedding": faces[1].tobytes(), "created_at": now}])
+    with session_factory() as db:
+        search_faces(db, faces[1], k=1)
+    # Took id 5 before id 10 was committed, committed only now.
+    _store(session_factory, [{"id": 5, "embedding": faces[0].tobytes(), "created_at": now - timedelta(seconds=5)}])
+
+    with session_factory() as db:
+        face_index.refresh(db, sweep=False)
+        assert face_index.search(faces[0], k=1)[0].row_id == 10  # not above the highest id seen
+        face_index.refresh(db, sweep=True)
+        face_index.refresh(db, sweep=True)
+        assert face_index.search(faces[0], k=1)[0].row_id == 5
+    assert face_index.stats()["faces"] == 2  # loaded once
+
+
+def _wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def blocked_sessions(session_factory):
+    """(sessions, release): the background builder waits for `release` before reading the DB."""
+    release = threading.Event()
+
+    def sessions():
+        release.wait(5)
+        return session_factory()
+
+    yield sessions, release
+    release.set()
+    face_index.shutdown()
+
+
+def test_background_build_keeps_searches_off_the_full_load(session_factory, faces, blocked_sessions):
+    ids = _store(session_factory, [{"embedding": f.tobytes()} for f in faces])
+    sessions, release = blocked_sessions
+    face_index.start(sessions, interval=0.05)
+
+    with session_factory() as db:
+        with pytest.raises(FaceIndexNotReady):
+            search_faces(db, faces[0], k=1)
+    release.set()
+
+    assert _wait_until(lambda: face_index.ready)
+    (new_id,) = _store(session_factory, [{"embedding": (faces[3] + 0.001).tobytes()}])
+    with session_factory() as db:
+        assert search_faces(db, faces[0], k=1)[0].row_id == ids[0]
+        assert search_faces(db, faces[3], k=2)[1].row_id == new_id  # topped up on the search
+
+
+def test_face_search_answers_503_while_the_index_is_building(client, blocked_sessions):
+    sessions, _ = blocked_sessions
+    face_index.start(sessions, interval=0.05)
+
+    response = client.post(
+        "/api/faces/search", data={"file": (io.BytesIO(b"x"), "q.jpg")}, content_type="multipart/form-data"
+    )
+    response.close()  # frees the face admission slot
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import logging
+import re
+
+import pytest
+from PIL import Image
+
+from services import face_service
+from services.face_service import extract_faces_batch
+
+
+@pytest.fixture
+def pool_cleanup():
+    yield
+    face_service._reset_pool()
+
+
+def _failures(caplog) -> list[tuple[str, str]]:
+    """(input, error type) of each logged extraction failure, in log order."""
+    found = (re.match(r"Face extraction failed for (.+?): (\w+):", r.getMessage()) for r in caplog.records)
+    return [m.groups() for m in found if m]
+
+
+def test_pool_keeps_order_isolates_failures_and_stays_warm(tmp_path, caplog, pool_cleanup):
+    paths = []
+    for n, color in enumerate(("red", "green", "blue")):
+        paths.append(str(tmp_path / f"plain_{n}.png"))
+        Image.new("RGB", (80, 60), color).save(paths[-1])
+    corrupt = tmp_path / "corrupt.jpg"
+    corrupt.write_bytes(b"not a jpeg")
+    missing = str(tmp_path / "missing.jpg")
+    batch = [paths[0], missing, paths[1], str(corrupt), paths[2]]
+
+    with caplog.at_level(logging.WARNING, logger=face_service.__name__):
+        first = extract_faces_batch(batch, workers=2)
+        pool = face_service._pool
+        pids = set(pool._processes)
+        second = extract_faces_batch(list(reversed(batch)), workers=2)
+
+    # No face in plain colors; each failure is reported against its own input, in input order.
+    assert first == second == [None] * 5
+    not_found, not_an_image = (missing, "FileNotFoundError"), (str(corrupt), "UnidentifiedImageError")
+    assert _failures(caplog) == [not_found, not_an_image, not_an_image, not_found]
+    assert face_service._pool is pool and set(pool._processes) == pids  # the same warm workers
+    assert len(pids) == 2
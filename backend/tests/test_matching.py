@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from embedding_codec import EMBEDDING_DIM
+from services.face_service import (
+    DetectedFaces,
+    DetectionProfile,
+    TruthGallery,
+    match_embeddings,
+    match_faces,
+    score_embedding_matrix,
+)
+
+THRESHOLD = 0.5
+
+
+@pytest.fixture
+def gallery(identities) -> TruthGallery:
+    return TruthGallery.build([11, 12, 13], ["ann", "bob", "cat"], identities)
+
+
+def test_gallery_distances_equal_euclidean(gallery, identities):
+    queries = np.random.default_rng(3).normal(0.0, 0.1, size=(5, EMBEDDING_DIM)).astype(np.float32)
+    expected = np.linalg.norm(queries[:, None, :] - identities[None, :, :], axis=2)
+    np.testing.assert_allclose(gallery.distances(queries), expected, rtol=1e-4, atol=1e-5)
+
+
+def test_score_matrix_agrees_with_per_face_matching(gallery, identities):
+    rng = np.random.default_rng(4)
+    queries = np.concatenate([identities + rng.normal(0.0, 0.01, identities.shape), rng.normal(0.0, 0.1, (4, 128))])
+    queries = queries.astype(np.float32)
+
+    scores = score_embedding_matrix(gallery, queries, THRESHOLD)
+    results = match_embeddings(gallery, list(queries), THRESHOLD)
+
+    assert scores.match_status.tolist() == [r.match_status for r in results]
+    assert scores.truth_image_id.tolist() == [r.truth_image_id for r in results]
+    assert scores.confidence_score.tolist() == pytest.approx([r.confidence_score for r in results], abs=1e-3)
+    assert scores.truth_image_id[:3].tolist() == [11, 12, 13]
+    assert set(scores.match_status[:3]) == {"MATCH"}
+
+
+def test_score_matrix_without_gallery_is_no_truth():
+    scores = score_embedding_matrix(None, np.zeros((2, EMBEDDING_DIM), dtype=np.float32), THRESHOLD)
+    assert scores.match_status.tolist() == ["NO_TRUTH", "NO_TRUTH"]
+    assert scores.truth_image_id.tolist() == [-1, -1]
+
+
+def test_match_faces_keeps_the_face_closest_to_an_enrolled_person(gallery, identities):
+    stranger = np.full(EMBEDDING_DIM, 0.3, dtype=np.float32)
+    group = DetectedFaces(
+        embeddings=np.stack([stranger, identities[1]]),
+        boxes=np.array([[0, 200, 200, 0], [10, 60, 60, 10]], dtype=np.int32),
+    )
+    alone = DetectedFaces(embeddings=stranger[None, :], boxes=np.array([[1, 2, 3, 0]], dtype=np.int32))
+
+    results, kept = match_faces(gallery, [group, None, alone], THRESHOLD)
+
+    assert [r.match_status for r in results] == ["MATCH", "NO_FACE", "NO_MATCH"]
+    assert results[0].truth_image_id == 12 and results[0].face_box == (10, 60, 60, 10)
+    np.testing.assert_array_equal(kept[0], identities[1])
+    assert kept[1] is None
+
+
+def test_match_faces_without_gallery_keeps_the_largest_face(identities):
+    faces = DetectedFaces(embeddings=identities[:2], boxes=np.array([[0, 9, 9, 0], [0, 3, 3, 0]], dtype=np.int32))
+
+    results, kept = match_faces(None, [faces], THRESHOLD)
+
+    assert results[0].match_status == "NO_TRUTH"
+    assert results[0].face_box == (0, 9, 9, 0)
+    np.testing.assert_array_equal(kept[0], identities[0])
+
+
+@pytest.mark.parametrize(
+    ("profile", "variant"),
+    [
+        (DetectionProfile(), "default"),
+        (DetectionProfile(num_jitters=2), "accurate:hog:u1:j2:small"),
+        (DetectionProfile(mode="fast"), "fast:hog:u1:j1:small:d1280:e150"),
+        (DetectionProfile(max_faces=4), "accurate:hog:u1:j1:small:f4"),
+    ],
+)
+def test_cache_variant_names_every_setting_that_changes_embeddings(profile, variant):
+    assert profile.cache_variant == variant
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+from sqlalchemy import inspect, text
+
+from database import create_db_engine
+from embedding_codec import EMBEDDING_DIM
+from migrations import _swap_to_blob_column, upgrade_schema
+from models import Base
+
+# The schema of the first release (before any migration existed).
+BASELINE_DDL = [
+    "CREATE TABLE truth_images (id INTEGER PRIMARY KEY AUTOINCREMENT, image_path VARCHAR NOT NULL, "
+    "embedding TEXT NOT NULL, created_at DATETIME)",
+    "CREATE TABLE test_images (id INTEGER PRIMARY KEY AUTOINCREMENT, image_path VARCHAR NOT NULL, "
+    "match_status VARCHAR NOT NULL, confidence_score FLOAT NOT NULL, created_at DATETIME)",
+    "CREATE TABLE test_videos (id INTEGER PRIMARY KEY AUTOINCREMENT, video_path VARCHAR NOT NULL, created_at DATETIME)",
+    "CREATE TABLE video_matches (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "video_id INTEGER NOT NULL REFERENCES test_videos (id), frame_path VARCHAR NOT NULL, "
+    "match_status VARCHAR NOT NULL, confidence_score FLOAT NOT NULL)",
+]
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """A first-release database with two truth uploads, one test image and a 4-second video."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(0.0, 0.1, size=(2, EMBEDDING_DIM)).tolist()
+    with engine.begin() as conn:
+        for ddl in BASELINE_DDL:
+            conn.execute(text(ddl))
+        conn.execute(
+            text("INSERT INTO truth_images (image_path, embedding, created_at) VALUES (:p, :e, '2024-01-01 00:00:00')"),
+            [{"p": f"truth/{n}.jpg", "e": json.dumps(e)} for n, e in enumerate(embeddings)],
+        )
+        conn.execute(
+            text(
+                "INSERT INTO test_images (image_path, match_status, confidence_score, created_at) "
+                "VALUES ('test/a.jpg', 'MATCH', 91.5, '2024-01-02 00:00:00')"
+            )
+        )
+        conn.execute(text("INSERT INTO test_videos (video_path, created_at) VALUES ('videos/v.mp4', '2024-01-03 00:00:00')"))
+        conn.execute(
+            text(
+                "INSERT INTO video_matches (video_id, frame_path, match_status, confidence_score) "
+                "VALUES (1, :path, :status, :confidence)"
+            ),
+            [
+                {"path": "videos/v/frame_000000.jpg", "status": "NO_FACE", "confidence": 0.0},
+                {"path": "videos/v/frame_000001.jpg", "status": "MATCH", "confidence": 80.0},
+                {"path": "videos/v/frame_000002.jpg", "status": "MATCH", "confidence": 82.0},
+                {"path": "videos/v/frame_000003.jpg", "status": "NO_MATCH", "confidence": 10.0},
+            ],
+        )
+    yield engine, embeddings
+    engine.dispose()
+
+
+def _upgrade(engine) -> None:
+    Base.metadata.create_all(engine)
+    upgrade_schema(engine)
+
+
+def test_baseline_database_gets_every_current_column_and_index(baseline):
+    engine, _ = baseline
+    _upgrade(engine)
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {c.name for c in table.columns} <= {c["name"] for c in inspector.get_columns(table.name)}, table.name
+        assert {i.name for i in table.indexes} <= {i["name"] for i in inspector.get_indexes(table.name)}, table.name
+
+
+def test_json_truth_embeddings_become_float32_blobs(baseline):
+    engine, embeddings = baseline
+    _upgrade(engine)
+
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT embedding FROM truth_images ORDER BY id")).scalars().all()
+    assert all(isinstance(blob, bytes) and len(blob) == EMBEDDING_DIM * 4 for blob in stored)
+    np.testing.assert_allclose(np.frombuffer(stored[0], dtype=np.float32), embeddings[0], rtol=1e-6)
+
+
+@pytest.mark.skipif(sqlite3.sqlite_version_info < (3, 35), reason="DROP COLUMN needs SQLite 3.35")
+@pytest.mark.parametrize("interrupted", [False, True], ids=["fresh", "after-drop"])
+def test_text_column_is_swapped_for_a_binary_one(baseline, interrupted):
+    # What other databases get: they cannot keep bytes in a TEXT column.
+    engine, embeddings = baseline
+    with engine.begin() as conn:
+        if interrupted:  # an earlier run filled the new column and dropped the old one, then stopped
+            _swap_to_blob_column(conn, "truth_images", "embedding", existing={"embedding"})
+            conn.execute(text("ALTER TABLE truth_images RENAME COLUMN embedding TO embedding_blob"))
+            _swap_to_blob_column(conn, "truth_images", "embedding", existing={"embedding_blob"})
+        else:
+            _swap_to_blob_column(conn, "truth_images", "embedding", existing={"embedding"})
+    _upgrade(engine)
+
+    columns = {c["name"]: c["type"] for c in inspect(engine).get_columns("truth_images")}
+    assert columns["embedding"].python_type is bytes and "embedding_blob" not in columns
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT embedding FROM truth_images ORDER BY id")).scalars().all()
+    np.testing.assert_allclose(np.frombuffer(stored[1], dtype=np.float32), embeddings[1], rtol=1e-6)
+
+
+def test_only_the_latest_legacy_truth_image_stays_enrolled(baseline):
+    engine, _ = baseline
+    _upgrade(engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id, active FROM truth_images ORDER BY id")).all() == [(1, 0), (2, 1)]
+
+
+def test_legacy_frames_get_a_timeline_and_their_video_time(baseline):
+    engine, _ = baseline
+    _upgrade(engine)
+
+    with engine.connect() as conn:
+        segments = conn.execute(
+            text("SELECT match_status, start_sec, end_sec FROM video_segments WHERE video_id = 1 ORDER BY start_sec")
+        ).all()
+        frame_times = conn.execute(text("SELECT DISTINCT created_at FROM video_matches")).scalars().all()
+    assert segments == [("NO_FACE", 0.0, 0.0), ("MATCH", 1.0, 2.0), ("NO_MATCH", 3.0, 3.0)]
+    assert frame_times == ["2024-01-03 00:00:00"]
+
+
+def test_upgrade_is_idempotent(baseline):
+    engine, _ = baseline
+    _upgrade(engine)
+    with engine.connect() as conn:
+        before = {
+            table: conn.execute(text(f"SELECT * FROM {table} ORDER BY 1")).all()
+            for table in ("truth_images", "video_matches", "video_segments")
+        }
+
+    _upgrade(engine)
+
+    with engine.connect() as conn:
+        for table, rows in before.items():
+            assert conn.execute(text(f"SELECT * FROM {table} ORDER BY 1")).all() == rows, table
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from sqlalchemy import insert, select
+
+from embedding_codec import EMBEDDING_DIM
+from models import TestImage, TestVideo, TruthImage, VideoJob, VideoMatch, VideoSegment
+from services.face_service import DetectedFaces, TruthGallery, stored_faces
+from services.rescoring import _last_anchor, rescore_collection, rescore_results
+from services.truth_service import truth_gallery_cache
+
+THRESHOLD = 0.5
+
+# Per video, frames in time order: ("enc", identity or None for a stranger), ("reuse",) or ("no_face",).
+VIDEO_FRAMES = {
+    1: [("reuse",), ("enc", 0), ("reuse",), ("reuse",), ("no_face",), ("reuse",), ("enc", None), ("reuse",)],
+    2: [("enc", 1), ("reuse",), ("enc", 0), ("reuse",), ("reuse",), ("reuse",)],
+}
+
+
+def _face(identities: np.ndarray, who, rng: np.random.Generator) -> np.ndarray:
+    if who is None:
+        return rng.normal(0.0, 0.1, size=EMBEDDING_DIM).astype(np.float32)  # nobody enrolled
+    return (identities[who] + rng.normal(0.0, 0.005, size=EMBEDDING_DIM)).astype(np.float32)
+
+
+def _fill(session_factory, identities: np.ndarray) -> list[dict]:
+    """Interleaved frame rows of both videos, all stored with a stale verdict."""
+    rng = np.random.default_rng(1)
+    rows = []
+    for step in range(max(len(f) for f in VIDEO_FRAMES.values())):
+        for video_id, frames in VIDEO_FRAMES.items():
+            if step >= len(frames):
+                continue
+            kind = frames[step]
+            rows.append(
+                {
+                    "video_id": video_id,
+                    "frame_path": "",
+                    "timestamp_sec": float(step),
+                    "match_status": "NO_FACE" if kind[0] == "no_face" else "NO_MATCH",
+                    "confidence_score": 0.0,
+                    "truth_image_id": None,
+                    "embedding": _face(identities, kind[1], rng).tobytes() if kind[0] == "enc" else None,
+                }
+            )
+    with session_factory() as db:
+        db.execute(
+            insert(TruthImage),
+            [{"image_path": "t.jpg", "label": f"p{i}", "embedding": e.tobytes()} for i, e in enumerate(identities)],
+        )
+        db.execute(insert(TestVideo), [{"video_path": "v.mp4"} for _ in VIDEO_FRAMES])
+        db.execute(insert(VideoMatch), rows)
+        db.commit()
+    return rows
+
+
+def _expected(identities: np.ndarray) -> dict[int, list[tuple[str, int | None]]]:
+    """(status, truth id) per frame: encoded frames are scored, reused ones repeat the last anchor."""
+    expected = {}
+    for video_id, frames in VIDEO_FRAMES.items():
+        last, out = None, []
+        for kind in frames:
+            if kind[0] == "enc":
+                last = ("MATCH", kind[1] + 1) if kind[1] is not None else ("NO_MATCH", None)
+            elif kind[0] == "no_face":
+                last = ("NO_FACE", None)
+            out.append(last if last is not None else ("NO_MATCH", None))  # nothing to reuse: left as stored
+        expected[video_id] = out
+    return expected
+
+
+def _stored(session_factory) -> dict[int, list[tuple[str, int | None]]]:
+    """(status, truth id of a MATCH) per frame of each video, in time order."""
+    with session_factory() as db:
+        rows = db.execute(
+            select(VideoMatch.video_id, VideoMatch.match_status, VideoMatch.truth_image_id).order_by(VideoMatch.id)
+        ).all()
+    stored: dict[int, list] = {}
+    for video_id, status, truth_id in rows:
+        # NO_MATCH rows keep the nearest identity for reference; only a MATCH names the person.
+        stored.setdefault(video_id, []).append((status, truth_id if status == "MATCH" else None))
+    return stored
+
+
+def _gallery(identities: np.ndarray) -> TruthGallery:
+    return TruthGallery.build([1, 2, 3], ["p0", "p1", "p2"], identities)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 100])
+def test_reused_frames_take_the_new_result_of_their_anchor_across_chunks(session_factory, identities, chunk_size):
+    _fill(session_factory, identities)
+
+    counts, changed = rescore_collection(
+        session_factory, VideoMatch, _gallery(identities), THRESHOLD, chunk_size=chunk_size
+    )
+
+    assert _stored(session_factory) == _expected(identities)
+    assert counts.rows == sum(len(f) for f in VIDEO_FRAMES.values())
+    assert counts.unscorable == 1  # video 1 starts with a reused frame: nothing before it
+    assert changed == {1, 2}
+
+
+def test_second_pass_changes_nothing(session_factory, identities):
+    _fill(session_factory, identities)
+    rescore_collection(session_factory, VideoMatch, _gallery(identities), THRESHOLD, chunk_size=3)
+
+    counts, changed = rescore_collection(session_factory, VideoMatch, _gallery(identities), THRESHOLD, chunk_size=3)
+
+    assert counts.updated == 0
+    assert changed == set()
+
+
+def test_excluded_videos_are_left_alone(session_factory, identities):
+    rows = _fill(session_factory, identities)
+
+    counts, changed = rescore_collection(
+        session_factory, VideoMatch, _gallery(identities), THRESHOLD, chunk_size=2, excluded_videos={2}
+    )
+
+    assert counts.rows == len(VIDEO_FRAMES[1])
+    assert changed == {1}
+    assert _stored(session_factory)[2] == [(r["match_status"], None) for r in rows if r["video_id"] == 2]
+
+
+def test_test_images_without_embedding_are_unscorable(session_factory, identities):
+    with session_factory() as db:
+        db.add_all(
+            [
+                TestImage(image_path="a.jpg", match_status="NO_MATCH", embedding=identities[2].tobytes()),
+                TestImage(image_path="b.jpg", match_status="MATCH", embedding=None),  # stored before embeddings
+                TestImage(image_path="c.jpg", match_status="NO_FACE", embedding=None),
+            ]
+        )
+        db.commit()
+
+    counts, _ = rescore_collection(session_factory, TestImage, _gallery(identities), THRESHOLD)
+
+    assert (counts.rows, counts.updated, counts.unscorable) == (3, 1, 1)
+    with session_factory() as db:
+        statuses = db.execute(select(TestImage.match_status, TestImage.truth_image_id).order_by(TestImage.id)).all()
+    assert statuses == [("MATCH", 3), ("MATCH", None), ("NO_FACE", None)]
+
+
+def test_rescore_results_rebuilds_timelines_and_skips_busy_videos(session_factory, identities):
+    _fill(session_factory, identities)
+    with session_factory() as db:
+        db.add(VideoJob(video_id=2, status="RUNNING"))
+        db.commit()
+    truth_gallery_cache.invalidate()
+
+    report = rescore_results(session_factory, THRESHOLD, chunk_size=4)
+
+    assert report.skipped_videos == 1
+    assert report.segments_rebuilt == 1
+    with session_factory() as db:
+        segments = db.execute(
+            select(VideoSegment.video_id, VideoSegment.match_status, VideoSegment.start_sec, VideoSegment.end_sec)
+            .order_by(VideoSegment.video_id, VideoSegment.start_sec)
+        ).all()
+    assert segments == [
+        (1, "NO_MATCH", 0.0, 0.0),
+        (1, "MATCH", 1.0, 3.0),
+        (1, "NO_FACE", 4.0, 5.0),
+        (1, "NO_MATCH", 6.0, 7.0),
+    ]
+
+
+def test_last_anchor_stays_within_each_video():
+    video_ids = np.array([1, 2, 1, 1, 2, 2, 1])
+    anchor = np.array([False, True, True, False, False, True, False])
+
+    assert _last_anchor(video_ids, anchor).tolist() == [-1, 1, 2, 2, 1, 5, 2]
+
+
+def test_multi_face_rows_are_rematched_over_every_face(session_factory, identities):
+    stranger = np.full(EMBEDDING_DIM, 0.3, dtype=np.float32)
+    group = DetectedFaces(
+        embeddings=np.stack([stranger, identities[2]]),
+        boxes=np.array([[0, 200, 200, 0], [10, 60, 60, 10]], dtype=np.int32),
+    )
+    with session_factory() as db:
+        # Stored while only identity 2 was not enrolled yet: the stranger's face was kept.
+        db.add(
+            TestImage(
+                image_path="group.jpg",
+                match_status="NO_MATCH",
+                embedding=stranger.tobytes(),
+                face_box="[0, 200, 200, 0]",
+                **stored_faces(group),
+            )
+        )
+        db.commit()
+
+    counts, _ = rescore_collection(session_factory, TestImage, _gallery(identities), THRESHOLD)
+
+    assert counts.updated == 1
+    with session_factory() as db:
+        row = db.execute(select(TestImage)).scalar_one()
+        assert (row.match_status, row.truth_image_id, row.face_box) == ("MATCH", 3, "[10, 60, 60, 10]")
+        np.testing.assert_array_equal(row.embedding, identities[2])
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import TestImage, TestVideo, VideoMatch
+
+STATUSES = ("MATCH", "NO_MATCH", "NO_FACE")
+
+
+@pytest.fixture
+def stored(app):
+    """25 test images (statuses cycling) and one video with 12 frames."""
+    start = datetime(2024, 1, 1)
+    with app.session_local() as db:
+        db.add_all(
+            TestImage(
+                image_path=f"images/{n}.jpg",
+                match_status=STATUSES[n % 3],
+                confidence_score=float(n),
+                created_at=start + timedelta(hours=n),
+            )
+            for n in range(25)
+        )
+        video = TestVideo(video_path="videos/v.mp4")
+        db.add(video)
+        db.flush()
+        db.add_all(
+            VideoMatch(video_id=video.id, frame_path="", timestamp_sec=float(n), match_status="NO_FACE")
+            for n in range(12)
+        )
+        db.commit()
+        return {"video_id": video.id, "start": start}
+
+
+def _pages(client, **params) -> list[list[dict]]:
+    pages, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        body = client.get("/api/results", query_string=query).get_json()
+        pages.append(body[params["collection"]])
+        cursor = body["next_cursor"][params["collection"]]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_every_row_once_newest_first(client, stored):
+    pages = _pages(client, collection="test_images", limit=10)
+
+    assert [len(p) for p in pages] == [10, 10, 5]
+    ids = [row["id"] for page in pages for row in page]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 25
+
+
+def test_last_full_page_has_no_next_cursor(client, stored):
+    body = client.get("/api/results", query_string={"collection": "video_matches", "limit": 12}).get_json()
+    assert len(body["video_matches"]) == 12
+    assert body["next_cursor"]["video_matches"] is None
+
+
+def test_cursor_pages_keep_filters(client, stored):
+    pages = _pages(client, collection="test_images", limit=3, match_status="match,no_face", min_confidence=5)
+    rows = [row for page in pages for row in page]
+
+    assert {r["match_status"] for r in rows} == {"MATCH", "NO_FACE"}
+    assert all(r["confidence_score"] >= 5 for r in rows)
+    assert len(rows) == sum(1 for n in range(5, 25) if STATUSES[n % 3] != "NO_MATCH")
+
+
+def test_time_window_filter(client, stored):
+    since = (stored["start"] + timedelta(hours=10)).isoformat()
+    until = (stored["start"] + timedelta(hours=15)).isoformat()
+    body = client.get(
+        "/api/results", query_string={"collection": "test_images", "since": since, "until": until}
+    ).get_json()
+    assert sorted(r["confidence_score"] for r in body["test_images"]) == [10.0, 11.0, 12.0, 13.0, 14.0]
+
+
+def test_ndjson_streams_every_row_after_the_cursor(client, stored):
+    first = client.get("/api/results", query_string={"collection": "test_images", "limit": 5}).get_json()
+    cursor = first["next_cursor"]["test_images"]
+
+    response = client.get(
+        "/api/results", query_string={"collection": "test_images", "format": "ndjson", "cursor": cursor}
+    )
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == "application/x-ndjson"
+    assert len(lines) == 20
+    assert all(line["collection"] == "test_images" and line["id"] < cursor for line in lines)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"cursor": "5"},  # cursor without collection
+        {"collection": "nope"},
+        {"collection": "test_images", "limit": "0"},
+        {"collection": "test_images", "since": "yesterday"},
+    ],
+)
+def test_invalid_parameters_are_rejected(client, stored, params):
+    assert client.get("/api/results", query_string=params).status_code == 400
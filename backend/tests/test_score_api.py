@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from sqlalchemy import func, select
+
+from models import TestImage
+from services.admission import face_admission
+
+
+def _stored(app) -> int:
+    with app.session_local() as db:
+        return db.scalar(select(func.count(TestImage.id)))
+
+
+@pytest.mark.parametrize("persist", ["false", "true", 0, None])
+def test_json_persist_must_be_a_boolean(app, client, identities, persist):
+    response = client.post("/api/embeddings/score", json={"embeddings": identities.tolist(), "persist": persist})
+
+    assert response.status_code == 400
+    assert _stored(app) == 0
+
+
+def test_query_persist_must_be_a_known_flag(app, client, identities):
+    response = client.post(
+        "/api/embeddings/score?persist=maybe", data=identities.tobytes(), content_type="application/octet-stream"
+    )
+
+    assert response.status_code == 400
+    assert _stored(app) == 0
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "persisted"),
+    [
+        ({"json": {"embeddings": [[0.0] * 128], "persist": False}}, False),
+        ({"json": {"embeddings": [[0.0] * 128], "persist": True}}, True),
+        ({"path": "?persist=no", "data": np.zeros(128, np.float32).tobytes()}, False),
+        ({"path": "?persist=true", "data": np.zeros(128, np.float32).tobytes()}, True),
+    ],
+    ids=["json-false", "json-true", "query-no", "query-true"],
+)
+def test_persist_flag_decides_whether_rows_are_stored(app, client, kwargs, persisted):
+    kwargs = dict(kwargs)
+    path = "/api/embeddings/score" + kwargs.pop("path", "")
+    if "data" in kwargs:
+        kwargs["content_type"] = "application/octet-stream"
+
+    response = client.post(path, **kwargs)
+
+    assert response.status_code == 200
+    assert ("ids" in response.get_json()) is persisted
+    assert _stored(app) == int(persisted)
+
+
+def test_persisting_waits_for_a_face_slot_but_scoring_does_not(app, client):
+    face_admission.configure(1, 0, 0.1)
+    assert face_admission.acquire() is None  # another request holds the only slot
+    try:
+        scored = client.post("/api/embeddings/score", json={"embeddings": [[0.0] * 128]})
+        refused = client.post("/api/embeddings/score", json={"embeddings": [[0.0] * 128], "persist": True})
+    finally:
+        face_admission.release(0.0)
+
+    assert scored.status_code == 200
+    assert refused.status_code == 429
+    assert "Retry-After" in refused.headers
+    assert _stored(app) == 0
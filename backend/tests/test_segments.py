@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from services.segments import build_segments
+
+
+def test_segments_split_on_status_and_identity():
+    frames = [
+        (0.0, "NO_FACE", 0.0, None),
+        (1.0, "MATCH", 80.0, 1),
+        (2.0, "MATCH", 90.0, 1),
+        (3.0, "MATCH", 70.0, 2),
+        (4.0, "NO_MATCH", 5.0, 1),  # NO_MATCH ignores the nearest identity
+        (5.0, "NO_MATCH", 7.0, 2),
+    ]
+
+    rows = [s.to_row(video_id=1) for s in build_segments(frames)]
+
+    assert [(r["match_status"], r["truth_image_id"], r["start_sec"], r["end_sec"], r["frame_count"]) for r in rows] == [
+        ("NO_FACE", None, 0.0, 0.0, 1),
+        ("MATCH", 1, 1.0, 2.0, 2),
+        ("MATCH", 2, 3.0, 3.0, 1),
+        ("NO_MATCH", None, 4.0, 5.0, 2),
+    ]
+    assert (rows[1]["max_confidence"], rows[1]["mean_confidence"]) == (90.0, 85.0)
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import io
+import itertools
+
+import pytest
+
+import routes.truth_image
+
+
+@pytest.fixture
+def upload(client, identities, monkeypatch):
+    """upload(**form) -> the enrolled truth image; each upload enrolls the next synthetic face."""
+    embeddings = itertools.cycle(identities)
+    monkeypatch.setattr(
+        routes.truth_image, "embeddings_for_uploads", lambda sessions, uploads, workers: [next(embeddings)]
+    )
+
+    def post(**form) -> dict:
+        data = {"file": (io.BytesIO(b"jpeg bytes"), "t.jpg"), **form}
+        response = client.post("/api/truth-image", data=data, content_type="multipart/form-data")
+        response.close()  # frees the face admission slot
+        assert response.status_code == 200
+        return response.get_json()["truth_image"]
+
+    return post
+
+
+def _active(client) -> list[str]:
+    return [t["identity"] for t in client.get("/api/truth-images").get_json()["truth_images"]]
+
+
+def test_unlabeled_upload_replaces_the_truth_image_as_before(client, upload):
+    first = upload()["id"]
+    second = upload()["id"]
+
+    assert _active(client) == [f"truth_{second}"]
+    assert first != second
+
+
+def test_labeled_uploads_add_to_the_gallery(client, upload):
+    upload(label="ann")
+    upload(label="bob")
+    upload(label="cat", replace="true")
+    upload(label="dan")
+    upload(replace="false")
+
+    assert _active(client)[1:] == ["dan", "cat"]
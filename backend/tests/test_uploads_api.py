@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+IMAGE = "images/img_0123456789abcdef0123456789abcdef.jpg"  # content-addressed name
+FRAME = "frames/7/frame_000012.jpg"  # rewritten when a job is re-run
+
+
+@pytest.fixture
+def uploads(app) -> Path:
+    root = Path(app.config["UPLOAD_FOLDER"])
+    for rel, color in ((IMAGE, "red"), (FRAME, "blue"), ("images/img_fedcba9876543210fedcba9876543210.png", "green")):
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (400, 300), color).save(root / rel)
+    (root / "videos").mkdir(exist_ok=True)
+    (root / "videos/clip.mp4").write_bytes(b"\0" * 1000)
+    return root
+
+
+def _get(client, path: str, **kwargs):
+    response = client.get(f"/uploads/{path}", **kwargs)
+    response.get_data()  # buffered, so the file can be closed
+    response.close()
+    return response
+
+
+def _width(response) -> int:
+    return Image.open(io.BytesIO(response.data)).width
+
+
+def test_named_uploads_are_immutable_and_frames_revalidated(client, uploads):
+    image, frame = _get(client, IMAGE), _get(client, FRAME)
+
+    assert image.status_code == frame.status_code == 200
+    assert image.headers["ETag"] == '"0123456789abcdef0123456789abcdef"'
+    assert image.cache_control.immutable and image.cache_control.public
+    assert image.cache_control.max_age == 365 * 24 * 3600
+    assert frame.cache_control.no_cache and not frame.cache_control.immutable
+
+
+def test_matching_etag_is_answered_with_304(client, uploads):
+    for path in (IMAGE, FRAME, f"{IMAGE}?w=64"):
+        etag = _get(client, path).headers["ETag"]
+        revalidated = _get(client, path, headers={"If-None-Match": etag})
+
+        assert revalidated.status_code == 304
+        assert revalidated.data == b""
+        assert revalidated.headers["ETag"] == etag
+
+
+def test_range_request_gets_partial_content(client, uploads):
+    response = _get(client, "videos/clip.mp4", headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 100-199/1000"
+    assert len(response.data) == 100
+
+
+def test_thumbnail_width_snaps_up_to_a_configured_step(client, uploads):
+    thumb = _get(client, f"{IMAGE}?w=100")
+    original = _get(client, f"{IMAGE}?w=5000")  # wider than every step
+
+    assert _width(thumb) == 128
+    assert thumb.headers["ETag"] == '"0123456789abcdef0123456789abcdef-w128"'
+    assert thumb.cache_control.immutable
+    assert _width(original) == 400
+
+
+def test_thumbnails_of_non_images_or_bad_widths_are_refused(client, uploads):
+    assert _get(client, "videos/clip.mp4?w=64").status_code == 400
+    assert _get(client, f"{IMAGE}?w=0").status_code == 400
+    assert _get(client, "images/missing.jpg?w=64").status_code == 404
+
+
+@pytest.mark.parametrize("app_config", [{"THUMBNAIL_CACHE_MAX_MB": 0}])
+def test_thumbnails_past_the_cache_size_are_evicted(app, client, uploads):
+    from services.thumbnails import thumbnail_cache
+
+    other = "images/img_fedcba9876543210fedcba9876543210.png"
+    before = thumbnail_cache.stats()  # the counters are process-wide
+    for path in (IMAGE, other, IMAGE):
+        assert _get(client, f"{path}?w=64").status_code == 200
+
+    after = thumbnail_cache.stats()
+    assert after["misses"] - before["misses"] == 3  # the first thumbnail was evicted, then rendered again
+    assert after["evictions"] - before["evictions"] == 2
+    assert len(list(Path(app.config["THUMBNAIL_CACHE_FOLDER"]).glob("*.jpg"))) == 1
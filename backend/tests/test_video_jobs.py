@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from models import TestVideo, VideoJob, VideoMatch
+from services.job_service import JOB_DONE, VideoJobRunner, job_settings_from_config, run_video_job
+
+
+@pytest.fixture
+def settings(app) -> dict:
+    return {**job_settings_from_config(app.config), "frame_persist_policy": "none"}
+
+
+@pytest.fixture
+def queue_job(app, make_video):
+    """queue_job() -> id of a QUEUED full job over a 3-second clip (1 frame/sec)."""
+    video_path = make_video(seconds=3, name="uploads/videos/clip.mp4")
+
+    def queue() -> int:
+        with app.session_local() as db:
+            video = TestVideo(video_path=str(video_path.relative_to(app.config["UPLOAD_FOLDER"])))
+            db.add(video)
+            db.flush()
+            job = VideoJob(video_id=video.id, status="QUEUED")
+            db.add(job)
+            db.commit()
+            return job.id
+
+    return queue
+
+
+def test_a_job_run_again_stores_each_frame_once(app, settings, queue_job):
+    job_id = queue_job()
+
+    assert run_video_job(job_id, settings) == JOB_DONE
+    assert run_video_job(job_id, settings) == JOB_DONE  # e.g. re-queued as stale after the first run
+
+    with app.session_local() as db:
+        job = db.get(VideoJob, job_id)
+        rows = db.scalar(select(func.count(VideoMatch.id)).where(VideoMatch.video_id == job.video_id))
+    assert (rows, job.frames_done) == (3, 3)
+
+
+def _statuses(app, job_ids: list[int]) -> list[str]:
+    with app.session_local() as db:
+        return [db.get(VideoJob, job_id).status for job_id in job_ids]
+
+
+def test_runner_replaces_a_pool_broken_by_a_dead_worker(app, settings, queue_job):
+    runner = VideoJobRunner(app.session_local, settings, workers=1, poll_interval=0.05)
+    runner.start()
+    try:
+        # A worker process killed from outside (what the OOM killer does to dlib).
+        crash = runner._executor.submit(os._exit, 1)
+        with pytest.raises(Exception):
+            crash.result(timeout=60)
+
+        job_ids = [queue_job() for _ in range(3)]
+        runner.notify()
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline and _statuses(app, job_ids) != [JOB_DONE] * 3:
+            time.sleep(0.1)
+
+        assert _statuses(app, job_ids) == [JOB_DONE] * 3
+        assert runner.in_flight() == 0
+    finally:
+        runner.shutdown()
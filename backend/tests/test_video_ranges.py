@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import math
+
+import pytest
+
+from models import TestVideo, VideoJob
+from services.job_service import _process_time_range, job_settings_from_config
+from services.video_service import (
+    SAMPLE_ADAPTIVE,
+    SAMPLE_EVERY_N,
+    SAMPLE_FPS,
+    SamplingPolicy,
+    TimeRange,
+    iter_frames,
+    split_time_ranges,
+)
+
+
+def _samples(frames) -> list[tuple[int, float, int]]:
+    return [(f.frame_index, f.timestamp_ms, f.sample_index) for f in frames]
+
+
+@pytest.mark.parametrize("parts", [2, 3, 4])
+def test_ranges_are_consecutive_and_cover_the_video(make_video, parts):
+    video = make_video(seconds=12)
+    ranges = split_time_ranges(str(video), SamplingPolicy(SAMPLE_FPS, 2.0), parts, min_range_sec=2, max_range_sec=60)
+
+    assert len(ranges) == parts
+    assert ranges[0].start_sec == 0.0
+    assert ranges[-1].end_sec == math.inf  # the last range runs to the end of the stream
+    for before, after in zip(ranges, ranges[1:]):
+        assert before.end_sec == after.start_sec
+        assert after.start_sec * 2.0 == pytest.approx(round(after.start_sec * 2.0))  # on the 2 fps grid
+
+
+def test_ranges_respect_min_and_max_length(make_video):
+    video = str(make_video(seconds=12))
+    policy = SamplingPolicy(SAMPLE_FPS, 1.0)
+
+    assert split_time_ranges(video, policy, 8, min_range_sec=5, max_range_sec=60) == [
+        TimeRange(0.0, 6.0),
+        TimeRange(6.0, math.inf),
+    ]
+    # More ranges than workers when a range would otherwise exceed max_range_sec.
+    assert len(split_time_ranges(video, policy, 2, min_range_sec=1, max_range_sec=3)) == 4
+
+
+def test_short_or_unsplittable_videos_stay_whole(make_video):
+    video = str(make_video(seconds=5))
+    whole = [TimeRange(0.0, math.inf)]
+
+    assert split_time_ranges(video, SamplingPolicy(SAMPLE_FPS, 1.0), 4, min_range_sec=3) == whole
+    assert split_time_ranges(video, SamplingPolicy(SAMPLE_ADAPTIVE, 1.0), 4, min_range_sec=1) == whole
+
+
+@pytest.mark.parametrize(
+    "policy",
+    [SamplingPolicy(SAMPLE_FPS, 1.0), SamplingPolicy(SAMPLE_FPS, 3.0), SamplingPolicy(SAMPLE_EVERY_N, every_n=7)],
+    ids=["1fps", "3fps", "every7"],
+)
+def test_ranges_decode_exactly_the_frames_of_a_full_pass(make_video, policy):
+    video = str(make_video(seconds=12))
+    ranges = split_time_ranges(video, policy, 3, min_range_sec=2, max_range_sec=60)
+    assert len(ranges) == 3
+
+    sharded = []
+    for r in ranges:
+        frames = _samples(iter_frames(video, policy, start_sec=r.start_sec, end_sec=r.end_sec))
+        assert frames, f"empty range {r}"
+        assert all(r.start_sec * 1000 - 50 <= ts < r.end_sec * 1000 for _, ts, _ in frames)
+        sharded.extend(frames)
+
+    assert sharded == _samples(iter_frames(video, policy))
+
+
+def test_range_boundary_between_two_frames(make_video):
+    # 10 fps: frames at 0, 100, 200 ms, ...; a boundary at 0.45 s falls between two frames.
+    video = str(make_video(seconds=2))
+    policy = SamplingPolicy(SAMPLE_EVERY_N, every_n=1)
+
+    first = _samples(iter_frames(video, policy, start_sec=0.0, end_sec=0.45))
+    second = _samples(iter_frames(video, policy, start_sec=0.45, end_sec=1.0))
+
+    assert [i for i, _, _ in first] == [0, 1, 2, 3]
+    assert [i for i, _, _ in second] == [4, 5, 6, 7, 8, 9]
+
+
+def test_keyframe_sampling_cannot_start_mid_video(make_video):
+    video = str(make_video(seconds=2))
+    with pytest.raises((ValueError, RuntimeError)):
+        next(iter_frames(video, SamplingPolicy("keyframes"), start_sec=1.0))
+
+
+@pytest.mark.parametrize("cancelled", [False, True])
+def test_shard_stops_at_its_next_batch_once_the_job_is_cancelled(app, make_video, tmp_path, cancelled):
+    settings = {**job_settings_from_config(app.config), "frame_batch_size": 2, "frame_persist_policy": "none"}
+    with app.session_local() as db:
+        video = TestVideo(video_path="videos/v.mp4")
+        db.add(video)
+        db.flush()
+        job = VideoJob(video_id=video.id, status="RUNNING", cancel_requested=cancelled)
+        db.add(job)
+        db.commit()
+        job_id, video_id = job.id, video.id
+
+    frames, *_ = _process_time_range(
+        job_id,
+        str(make_video(seconds=3)),
+        SamplingPolicy(SAMPLE_FPS, 2.0),
+        TimeRange(0.0, math.inf),
+        video_id,
+        tmp_path / "frames",
+        None,
+        settings,
+        None,
+        {},
+    )
+
+    assert len(frames) == (0 if cancelled else 6)
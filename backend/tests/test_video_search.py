@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pytest
+
+from services import video_service
+from services.video_service import SearchPolicy, TimeRange, search_appearances
+
+POLICY = SearchPolicy(coarse_seconds=2.0, fine_seconds=0.1, max_matches=0)
+
+
+def _appears(start_ms: float, end_ms: float):
+    """is_match for a person on screen from start_ms to end_ms (by frame timestamp)."""
+    return lambda frame: start_ms <= frame.timestamp_ms <= end_ms
+
+
+@pytest.fixture
+def unknown_frame_count(monkeypatch):
+    """Readers that do not know the stream length (CAP_PROP_FRAME_COUNT 0 or -1)."""
+    original = video_service.FrameReader.__init__
+
+    def init(self, video_path):
+        original(self, video_path)
+        self.duration_ms = 0.0
+
+    monkeypatch.setattr(video_service.FrameReader, "__init__", init)
+
+
+def test_search_locates_an_appearance(make_video):
+    video = str(make_video(seconds=8))
+
+    assert search_appearances(video, _appears(3000, 5000), POLICY) == [TimeRange(3.0, 5.0)]
+
+
+def test_search_without_a_frame_count_reads_to_the_end(make_video, unknown_frame_count):
+    video = str(make_video(seconds=8))
+
+    # The appearance runs to the last frame (7.9 s), past the last coarse probe.
+    (found,) = search_appearances(video, _appears(7000, 9000), POLICY)
+    assert found.start_sec == 7.0
+    assert found.end_sec == pytest.approx(7.9, abs=POLICY.fine_seconds)
+    assert search_appearances(video, _appears(3000, 5000), POLICY, max_seconds=4) == [TimeRange(3.0, 4.0)]
+
+
+def test_search_fails_when_no_frame_decodes(make_video, unknown_frame_count, monkeypatch):
+    video = str(make_video(seconds=2))
+    monkeypatch.setattr(video_service.FrameReader, "read_at", lambda self, ms: None)
+
+    with pytest.raises(RuntimeError):
+        search_appearances(video, _appears(0, 1000), POLICY)
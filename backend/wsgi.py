@@ -0,0 +1,15 @@
+"""
+Production entry point (the __main__ block of app.py stays the dev server):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With gunicorn.conf.py the app is built once in the gunicorn master (preload_app), face
+models included (FACE_MODELS_PREWARM), and workers fork from it: they start in
+milliseconds and share the model memory copy-on-write. The video job dispatcher and the
+face index builder are started in each worker after the fork (post_fork hook), so with
+W gunicorn workers up to W * VIDEO_JOB_WORKERS jobs run at once; set
+VIDEO_JOBS_ENABLED=false on extra web-only instances.
+"""
+from app import create_app
+
+app = create_app(start_job_runner=False)